@@ -9,25 +9,47 @@ sys.path.insert(0, str(root_dir))
 
 from flask import Flask, render_template, jsonify, request, session, redirect, url_for, send_file
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Set
 import json
+import math
 import hashlib
 import secrets
+import time
 import io
 import os
+import numpy as np
 from werkzeug.utils import secure_filename
 from pathlib import Path
 
-from src.models.test_case import ExecutionFeedback, TestCase, Action, ActionType, ActionImpact
+from src.models.test_case import ExecutionFeedback, TestCase, Action, ActionType, ActionImpact, RecommendationResult
 from src.recommender.personalized_recommender import PersonalizedMLRecommender
 from src.recommender.explainability import RecommendationExplainer
-from src.recommender.anomaly_detector import AnomalyDetector
+from src.recommender.anomaly_detector import AnomalyDetector, FeedbackColumns
+from src.recommender.budget_planner import BudgetPlan, TimeBudgetPlanner
+from src.recommender.contextual_order import (
+    contextual_reorder as _contextual_reorder,
+    repair_order_for_logic as _repair_order_for_logic
+)
+from src.recommender.decomposition import DecompositionOrderer
+from src.recommender.duration_model import DurationModel
+from src.recommender.online_risk import OnlineRiskModel
+from src.recommender.pareto_orders import ParetoOrderSearch
+from src.recommender.risk_engine import FailureRiskEngine
+from src.recommender.streaming_anomaly import StreamingAnomalyDetector
+from src.recommender.team_scheduler import TeamScheduler
+from src.execution.prefix_planner import PrefixPlanner
+from src.execution.simulator_executor import SimulatorExecutor
 from src.utils.database import get_database
 from src.utils.notification_manager import NotificationManager
 from src.utils.report_generator import ReportGenerator
+from src.utils.recommendation_cache import RecommendationCache
+from src.utils.explanation_jobs import ExplanationJobStore, JOB_PENDING, JOB_FAILED
+from src.utils.order_metrics import OrderMetrics
+from src.utils.dependency_graph import DependencyGraphCache, DependencySubgraph
+from src.utils.context_stats import ContextStatsCache, parse_datetime, time_bucket
 from src.utils.hierarchy_utils import (
     order_by_hierarchy, group_tests_by_shared_path,
-    estimate_resets_with_hierarchy, calculate_hierarchy_score,
+    calculate_hierarchy_score,
     get_tree_level
 )
 from testes_motorola import criar_testes_motorola
@@ -64,8 +86,35 @@ db = get_database("iartes.db")  # Banco de dados SQLite
 # Sistemas avançados de IA
 explainer = None  # Será inicializado quando modelo estiver treinado
 anomaly_detector = AnomalyDetector(contamination=0.1)
+# Estatísticas incrementais por usuário/teste; re-treino do IsolationForest em segundo plano
+streaming_anomaly_detector = StreamingAnomalyDetector(contamination=0.1, window=100)
 notification_manager = NotificationManager(db)
 report_generator = ReportGenerator(db)
+recommendation_cache = RecommendationCache(ttl_seconds=300.0, max_entries=256)
+# Grafo de dependências do catálogo (padrão + personalizados) por usuário
+dependency_graphs = DependencyGraphCache()
+# Contadores de contexto (risco de falha/afinidade) mantidos a cada feedback;
+# o modelo online de risco (Beta hierárquico módulo -> teste -> usuário) é alimentado por eles
+online_risk = OnlineRiskModel()
+context_stats = ContextStatsCache(db, risk_model=online_risk, catalog={t.id: t for t in testes})
+risk_engine = FailureRiskEngine()
+# Duração prevista por teste/usuário, aprendida com o tempo real dos feedbacks
+duration_model = DurationModel(db, catalog_loader=lambda uid: {t.id: t for t in get_all_test_cases(uid)})
+# Seleção com orçamento de tempo (mochila com fecho de dependências)
+budget_planner = TimeBudgetPlanner()
+# Fronteira de Pareto de ordens (tempo total, resets, tempo até a primeira falha)
+pareto_search = ParetoOrderSearch()
+# Seleções muito grandes: ordenação por partições (raiz/módulo/condições) em pool de processos
+decomposition_orderer = DecompositionOrderer()
+# Divisão da seleção entre vários testadores/dispositivos (makespan); cada um parte do baseline do simulador
+team_scheduler = TeamScheduler()
+team_baseline_state = SimulatorExecutor().reset()
+# Prefixos de ações compartilhados entre testes consecutivos (economia reportada na recomendação)
+prefix_planner = PrefixPlanner()
+# Explicações adiadas, calculadas em segundo plano e consultadas por recommendation_id
+explanation_jobs = ExplanationJobStore(max_workers=2)
+# Modelos personalizados gravados em lote, fora do caminho da requisição
+recommender.enable_write_behind(db.db_path, flush_interval=30.0, max_pending=10)
 
 # Configurar encoding UTF-8 para Windows
 import sys
@@ -80,7 +129,11 @@ print("✓ Sistema de recomendação personalizado inicializado")
 
 # ==================== FUNÇÕES AUXILIARES ====================
 
-def _generate_basic_explanation(test_cases: List[TestCase], recommended_order: List[str]):
+def _generate_basic_explanation(
+    test_cases: List[TestCase],
+    recommended_order: List[str],
+    durations: Optional[Dict[str, float]] = None
+):
     """Gera explicação básica baseada em heurísticas quando modelo não está treinado"""
     test_dict = {tc.id: tc for tc in test_cases}
     ordered_tests = [test_dict[tid] for tid in recommended_order if tid in test_dict]
@@ -136,8 +189,11 @@ def _generate_basic_explanation(test_cases: List[TestCase], recommended_order: L
             })
             reasoning.append(f"Os {len(destructive_tests)} testes destrutivos foram posicionados no final para minimizar resets.")
     
-    # Fator 4: Tempo total
-    total_time = sum(tc.get_total_estimated_time() for tc in ordered_tests)
+    # Fator 4: Tempo total (duração prevista, se disponível)
+    total_time = sum(
+        durations.get(tc.id, tc.get_total_estimated_time()) if durations else tc.get_total_estimated_time()
+        for tc in ordered_tests
+    )
     factors.append({
         'name': 'Tempo Total Estimado',
         'description': f'{total_time:.0f} segundos estimados',
@@ -160,48 +216,29 @@ def _generate_basic_explanation(test_cases: List[TestCase], recommended_order: L
 
 def _get_time_bucket(dt: datetime) -> str:
     """Converte horário em bucket simples."""
-    h = dt.hour
-    if 5 <= h <= 11:
-        return "morning"
-    if 12 <= h <= 17:
-        return "afternoon"
-    if 18 <= h <= 22:
-        return "evening"
-    return "night"
+    return time_bucket(dt)
 
 def _safe_parse_datetime(value: Any) -> datetime:
     """Tenta parsear datetime vindo do SQLite."""
-    if isinstance(value, datetime):
-        return value
-    if value is None:
-        return datetime.now()
-    try:
-        # ISO 8601
-        return datetime.fromisoformat(str(value))
-    except Exception:
-        return datetime.now()
-
-def _estimate_resets_from_order(test_order: List[TestCase]) -> int:
-    """Estima reinicializações necessárias baseado em pre/postconditions."""
-    resets = 0
-    current_state = set()
-    for test in test_order:
-        required = test.get_preconditions()
-        if required and not required.issubset(current_state):
-            resets += 1
-            current_state = set()
-        current_state.update(test.get_postconditions())
-    return resets
+    return parse_datetime(value)
 
 def _compute_context_and_failure_risk(
     user_id: int,
     selected_tests: List[TestCase],
-    all_tests_map: Dict[str, TestCase]
+    all_tests_map: Dict[str, TestCase],
+    explore: bool = False,
+    graph: Optional[DependencySubgraph] = None
 ) -> Dict[str, Any]:
     """
     Recomendações contextuais + predição de falha (MVP).
+    
+    Args:
+        explore: Se True, a ordenação usa riscos sorteados do posterior (Thompson sampling)
+        graph: Subgrafo de dependências da seleção (evita reprocessar as ações dos testes)
+    
     Retorna:
-      - risk_map: test_id -> risk (0..1)
+      - risk_map: test_id -> risk (0..1), média do posterior
+      - order_risk_map: risco usado na ordenação (sorteado se explore, senão = risk_map)
       - affinity_map: test_id -> affinity (0..1)
       - context: metadados do contexto atual
     """
@@ -210,128 +247,57 @@ def _compute_context_and_failure_risk(
     weekday = now.weekday()
     is_weekend = weekday >= 5
 
-    test_ids = [t.id for t in selected_tests]
-    # Estatísticas por teste (usuário + global)
-    user_stats = db.get_test_outcome_stats(test_ids, user_id=user_id)
-    global_stats = db.get_test_outcome_stats(test_ids, user_id=None)
+    # Contadores incrementais do usuário: por teste, por (módulo, faixa) e último feedback
+    user_context = context_stats.get_user(user_id, all_tests_map)
 
     # Última atividade do usuário
-    last_fb = db.get_last_user_feedback(user_id)
-    last_test_id = last_fb.get("test_case_id") if last_fb else None
-    last_dt = _safe_parse_datetime(last_fb.get("executed_at")) if last_fb else None
+    last_test_id = user_context.last_test_id
+    last_dt = _safe_parse_datetime(user_context.last_executed_at) if last_test_id else None
     last_module = all_tests_map.get(last_test_id).module if last_test_id and last_test_id in all_tests_map else None
 
-    # Estatísticas por módulo no contexto (últimos 1000 feedbacks do usuário)
-    module_counts = {}  # module -> (succ, total)
-    module_bucket_counts = {}  # (module, bucket) -> (succ, total)
-    try:
-        recent_user_feedbacks = db.get_user_feedbacks(user_id, limit=1000)
-        for fb in recent_user_feedbacks:
-            tid = fb.get("test_case_id")
-            tc = all_tests_map.get(tid)
-            mod = tc.module if tc else "N/A"
-            fb_dt = _safe_parse_datetime(fb.get("executed_at"))
-            fb_bucket = _get_time_bucket(fb_dt)
-            success = 1 if fb.get("success") else 0
-
-            s, tot = module_counts.get(mod, (0, 0))
-            module_counts[mod] = (s + success, tot + 1)
-
-            key = (mod, fb_bucket)
-            s2, tot2 = module_bucket_counts.get(key, (0, 0))
-            module_bucket_counts[key] = (s2 + success, tot2 + 1)
-    except Exception:
-        pass
-
-    def _beta_fail_prob(fails: int, total: int, prior_fail: float = 0.2, strength: float = 8.0) -> float:
-        """
-        Probabilidade de falha com smoothing Bayesiano (Beta prior).
-        - prior_fail: probabilidade inicial (ex: 20%)
-        - strength: "peso" do prior (quanto maior, mais conservador quando há poucos dados)
-        """
-        fails = int(fails or 0)
-        total = int(total or 0)
-        prior_fail = max(0.01, min(0.99, float(prior_fail)))
-        strength = max(1.0, float(strength))
-        a = prior_fail * strength
-        b = (1.0 - prior_fail) * strength
-        return float((fails + a) / (total + a + b))
-
-    def _laplace_success(succ: int, tot: int) -> float:
-        # smoothing simples para taxa de sucesso (usado na afinidade por módulo/bucket)
-        return (int(succ or 0) + 1) / (int(tot or 0) + 2) if tot is not None else 0.8
-
-    risk_map: Dict[str, float] = {}
-    affinity_map: Dict[str, float] = {}
-
-    for tc in selected_tests:
-        tid = tc.id
-        mod = tc.module or "N/A"
-
-        # Risk (falha): baseado em quantas vezes falhou + volume de execuções
-        # Regra: usa usuário se tiver dados suficientes; senão mistura com global; senão usa prior.
-        user_total = 0
-        user_fails = 0
-        if tid in user_stats:
-            st = user_stats[tid]
-            user_total = int(st.get("executions") or 0)
-            user_fails = int(st.get("failures") or 0)
-
-        global_total = 0
-        global_fails = 0
-        if tid in global_stats:
-            stg = global_stats[tid]
-            global_total = int(stg.get("executions") or 0)
-            global_fails = int(stg.get("failures") or 0)
-
-        # Se não houver histórico nenhum, usar prior levemente informado por tipo (heurística)
-        # (não é "falha", mas evita ficar sempre igual)
-        if user_total == 0 and global_total == 0:
-            base_prior = 0.15
-            if tc.has_destructive_actions():
-                base_prior += 0.05
-            if tc.priority >= 4:
-                base_prior += 0.03
-            fail_prob = _beta_fail_prob(0, 0, prior_fail=base_prior, strength=10.0)
-        else:
-            # Probabilidade de falha do usuário / global
-            user_fail_prob = _beta_fail_prob(user_fails, user_total) if user_total > 0 else None
-            global_fail_prob = _beta_fail_prob(global_fails, global_total) if global_total > 0 else None
-
-            # Peso do usuário cresce com amostras (até 50 execuções)
-            user_weight = min(0.85, 0.15 + (user_total / 50.0) * 0.7) if user_total > 0 else 0.0
-            if user_fail_prob is None:
-                fail_prob = global_fail_prob if global_fail_prob is not None else _beta_fail_prob(0, 0)
-            elif global_fail_prob is None:
-                fail_prob = user_fail_prob
-            else:
-                fail_prob = (user_weight * user_fail_prob) + ((1.0 - user_weight) * global_fail_prob)
-
-        risk = max(0.0, min(1.0, float(fail_prob)))
-        risk_map[tid] = risk
-
-        # Affinity: contexto (módulo recente + performance no bucket atual)
-        aff = 0.0
-        if last_module and mod == last_module:
-            aff += 0.15
-
-        bs, bt = module_bucket_counts.get((mod, bucket), (0, 0))
-        if bt > 0:
-            bucket_success = _laplace_success(bs, bt)
-            # puxa levemente para módulos onde o usuário tende a ir melhor nesse contexto
-            aff += max(0.0, min(0.25, (bucket_success - 0.5) * 0.5))
-
-        # fim de semana: reduzir um pouco prioridade de módulos “difíceis” (proxy: maior risco)
-        if is_weekend and risk > 0.5:
-            aff -= 0.05
-
-        affinity_map[tid] = max(0.0, min(1.0, aff))
+    # Arrays alinhados com a seleção: contadores do usuário e do módulo na faixa atual
+    test_ids = [tc.id for tc in selected_tests]
+    modules = [tc.module or "N/A" for tc in selected_tests]
+    user_counts = np.array(
+        [user_context.test_counts.get(tid, (0, 0)) for tid in test_ids], dtype=np.float64
+    ).reshape(-1, 2)
+    bucket_counts = np.array(
+        [user_context.module_bucket_counts.get((mod, bucket), (0, 0)) for mod in modules], dtype=np.float64
+    ).reshape(-1, 2)
+
+    # Risk (falha): posterior Beta hierárquico (módulo -> teste -> usuário), com o tipo
+    # do teste (destrutivo/alta prioridade) no prior do teste
+    if graph is not None:
+        destructive = [graph.nodes[tid].destructive for tid in test_ids]
+    else:
+        destructive = [tc.has_destructive_actions() for tc in selected_tests]
+    alpha, beta = online_risk.posterior(
+        test_ids, modules,
+        user_executions=user_counts[:, 0],
+        user_failures=user_counts[:, 1],
+        destructive=destructive,
+        priority=[tc.priority for tc in selected_tests]
+    )
+    risk = online_risk.mean(alpha, beta)
+    order_risk = online_risk.thompson(alpha, beta)[0] if explore else risk
+    # Affinity: contexto (módulo recente + performance no bucket atual)
+    affinity = risk_engine.affinity(
+        same_module=[bool(last_module) and mod == last_module for mod in modules],
+        bucket_successes=bucket_counts[:, 0],
+        bucket_totals=bucket_counts[:, 1],
+        risk=order_risk,
+        is_weekend=is_weekend
+    )
+    risk_map: Dict[str, float] = dict(zip(test_ids, risk.tolist()))
+    order_risk_map: Dict[str, float] = dict(zip(test_ids, order_risk.tolist())) if explore else risk_map
+    affinity_map: Dict[str, float] = dict(zip(test_ids, affinity.tolist()))
 
     context = {
         "generated_at": now.isoformat(),
         "time_bucket": bucket,
         "weekday": weekday,
         "is_weekend": is_weekend,
+        "risk_exploration": explore,
         "last_test_id": last_test_id,
         "last_module": last_module,
         "minutes_since_last_feedback": (
@@ -339,125 +305,19 @@ def _compute_context_and_failure_risk(
         )
     }
 
-    return {"risk_map": risk_map, "affinity_map": affinity_map, "context": context}
-
-def _contextual_reorder(
-    test_cases: List[TestCase],
-    base_order_ids: List[str],
-    risk_map: Dict[str, float],
-    affinity_map: Dict[str, float],
-    initial_module: str = None
-) -> List[TestCase]:
-    """
-    Reordena respeitando a sequência lógica (dependências) e usando risco/contexto
-    apenas como critérios de desempate entre testes "executáveis".
-
-    Lógica:
-    - Primeiro: respeitar `dependencies` explícitas + dependências inferidas por pre/postconditions.
-    - Depois: entre candidatos executáveis, priorizar risco de falha + contexto + prioridade.
-    """
-
-    test_by_id = {t.id: t for t in test_cases}
-    base_rank = {tid: idx for idx, tid in enumerate(base_order_ids)}
-
-    # Inferir dependências lógicas via pre/postconditions dentro do conjunto selecionado
-    # IMPORTANTE: pré-condição pode ter múltiplos provedores; escolher 1 provedor (melhor) evita
-    # "super-dependências" (exigir todos os provedores) que geram ciclos e falsos conflitos.
-    post_providers: Dict[str, List[str]] = {}
-    for tc in test_cases:
-        for pc in tc.get_postconditions():
-            post_providers.setdefault(pc, []).append(tc.id)
-
-    inferred_deps: Dict[str, set] = {tc.id: set(tc.dependencies) for tc in test_cases}
-    
-    # IMPORTANTE: Respeitar parent_test_id como dependência explícita
-    for tc in test_cases:
-        if tc.parent_test_id and tc.parent_test_id in {t.id for t in test_cases}:
-            inferred_deps[tc.id].add(tc.parent_test_id)
-    
-    for tc in test_cases:
-        for pre in tc.get_preconditions():
-            providers = [pid for pid in post_providers.get(pre, []) if pid != tc.id]
-            if not providers:
-                continue
-            
-            # Priorizar dependências explícitas: se já existe uma dependência explícita que fornece essa pré-condição,
-            # usar ela em vez de inferir outra
-            explicit_providers = [pid for pid in providers if pid in inferred_deps[tc.id]]
-            if explicit_providers:
-                # Já temos uma dependência explícita que fornece essa pré-condição, não adicionar outra
-                continue
-            
-            # Escolher provedor mais "natural" pela ordem base (mais cedo no base_rank)
-            best = min(providers, key=lambda pid: base_rank.get(pid, 10_000))
-            inferred_deps[tc.id].add(best)
-
-    remaining = set(test_cases)
-    ordered: List[TestCase] = []
-    current_module = initial_module
-    current_state = set()  # simulação simples de estado para preferir sequências compatíveis
-
-    while remaining:
-        executed_ids = {t.id for t in ordered}
-
-        # 1) Candidatos cujas dependências (explícitas + inferidas) estão satisfeitas
-        executable: List[TestCase] = []
-        for tc in remaining:
-            deps = inferred_deps.get(tc.id, set(tc.dependencies))
-            if all(dep_id in executed_ids for dep_id in deps):
-                executable.append(tc)
-
-        # Se houver ciclo/impasse, liberar pelo menos um teste (fallback seguro)
-        if not executable:
-            executable = list(remaining)
-
-        def _state_compatibility(tc: TestCase) -> float:
-            # Considerar apenas pré-condições "internas" (que alguém da seleção produz).
-            pre_all = tc.get_preconditions()
-            pre_internal = {p for p in pre_all if p in post_providers}
-            if not pre_internal:
-                return 1.0
-            return len(current_state.intersection(pre_internal)) / max(len(pre_internal), 1)
-
-        def _score(tc: TestCase):
-            same_mod_bonus = 0.05 if current_module and tc.module == current_module else 0.0
-            compat = _state_compatibility(tc)
-            # Penalizar se ainda falta muita precondição (mesmo deps satisfeitas, pode indicar necessidade de setup)
-            pre_penalty = 0.0
-            pre_all = tc.get_preconditions()
-            pre_internal = {p for p in pre_all if p in post_providers}
-            if pre_internal:
-                pre_penalty = (1.0 - compat) * 0.25
-            return (
-                -risk_map.get(tc.id, 0.0),                           # risco (falha) alto primeiro
-                -(affinity_map.get(tc.id, 0.0) + same_mod_bonus),   # contexto
-                -tc.priority,                                       # prioridade alta
-                -compat,                                            # preferir sequência que encaixa no estado atual
-                pre_penalty,                                        # evitar testes "fora de sequência"
-                tc.module,                                          # agrupar módulo
-                tc.has_destructive_actions(),                       # não-destrutivo primeiro
-                base_rank.get(tc.id, 10_000),                       # preservar tendência do modelo base
-                tc.get_total_estimated_time()                       # rápidos antes
-            )
-
-        executable.sort(key=_score)
-        next_test = executable[0]
-        ordered.append(next_test)
-        remaining.remove(next_test)
-        current_module = next_test.module
-        # Atualizar estado "lógico"
-        current_state.update(next_test.get_postconditions())
-        # Se destrutivo, considerar que pode invalidar estado (aprox.)
-        if next_test.has_destructive_actions():
-            current_state = set()
-
-    return ordered
+    return {
+        "risk_map": risk_map,
+        "order_risk_map": order_risk_map,
+        "affinity_map": affinity_map,
+        "context": context
+    }
 
 def _hierarchical_reorder(
     test_cases: List[TestCase],
     base_order_ids: List[str],
     risk_map: Dict[str, float],
-    affinity_map: Dict[str, float]
+    affinity_map: Dict[str, float],
+    graph: Optional[DependencySubgraph] = None
 ) -> List[TestCase]:
     """
     Reordena testes usando estrutura hierárquica quando disponível.
@@ -479,7 +339,7 @@ def _hierarchical_reorder(
     
     if not has_hierarchy:
         # Sem hierarquia: usar ordenação contextual normal
-        return _contextual_reorder(test_cases, base_order_ids, risk_map, affinity_map)
+        return _contextual_reorder(test_cases, base_order_ids, risk_map, affinity_map, graph=graph)
     
     # Agrupar testes por caminho compartilhado
     groups = group_tests_by_shared_path(test_cases)
@@ -564,109 +424,297 @@ def _hierarchical_reorder(
     
     return final_order
 
-def _repair_order_for_logic(test_cases: List[TestCase], order_ids: List[str]) -> List[str]:
+def _get_user_experience_level(user_id: int) -> str:
+    """Retorna o nível de experiência do usuário (default: beginner)."""
+    cursor = db.conn.cursor()
+    cursor.execute("SELECT experience_level FROM users WHERE id = ?", (user_id,))
+    row = cursor.fetchone()
+    return row['experience_level'] if row else 'beginner'
+
+def _get_explainer() -> RecommendationExplainer:
+    """Retorna o explicador global, criando-o se necessário."""
+    global explainer
+    # Recriar se o modelo global foi substituído (ex.: carregado de arquivo)
+    if explainer is None or explainer.model is not recommender.global_recommender.model:
+        explainer = RecommendationExplainer.from_recommender(recommender.global_recommender)
+    return explainer
+
+def _recommendation_cache_key(user_id: int, test_ids: List[str]):
+    """Chave do cache: usuário + seleção + versões dos modelos + bucket de contexto + versão do risco."""
+    now = datetime.now()
+    context_bucket = f"{_get_time_bucket(now)}:{'weekend' if now.weekday() >= 5 else 'weekday'}"
+    # A primeira carga alimenta o OnlineRiskModel: a versão só vale depois dela
+    context_stats.ensure_loaded()
+    return recommendation_cache.make_key(
+        user_id,
+        test_ids,
+        recommender.get_model_versions(user_id, db),
+        context_bucket,
+        online_risk.version
+    )
+
+def _build_recommendation(
+    user_id: int,
+    testes_selecionados: List[TestCase],
+    all_tests_map: Dict[str, TestCase],
+    explain: bool = True,
+    explore_risk: bool = False
+):
     """
-    "Repair" de ordem para garantir consistência lógica:
-    - respeita dependencies explícitas
-    - respeita pré-condições internas (produzidas por algum teste da seleção)
-    - usa topological sort estável (mantém o máximo possível da ordem original)
-    - se detectar ciclo por dependências inferidas, cai para apenas dependencies explícitas
+    Executa o pipeline completo de recomendação (modelo + contexto/risco + repair + explicação).
+    
+    Args:
+        explain: Se False, a explicação não é gerada (modo adiado)
+        explore_risk: Se True, ordena por riscos sorteados do posterior (Thompson sampling)
+    
+    Returns:
+        Tupla (RecommendationResult, risk_map, context_info, explanation, metrics),
+        onde metrics são as métricas de transição da ordem final
     """
-    if not test_cases or not order_ids:
-        return order_ids
+    metrics = None
+    durations = None
+    # Subgrafo de dependências da seleção, recortado do grafo do catálogo do usuário
+    dependency_graph = dependency_graphs.get(user_id, lambda: list(all_tests_map.values())).subgraph(testes_selecionados)
+
+    # Seleções muito grandes: a ordem base (quadrática) é calculada por partição na decomposição
+    decompose = len(testes_selecionados) >= decomposition_orderer.min_tests
+    if decompose:
+        recomendacao = RecommendationResult(
+            recommended_order=[tc.id for tc in testes_selecionados],
+            estimated_total_time=0.0,
+            estimated_resets=0,
+            confidence_score=0.6,
+            reasoning={'method': 'decomposition', 'num_tests': len(testes_selecionados)}
+        )
+    else:
+        # Obter nível de experiência do usuário
+        experience_level = _get_user_experience_level(user_id)
+        
+        # O peso será calculado automaticamente baseado no nível de experiência
+        recomendacao = recommender.recommend_order(
+            user_id=user_id,
+            test_cases=testes_selecionados,
+            db=db,
+            experience_level=experience_level
+        )
 
-    test_by_id = {t.id: t for t in test_cases}
-    order = [tid for tid in order_ids if tid in test_by_id]
-    pos = {tid: idx for idx, tid in enumerate(order)}
+    # ==================== MELHORIAS IA: CONTEXTO + PREDIÇÃO DE FALHA (MVP) ====================
+    try:
+        ctx = _compute_context_and_failure_risk(
+            user_id, testes_selecionados, all_tests_map, explore=explore_risk, graph=dependency_graph
+        )
+        risk_map = ctx["risk_map"]
+        order_risk_map = ctx["order_risk_map"]
+        affinity_map = ctx["affinity_map"]
+        context_info = ctx["context"]
 
-    # mapear provedores de pós-condições
-    post_providers: Dict[str, List[str]] = {}
-    for tc in test_cases:
-        for st in tc.get_postconditions():
-            post_providers.setdefault(st, []).append(tc.id)
-
-    def build_edges(include_inferred: bool):
-        outgoing: Dict[str, List[str]] = {tid: [] for tid in order}
-        indeg: Dict[str, int] = {tid: 0 for tid in order}
-
-        def add_edge(a: str, b: str):
-            if a == b:
-                return
-            if a not in outgoing or b not in indeg:
-                return
-            # evitar duplicados
-            if b in outgoing[a]:
-                return
-            outgoing[a].append(b)
-            indeg[b] += 1
-
-        # dependencies explícitas
-        for tid in order:
-            tc = test_by_id[tid]
-            # Respeitar dependencies explícitas
-            for dep in tc.dependencies:
-                if dep in test_by_id:
-                    add_edge(dep, tid)
-            # IMPORTANTE: Respeitar parent_test_id como dependência explícita
-            if tc.parent_test_id and tc.parent_test_id in test_by_id:
-                add_edge(tc.parent_test_id, tid)
-
-        if include_inferred:
-            # inferir dependências via pré-condições: escolher provedor mais próximo ANTES na ordem atual
-            for tid in order:
-                tc = test_by_id[tid]
-                pre = tc.get_preconditions()
-                for req in pre:
-                    providers = [p for p in post_providers.get(req, []) if p in pos and p != tid]
-                    if not providers:
-                        continue
-                    
-                    # Priorizar dependências explícitas: se já existe uma dependência explícita que fornece essa pré-condição,
-                    # usar ela em vez de inferir outra
-                    explicit_providers = [p for p in providers if p in tc.dependencies or p == tc.parent_test_id]
-                    if explicit_providers:
-                        # Usar a dependência explícita que fornece essa pré-condição
-                        best = explicit_providers[0]
-                    else:
-                        # escolher provedor mais próximo antes; se nenhum antes, escolher o mais cedo
-                        before = [p for p in providers if pos[p] < pos[tid]]
-                        if before:
-                            best = max(before, key=lambda p: pos[p])
-                        else:
-                            best = min(providers, key=lambda p: pos[p])
-                    add_edge(best, tid)
-
-        return outgoing, indeg
-
-    def topo_sort(outgoing: Dict[str, List[str]], indeg: Dict[str, int]) -> List[str]:
-        # Kahn com estabilidade por posição original
-        zeros = [tid for tid in order if indeg.get(tid, 0) == 0]
-        zeros.sort(key=lambda t: pos.get(t, 10_000))
-        res: List[str] = []
-        indeg_local = dict(indeg)
-        while zeros:
-            tid = zeros.pop(0)
-            res.append(tid)
-            for nxt in outgoing.get(tid, []):
-                indeg_local[nxt] -= 1
-                if indeg_local[nxt] == 0:
-                    zeros.append(nxt)
-                    zeros.sort(key=lambda t: pos.get(t, 10_000))
-        return res
-
-    # tentar com inferidas; se ciclo, cair para explícitas
-    out1, indeg1 = build_edges(include_inferred=True)
-    res1 = topo_sort(out1, indeg1)
-    if len(res1) == len(order):
-        return res1
-
-    out2, indeg2 = build_edges(include_inferred=False)
-    res2 = topo_sort(out2, indeg2)
-    if len(res2) == len(order):
-        return res2
-
-    # fallback final: ordem original
-    return order_ids
+        # Verificar se há hierarquia
+        has_hierarchy = any(
+            tc.parent_test_id or tc.child_test_ids or 
+            tc.context_preserving or tc.teardown_restores
+            for tc in testes_selecionados
+        )
+
+        if decompose:
+            # Partições ordenadas de forma independente e encadeadas pela matriz de transição
+            decomposition = decomposition_orderer.order(
+                testes_selecionados,
+                risk_map=order_risk_map,
+                affinity_map=affinity_map,
+                initial_module=context_info.get("last_module"),
+                graph=dependency_graph
+            )
+            reordered_tests = [all_tests_map[tid] for tid in decomposition.order]
+            recomendacao.reasoning["decomposition"] = decomposition.to_dict()
+        elif has_hierarchy:
+            # Usar ordenação hierárquica
+            reordered_tests = _hierarchical_reorder(
+                testes_selecionados,
+                recomendacao.recommended_order,
+                risk_map=order_risk_map,
+                affinity_map=affinity_map,
+                graph=dependency_graph
+            )
+            # Calcular resets com hierarquia
+            recomendacao.estimated_resets = OrderMetrics.from_order(reordered_tests).hierarchy_resets
+            # Calcular score hierárquico
+            test_by_id_map = {tc.id: tc for tc in testes_selecionados}
+            hierarchy_score = calculate_hierarchy_score(reordered_tests, test_by_id_map)
+            recomendacao.reasoning["hierarchical_ordering"] = True
+            recomendacao.reasoning["hierarchy_score"] = hierarchy_score
+        else:
+            # Usar ordenação contextual normal
+            reordered_tests = _contextual_reorder(
+                testes_selecionados,
+                recomendacao.recommended_order,
+                risk_map=order_risk_map,
+                affinity_map=affinity_map,
+                initial_module=context_info.get("last_module"),
+                graph=dependency_graph
+            )
+
+        # Atualizar recomendação final
+        raw_ids = [t.id for t in reordered_tests]
+        # Repair final: garantir sequência lógica sempre na ordem da IA (sem "esconder")
+        fixed_ids = _repair_order_for_logic(testes_selecionados, raw_ids, graph=dependency_graph)
+        recomendacao.recommended_order = fixed_ids
+
+        fixed_tests = [all_tests_map[tid] for tid in fixed_ids if tid in all_tests_map]
+        # Métricas da ordem final (uma passada): reaproveitadas pela explicação
+        metrics = OrderMetrics.from_order(fixed_tests)
+        # Tempo total pela duração aprendida (a soma das estimativas das ações fica no reasoning)
+        durations = duration_model.predict_many(user_id, fixed_tests)
+        recomendacao.estimated_total_time = sum(durations.values())
+        recomendacao.reasoning["static_total_time"] = metrics.total_time
+        # Ações iniciais repetidas que a execução hierárquica pode pular nesta ordem
+        recomendacao.reasoning["prefix_sharing"] = prefix_planner.plan(fixed_tests).to_dict()
+        if decompose and has_hierarchy:
+            recomendacao.estimated_resets = metrics.hierarchy_resets
+        elif not has_hierarchy:
+            recomendacao.estimated_resets = metrics.resets
+        recomendacao.reasoning["contextual_enabled"] = True
+        recomendacao.reasoning["failure_prediction_enabled"] = True
+        recomendacao.reasoning["context"] = context_info
+        recomendacao.reasoning["logic_repaired"] = (fixed_ids != raw_ids)
+    except Exception as e:
+        print(f"Erro ao aplicar contexto/predição de falha: {e}")
+        import traceback
+        traceback.print_exc()
+        risk_map = {}
+        context_info = {}
+    
+    # Gerar explicação da recomendação
+    explanation = None
+    if explain:
+        explanation = _explain_order(testes_selecionados, recomendacao.recommended_order, metrics, durations)
+    
+    return recomendacao, risk_map, context_info, explanation, metrics
+
+def _plan_time_budget(
+    user_id: int,
+    testes_selecionados: List[TestCase],
+    all_tests_map: Dict[str, TestCase],
+    time_budget: float
+) -> BudgetPlan:
+    """
+    Escolhe, entre os testes pedidos, os que cabem no orçamento de tempo
+    
+    Valor de cada teste = prioridade × risco de falha (média do posterior);
+    tempo = duração prevista. Dependências e pai entre os pedidos entram junto
+    com o teste (fecho), para que todo teste escolhido seja executável.
+    
+    Args:
+        user_id: ID do usuário
+        testes_selecionados: Testes pedidos
+        all_tests_map: Catálogo do usuário
+        time_budget: Tempo disponível em segundos
+    
+    Returns:
+        BudgetPlan com os testes escolhidos (na ordem do pedido)
+    """
+    graph = dependency_graphs.get(user_id, lambda: list(all_tests_map.values())).subgraph(testes_selecionados)
+    risk_map = _compute_context_and_failure_risk(user_id, testes_selecionados, all_tests_map, graph=graph)["risk_map"]
+    return budget_planner.plan(
+        graph.ids,
+        duration_model.predict_many(user_id, testes_selecionados),
+        {tc.id: tc.priority * risk_map.get(tc.id, 0.0) for tc in testes_selecionados},
+        graph.explicit,
+        time_budget
+    )
+
+def _explain_order(
+    testes_selecionados: List[TestCase],
+    recommended_order: List[str],
+    metrics: Optional[OrderMetrics] = None,
+    durations: Optional[Dict[str, float]] = None
+):
+    """
+    Gera a explicação de uma ordem (completa com modelo treinado, básica caso contrário).
+    
+    Args:
+        testes_selecionados: Testes da recomendação
+        recommended_order: Ordem recomendada
+        metrics: Métricas de transição calculadas na ordenação (evita recalcular)
+        durations: Durações previstas por teste (tempo total e comparação de ordens)
+    """
+    explanation = None
+    
+    try:
+        if recommender.global_recommender.is_trained:
+            # Modelo treinado: usar explicação completa
+            explanation = _get_explainer().explain_recommendation(
+                testes_selecionados,
+                recommended_order,
+                metrics=metrics,
+                durations=durations
+            )
+        else:
+            # Modelo não treinado: gerar explicação básica baseada em heurísticas
+            explanation = _generate_basic_explanation(
+                testes_selecionados,
+                recommended_order,
+                durations
+            )
+    except Exception as e:
+        print(f"Erro ao gerar explicação: {e}")
+        import traceback
+        traceback.print_exc()
+        # Mesmo com erro, tentar explicação básica
+        try:
+            explanation = _generate_basic_explanation(
+                testes_selecionados,
+                recommended_order,
+                durations
+            )
+        except:
+            pass
+    
+    return explanation
+
+def _explain_and_cache(
+    cache_key,
+    testes_selecionados: List[TestCase],
+    recommended_order: List[str],
+    metrics: Optional[OrderMetrics] = None,
+    durations: Optional[Dict[str, float]] = None
+):
+    """Job do pool de explicações: gera a explicação e a anexa ao cache de recomendações."""
+    explanation = _explain_order(testes_selecionados, recommended_order, metrics, durations)
+    if cache_key is not None:
+        recommendation_cache.attach_explanation(cache_key, explanation)
+    return explanation
+
+def _bootstrap_anomaly_detector(user_id: int, fit_now: bool = False):
+    """Carrega todo o histórico do usuário no detector de anomalias incremental"""
+    cursor = db.conn.cursor()
+    cursor.execute("""
+        SELECT 
+            test_case_id,
+            executed_at,
+            actual_execution_time,
+            success,
+            tester_rating,
+            required_reset,
+            followed_recommendation
+        FROM feedbacks
+        WHERE tester_id = ?
+        ORDER BY id ASC
+    """, (user_id,))
+    
+    feedbacks = [
+        ExecutionFeedback(
+            test_case_id=row['test_case_id'],
+            executed_at=datetime.fromisoformat(row['executed_at']),
+            actual_execution_time=row['actual_execution_time'],
+            success=bool(row['success']),
+            tester_rating=row['tester_rating'],
+            required_reset=bool(row['required_reset']),
+            followed_recommendation=bool(row['followed_recommendation'])
+        )
+        for row in cursor.fetchall()
+    ]
+    test_dict = {tc.id: tc for tc in testes}
+    streaming_anomaly_detector.bootstrap(user_id, feedbacks, test_dict, fit_now=fit_now)
 
 def hash_password(password: str) -> str:
     """Gera hash SHA-256 da senha"""
@@ -1112,7 +1160,26 @@ def get_filter_options():
 @app.route('/api/recomendacao', methods=['GET', 'POST'])
 @login_required
 def get_recomendacao():
-    """Gera recomendação de ordenação (para testes selecionados ou todos)"""
+    """
+    Gera recomendação de ordenação (para testes selecionados ou todos)
+    
+    Com defer_explanation=true (JSON no POST ou query string), a explicação não
+    é calculada na requisição: a resposta traz explanation_job com a URL para
+    buscá-la em /api/explain/recommendation/<recommendation_id>.
+    
+    Com explore_risk=true, os testes de maior risco são ordenados por riscos
+    sorteados do posterior (Thompson sampling): testes com pouca evidência
+    ocasionalmente sobem na ordem. Essas recomendações não usam o cache.
+    
+    Com time_budget (segundos), apenas o subconjunto dos testes pedidos de
+    maior valor (prioridade × risco) que cabe no orçamento, pela duração
+    prevista e com dependências/pai incluídos, é ordenado; a resposta traz
+    o plano em time_budget.
+    
+    Com pareto=true, a resposta traz em pareto_front até 5 ordens da mesma
+    seleção (a recomendada e as melhores em tempo total, resets e tempo
+    esperado até a primeira falha), para comparação sem novas requisições.
+    """
     
     # Obter ID do usuário logado
     user_id = session.get('user_id')
@@ -1126,9 +1193,41 @@ def get_recomendacao():
         data = request.json
         test_ids = data.get('test_ids', [])
         testes_selecionados = [t for t in all_available_tests if t.id in test_ids]
+        defer_explanation = bool(data.get('defer_explanation', False))
+        explore_risk = bool(data.get('explore_risk', False))
+        time_budget = data.get('time_budget')
+        include_pareto = bool(data.get('pareto', False))
     else:
         # GET: todos os testes
         testes_selecionados = all_available_tests
+        defer_explanation = request.args.get('defer_explanation', 'false').lower() == 'true'
+        explore_risk = request.args.get('explore_risk', 'false').lower() == 'true'
+        time_budget = request.args.get('time_budget')
+        include_pareto = request.args.get('pareto', 'false').lower() == 'true'
+    
+    # Orçamento de tempo: restringe a seleção ao melhor subconjunto executável
+    budget_plan = None
+    if time_budget is not None and testes_selecionados:
+        try:
+            time_budget = float(time_budget)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'time_budget deve ser um número de segundos'}), 400
+        if not math.isfinite(time_budget) or time_budget <= 0:
+            return jsonify({'error': 'time_budget deve ser um número positivo e finito'}), 400
+        budget_plan = _plan_time_budget(user_id, testes_selecionados, all_tests_map, time_budget)
+        if not budget_plan.selected:
+            return jsonify({
+                'error': 'Nenhum teste cabe no orçamento de tempo',
+                'time_budget': budget_plan.to_dict(),
+                'order': [],
+                'details': [],
+                'total_time': 0,
+                'estimated_resets': 0,
+                'confidence': 0,
+                'method': 'N/A'
+            }), 400
+        selected_ids = set(budget_plan.selected)
+        testes_selecionados = [t for t in testes_selecionados if t.id in selected_ids]
     
     if len(testes_selecionados) == 0:
         return jsonify({
@@ -1141,85 +1240,31 @@ def get_recomendacao():
             'method': 'N/A'
         }), 400
     
-    # Obter nível de experiência do usuário
-    cursor = db.conn.cursor()
-    cursor.execute("SELECT experience_level FROM users WHERE id = ?", (user_id,))
-    row = cursor.fetchone()
-    experience_level = row['experience_level'] if row else 'beginner'
-    
-    # O peso será calculado automaticamente baseado no nível de experiência
-    recomendacao = recommender.recommend_order(
-        user_id=user_id,
-        test_cases=testes_selecionados,
-        db=db,
-        experience_level=experience_level
-    )
-
-    # ==================== MELHORIAS IA: CONTEXTO + PREDIÇÃO DE FALHA (MVP) ====================
-    try:
-        ctx = _compute_context_and_failure_risk(user_id, testes_selecionados, all_tests_map)
-        risk_map = ctx["risk_map"]
-        affinity_map = ctx["affinity_map"]
-        context_info = ctx["context"]
-
-        # Verificar se há hierarquia
-        has_hierarchy = any(
-            tc.parent_test_id or tc.child_test_ids or 
-            tc.context_preserving or tc.teardown_restores
-            for tc in testes_selecionados
+    # Cache: mesma seleção + mesmos modelos + mesmo contexto => mesma recomendação
+    cache_key = _recommendation_cache_key(user_id, [t.id for t in testes_selecionados])
+    cached = recommendation_cache.get(cache_key) if not explore_risk else None
+    if cached is not None:
+        recomendacao = cached.result
+        risk_map = cached.risk_map
+        context_info = cached.context
+        explanation = cached.explanation
+        metrics = cached.metrics
+        recomendacao.reasoning["cache_hit"] = True
+        recomendacao.reasoning["cache_age_seconds"] = round(recommendation_cache.age_seconds(cached), 1)
+    else:
+        recomendacao, risk_map, context_info, explanation, metrics = _build_recommendation(
+            user_id, testes_selecionados, all_tests_map,
+            explain=not defer_explanation, explore_risk=explore_risk
         )
-
-        if has_hierarchy:
-            # Usar ordenação hierárquica
-            reordered_tests = _hierarchical_reorder(
-                testes_selecionados,
-                recomendacao.recommended_order,
-                risk_map=risk_map,
-                affinity_map=affinity_map
-            )
-            # Calcular resets com hierarquia
-            recomendacao.estimated_resets = estimate_resets_with_hierarchy(reordered_tests)
-            # Calcular score hierárquico
-            test_by_id_map = {tc.id: tc for tc in testes_selecionados}
-            hierarchy_score = calculate_hierarchy_score(reordered_tests, test_by_id_map)
-            recomendacao.reasoning["hierarchical_ordering"] = True
-            recomendacao.reasoning["hierarchy_score"] = hierarchy_score
-        else:
-            # Usar ordenação contextual normal
-            reordered_tests = _contextual_reorder(
-                testes_selecionados,
-                recomendacao.recommended_order,
-                risk_map=risk_map,
-                affinity_map=affinity_map,
-                initial_module=context_info.get("last_module")
-            )
-            recomendacao.estimated_resets = _estimate_resets_from_order(reordered_tests)
-
-        # Atualizar recomendação final
-        raw_ids = [t.id for t in reordered_tests]
-        # Repair final: garantir sequência lógica sempre na ordem da IA (sem "esconder")
-        fixed_ids = _repair_order_for_logic(testes_selecionados, raw_ids)
-        recomendacao.recommended_order = fixed_ids
-
-        fixed_tests = [all_tests_map[tid] for tid in fixed_ids if tid in all_tests_map]
-        recomendacao.estimated_total_time = sum(t.get_total_estimated_time() for t in fixed_tests)
-        if not has_hierarchy:
-            recomendacao.estimated_resets = _estimate_resets_from_order(fixed_tests)
-        recomendacao.reasoning["contextual_enabled"] = True
-        recomendacao.reasoning["failure_prediction_enabled"] = True
-        recomendacao.reasoning["context"] = context_info
-        recomendacao.reasoning["logic_repaired"] = (fixed_ids != raw_ids)
-    except Exception as e:
-        print(f"Erro ao aplicar contexto/predição de falha: {e}")
-        import traceback
-        traceback.print_exc()
-        risk_map = {}
-        context_info = {}
+        recomendacao.reasoning["cache_hit"] = False
+        if not explore_risk:
+            recommendation_cache.put(cache_key, recomendacao, risk_map, explanation, context_info, metrics=metrics)
     
     # Detalhes de cada teste na ordem recomendada (inclui risco de falha e info hierárquica)
+    durations = duration_model.predict_many(user_id, testes_selecionados)
     ordem_detalhada = []
     for test_id in recomendacao.recommended_order:
-        tc = next((t for t in testes_selecionados if t.id == test_id), None)
+        tc = all_tests_map.get(test_id)
         if tc:
             composition = tc.get_impact_composition()
             test_detail = {
@@ -1228,6 +1273,7 @@ def get_recomendacao():
                 'module': tc.module,
                 'priority': tc.priority,
                 'estimated_time': tc.get_total_estimated_time(),
+                'predicted_time': round(durations[tc.id], 1),  # duração aprendida dos feedbacks
                 'is_destructive': tc.has_destructive_actions(),
                 'impact_level': tc.get_impact_level(),
                 'impact_composition': composition,
@@ -1246,42 +1292,6 @@ def get_recomendacao():
                 test_detail['validation_point_action'] = tc.validation_point_action
             ordem_detalhada.append(test_detail)
     
-    # Gerar explicação da recomendação
-    explanation = None
-    global explainer
-    
-    try:
-        if recommender.global_recommender.is_trained:
-            # Modelo treinado: usar explicação completa
-            if explainer is None or not hasattr(explainer, 'model'):
-                explainer = RecommendationExplainer(
-                    recommender.global_recommender.model,
-                    recommender.global_recommender.feature_extractor
-                )
-            
-            explanation = explainer.explain_recommendation(
-                testes_selecionados,
-                recomendacao.recommended_order
-            )
-        else:
-            # Modelo não treinado: gerar explicação básica baseada em heurísticas
-            explanation = _generate_basic_explanation(
-                testes_selecionados,
-                recomendacao.recommended_order
-            )
-    except Exception as e:
-        print(f"Erro ao gerar explicação: {e}")
-        import traceback
-        traceback.print_exc()
-        # Mesmo com erro, tentar explicação básica
-        try:
-            explanation = _generate_basic_explanation(
-                testes_selecionados,
-                recomendacao.recommended_order
-            )
-        except:
-            pass
-    
     # Salvar recomendação no banco de dados
     recommendation_id = None
     try:
@@ -1302,6 +1312,37 @@ def get_recomendacao():
         import traceback
         traceback.print_exc()
     
+    # Alternativas Pareto-ótimas à ordem recomendada
+    pareto_front = None
+    if include_pareto:
+        try:
+            graph = dependency_graphs.get(user_id, lambda: list(all_tests_map.values())).subgraph(testes_selecionados)
+            pareto_front = pareto_search.search(
+                testes_selecionados,
+                recomendacao.recommended_order,
+                risk_map,
+                durations,
+                graph.explicit
+            )
+        except Exception as e:
+            print(f"Erro ao calcular fronteira de Pareto: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    # Explicação ainda não calculada (modo adiado agora ou na entrada do cache)
+    explanation_job = None
+    if explanation is None:
+        if defer_explanation and recommendation_id is not None:
+            job = explanation_jobs.submit(
+                recommendation_id, user_id, _explain_and_cache,
+                cache_key, testes_selecionados, recomendacao.recommended_order, metrics, durations
+            )
+            explanation_job = explanation_jobs.handle(job)
+        else:
+            explanation = _explain_and_cache(
+                cache_key, testes_selecionados, recomendacao.recommended_order, metrics, durations
+            )
+    
     return jsonify({
         'order': recomendacao.recommended_order,
         'details': ordem_detalhada,
@@ -1310,12 +1351,28 @@ def get_recomendacao():
         'confidence': recomendacao.confidence_score,
         'method': recomendacao.reasoning.get('method', 'N/A'),
         'training_samples': recomendacao.reasoning.get('training_samples', 0),
+        'reasoning': recomendacao.reasoning,
         'explanation': explanation,  # NOVO: Explicação da IA
+        'explanation_job': explanation_job,  # Explicação adiada (None se já incluída)
         'context': context_info,     # NOVO: contexto usado na recomendação
+        'time_budget': budget_plan.to_dict() if budget_plan else None,  # plano do orçamento de tempo
+        'pareto_front': pareto_front,  # ordens alternativas não dominadas (pareto=true)
         'recommendation_id': recommendation_id  # NOVO: ID da recomendação salva
     })
 
 
+@app.route('/api/duration-model/metrics')
+@login_required
+def get_duration_model_metrics():
+    """
+    Erros da previsão de duração comparados à estimativa estática (soma das ações)
+    
+    Cada execução é avaliada antes de ser incorporada ao modelo (prequencial):
+    MAE/RMSE/MAPE no histórico completo e nas execuções do usuário logado.
+    """
+    return jsonify(duration_model.metrics(session.get('user_id')))
+
+
 @app.route('/api/estatisticas')
 @login_required
 def get_estatisticas():
@@ -1454,20 +1511,9 @@ def add_feedback():
         accepted_order_ids = data.get('accepted_order', [])
         accepted_order = [t for t in all_available_tests if t.id in accepted_order_ids]
         
-        # Adicionar feedback ao recommender (ML global + personalizado)
-        # user_id já foi obtido acima
-        recommender.add_feedback(
-            user_id=user_id,
-            feedback=feedback,
-            test_order=accepted_order,
-            db=db
-        )
-        
-        # Atualizar estatísticas de aprendizado do usuário
-        if user_id:
-            recommender.update_user_learning_stats(user_id, db)
-        
-        # Salvar feedback no banco de dados SQLite (com tester_id)
+        # Salvar feedback no banco de dados SQLite (com tester_id) ANTES de
+        # atualizar os modelos: o modelo persistido (write-behind) nunca pode
+        # conter um feedback que não esteja na tabela feedbacks
         feedback_dict = {
             'tester_id': session.get('user_id'),  # NOVO: ID do testador
             'test_case_id': feedback.test_case_id,
@@ -1481,7 +1527,59 @@ def add_feedback():
             'initial_state': feedback.initial_state,
             'final_state': feedback.final_state
         }
-        db.add_feedback(feedback_dict)
+        feedback_id = db.add_feedback(feedback_dict)
+        feedback_test = next(
+            (t for t in all_available_tests if t.id == feedback.test_case_id), None
+        )
+        context_stats.record(
+            user_id,
+            feedback.test_case_id,
+            feedback.executed_at,
+            feedback.success,
+            feedback_test.module if feedback_test else "N/A"
+        )
+        if feedback_test:
+            duration_model.record(
+                user_id, feedback_test, feedback.actual_execution_time,
+                feedback_id=feedback_id
+            )
+        
+        # Adicionar feedback ao recommender (ML global + personalizado)
+        # user_id já foi obtido acima
+        global_version_before = recommender.global_recommender.model_version
+        recommender.add_feedback(
+            user_id=user_id,
+            feedback=feedback,
+            test_order=accepted_order,
+            db=db,
+            feedback_id=feedback_id
+        )
+        
+        # Atualizar detector de anomalias incremental (O(1) por feedback)
+        if user_id:
+            if streaming_anomaly_detector.is_loaded(user_id):
+                streaming_anomaly_detector.ingest(user_id, feedback, {tc.id: tc for tc in testes})
+            else:
+                _bootstrap_anomaly_detector(user_id)
+        
+        # Invalidar recomendações em cache: o feedback muda contexto/risco do usuário
+        # e, se o modelo global foi re-treinado, todas as entradas ficam obsoletas
+        if recommender.global_recommender.model_version != global_version_before:
+            recommendation_cache.clear()
+        else:
+            recommendation_cache.invalidate_user(user_id)
+        
+        # Atualizar estatísticas de aprendizado do usuário (incremental;
+        # módulo resolvido no catálogo atual, incluindo testes personalizados)
+        if user_id:
+            test_to_module = {t.id: t.module for t in all_available_tests}
+            recommender.update_user_learning_stats(
+                user_id, db,
+                feedback=feedback,
+                module=test_to_module.get(feedback.test_case_id),
+                test_to_module=test_to_module
+            )
+        
         
         # Obter estatísticas do usuário
         user_id = session.get('user_id')
@@ -1497,7 +1595,9 @@ def add_feedback():
             
             # Verificar e criar notificações automáticas
             try:
-                notification_manager.check_all_user_alerts(user_id)
+                notification_manager.check_all_user_alerts(
+                    user_id, training_samples=recommender.get_training_samples(user_id, db)
+                )
             except Exception as e:
                 print(f"Erro ao verificar alertas: {e}")
         
@@ -1676,106 +1776,325 @@ def explain_recommendation(test_ids):
     if not testes_selecionados:
         return jsonify({'error': 'Testes não encontrados'}), 404
     
-    # Obter recomendação
-    user_id = session.get('user_id')
-    cursor = db.conn.cursor()
-    cursor.execute("SELECT experience_level FROM users WHERE id = ?", (user_id,))
-    row = cursor.fetchone()
-    experience_level = row['experience_level'] if row else 'beginner'
+    if not recommender.global_recommender.is_trained:
+        return jsonify({'error': 'Modelo não treinado ainda'}), 400
     
+    # Reaproveitar a explicação da recomendação em cache (mesma seleção/modelos/contexto)
+    cached = recommendation_cache.get(
+        _recommendation_cache_key(user_id, [t.id for t in testes_selecionados])
+    )
+    if cached is not None and cached.explanation is not None:
+        explanation = cached.explanation
+        explanation['cache_hit'] = True
+        return jsonify(explanation)
+    
+    # Obter recomendação
     recomendacao = recommender.recommend_order(
         user_id=user_id,
         test_cases=testes_selecionados,
         db=db,
-        experience_level=experience_level
+        experience_level=_get_user_experience_level(user_id)
     )
     
     # Gerar explicação
-    global explainer
-    if recommender.global_recommender.is_trained:
-        if explainer is None or not hasattr(explainer, 'model'):
-            explainer = RecommendationExplainer(
-                recommender.global_recommender.model,
-                recommender.global_recommender.feature_extractor
-            )
+    try:
+        explanation = _get_explainer().explain_recommendation(
+            testes_selecionados,
+            recomendacao.recommended_order,
+            durations=duration_model.predict_many(user_id, testes_selecionados)
+        )
+        return jsonify(explanation)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/explain/recommendation/<int:recommendation_id>')
+@login_required
+def get_recommendation_explanation(recommendation_id):
+    """
+    Explicação de uma recomendação salva (modo adiado)
+    
+    Retorna 202 enquanto a explicação está sendo calculada. Se não houver job
+    (ex.: servidor reiniciado), agenda um a partir da recomendação gravada.
+    """
+    user_id = session.get('user_id')
+    
+    job = explanation_jobs.get(recommendation_id)
+    if job is None:
+        stored = db.get_recommendation(recommendation_id)
+        if not stored or stored['user_id'] != user_id:
+            return jsonify({'error': 'Recomendação não encontrada'}), 404
         
-        try:
-            explanation = explainer.explain_recommendation(
-                testes_selecionados,
-                recomendacao.recommended_order
+        all_tests_map = {t.id: t for t in get_all_test_cases(user_id)}
+        testes_selecionados = [all_tests_map[tid] for tid in stored['test_ids'] if tid in all_tests_map]
+        job = explanation_jobs.submit(
+            recommendation_id, user_id, _explain_and_cache,
+            None, testes_selecionados, stored['recommended_order'], None,
+            duration_model.predict_many(user_id, testes_selecionados)
+        )
+    elif job.user_id != user_id:
+        return jsonify({'error': 'Recomendação não encontrada'}), 404
+    
+    response = explanation_jobs.handle(job)
+    if response['status'] == JOB_PENDING:
+        return jsonify(response), 202
+    if response['status'] == JOB_FAILED:
+        response['error'] = str(job.future.exception())
+        return jsonify(response), 500
+    
+    response['explanation'] = job.future.result()
+    return jsonify(response)
+
+def _replan_suffix(
+    user_id: int,
+    stored: Dict[str, Any],
+    executed: List[Dict[str, Any]],
+    all_tests_map: Dict[str, TestCase],
+    current_state: Optional[Set[str]] = None
+) -> Dict[str, Any]:
+    """
+    Re-planeja apenas os testes ainda não executados de uma recomendação salva
+    
+    Sem desvio (testes executados = início da ordem, todos com sucesso e sem
+    estado informado) a ordem restante é mantida. Caso contrário, o sufixo é
+    reordenado a partir do estado atual e do módulo do último teste, com a
+    ordem anterior como base (desempate) e os riscos já atualizados pelos
+    feedbacks; testes que dependem (dependência/pai) de um teste que falhou
+    vão para o fim, marcados como bloqueados.
+    
+    Args:
+        user_id: ID do usuário
+        stored: Recomendação salva (tabela recommendations)
+        executed: Testes executados, em ordem: [{'test_id', 'success'}]
+        all_tests_map: Catálogo do usuário
+        current_state: Condições satisfeitas agora (simuladas a partir dos executados se None)
+    
+    Returns:
+        Dicionário com a nova ordem restante e suas métricas
+    """
+    previous_order = [tid for tid in stored['recommended_order'] if tid in all_tests_map]
+    executed_ids = [item['test_id'] for item in executed if item['test_id'] in all_tests_map]
+    done = set(executed_ids)
+    failed = {item['test_id'] for item in executed if not item['success']}
+    previous_suffix = [tid for tid in previous_order if tid not in done]
+    remaining = [all_tests_map[tid] for tid in previous_suffix]
+    
+    deviated = bool(failed) or current_state is not None or executed_ids != previous_order[:len(executed_ids)]
+    catalog_graph = dependency_graphs.get(user_id, lambda: list(all_tests_map.values()))
+    
+    # Estado atual: simulado a partir dos testes executados (falha ou destrutivo limpam o estado)
+    if current_state is None:
+        current_state = set()
+        for item in executed:
+            tc = all_tests_map.get(item['test_id'])
+            if tc is None:
+                continue
+            node = catalog_graph.nodes.get(tc.id)
+            if node is None or not item['success'] or node.destructive:
+                current_state = set()
+                continue
+            if not set(node.preconditions) <= current_state:
+                current_state = set()
+            current_state |= node.postconditions
+    
+    new_order = previous_suffix
+    blocked: List[str] = []
+    if deviated and remaining:
+        graph = catalog_graph.subgraph(remaining)
+        # Bloqueados: dependem (transitivamente) de um teste que falhou
+        prerequisites = {
+            tid: set(all_tests_map[tid].dependencies) | (
+                {all_tests_map[tid].parent_test_id} if all_tests_map[tid].parent_test_id else set()
             )
-            return jsonify(explanation)
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+            for tid in previous_suffix
+        }
+        blocked_set = set()
+        changed = bool(failed)
+        while changed:
+            unavailable = failed | blocked_set
+            newly = {tid for tid, deps in prerequisites.items() if tid not in blocked_set and deps & unavailable}
+            blocked_set |= newly
+            changed = bool(newly)
+        
+        ctx = _compute_context_and_failure_risk(user_id, remaining, all_tests_map, graph=graph)
+        last_test = all_tests_map.get(executed_ids[-1]) if executed_ids else None
+        reordered = _contextual_reorder(
+            remaining,
+            previous_suffix,
+            risk_map=ctx["risk_map"],
+            affinity_map=ctx["affinity_map"],
+            initial_module=last_test.module if last_test else None,
+            graph=graph,
+            initial_state=current_state,
+            completed=done
+        )
+        repaired = _repair_order_for_logic(
+            remaining,
+            [tc.id for tc in reordered],
+            graph=graph,
+            initial_state=current_state,
+            completed=done
+        )
+        blocked = [tid for tid in repaired if tid in blocked_set]
+        new_order = [tid for tid in repaired if tid not in blocked_set] + blocked
     
-    return jsonify({'error': 'Modelo não treinado ainda'}), 400
+    suffix_tests = [all_tests_map[tid] for tid in new_order]
+    metrics = OrderMetrics.from_order(suffix_tests, initial_state=current_state)
+    return {
+        'order': new_order,
+        'executed': executed_ids,
+        'failed': sorted(failed),
+        'blocked': blocked,
+        'replanned': deviated,
+        'changed': new_order != previous_suffix,
+        'current_state': sorted(current_state),
+        'estimated_remaining_time': sum(duration_model.predict_many(user_id, suffix_tests).values()),
+        'estimated_resets': metrics.resets
+    }
 
-@app.route('/api/anomalies')
+@app.route('/api/recomendacao/<int:recommendation_id>/replan', methods=['POST'])
 @login_required
-def get_anomalies():
-    """Detecta anomalias nos feedbacks do usuário"""
+def replan_recommendation(recommendation_id):
+    """
+    Re-planeja o restante de uma recomendação salva no meio da sessão
+    
+    Body JSON:
+        executed: testes já executados, em ordem ([{"test_id", "success"}] ou
+            lista de IDs, considerados com sucesso)
+        current_state: condições satisfeitas agora (opcional; simuladas a
+            partir dos testes executados se ausente)
+    """
     user_id = session.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'Usuário não autenticado'}), 401
+    started = time.perf_counter()
     
-    cursor = db.conn.cursor()
+    stored = db.get_recommendation(recommendation_id)
+    if not stored or stored['user_id'] != user_id:
+        return jsonify({'error': 'Recomendação não encontrada'}), 404
     
-    # Buscar feedbacks do usuário
-    cursor.execute("""
-        SELECT 
-            test_case_id,
-            executed_at,
-            actual_execution_time,
-            success,
-            tester_rating,
-            required_reset,
-            followed_recommendation
-        FROM feedbacks
-        WHERE tester_id = ?
-        ORDER BY executed_at DESC
-        LIMIT 100
-    """, (user_id,))
+    data = request.json or {}
+    raw_executed = data.get('executed', [])
+    if not isinstance(raw_executed, list):
+        return jsonify({'error': 'executed deve ser uma lista'}), 400
+    executed = []
+    for item in raw_executed:
+        if isinstance(item, dict):
+            if not isinstance(item.get('test_id'), str):
+                return jsonify({'error': 'Cada item de executed precisa de test_id (texto)'}), 400
+            executed.append({'test_id': item['test_id'], 'success': bool(item.get('success', True))})
+        elif isinstance(item, str):
+            executed.append({'test_id': item, 'success': True})
+        else:
+            return jsonify({'error': 'Itens de executed devem ser IDs ou {"test_id", "success"}'}), 400
+    
+    raw_state = data.get('current_state')
+    if raw_state is not None and (
+        not isinstance(raw_state, list) or not all(isinstance(cond, str) for cond in raw_state)
+    ):
+        return jsonify({'error': 'current_state deve ser uma lista de condições'}), 400
+    current_state = set(raw_state) if raw_state is not None else None
+    
+    all_tests_map = {t.id: t for t in get_all_test_cases(user_id)}
+    result = _replan_suffix(user_id, stored, executed, all_tests_map, current_state)
+    result['recommendation_id'] = recommendation_id
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify(result)
+
+@app.route('/api/recomendacao/team', methods=['POST'])
+@login_required
+def get_team_schedule():
+    """
+    Divide a seleção entre vários testadores/dispositivos em paralelo
     
-    rows = cursor.fetchall()
+    Cada trabalhador parte do estado de baseline (SimulatorExecutor.reset());
+    filhos rodam no trabalhador do pai e dependências podem ser esperadas em
+    outro trabalhador. Minimiza o makespan com as durações previstas.
     
-    # Converter para ExecutionFeedback
-    feedbacks = []
-    test_dict = {tc.id: tc for tc in testes}
+    Body JSON:
+        workers: número de testadores/dispositivos (1 a 64)
+        test_ids: testes a executar (opcional; todos se ausente)
+    """
+    user_id = session.get('user_id')
+    started = time.perf_counter()
+    data = request.json or {}
     
-    for row in rows:
-        feedback = ExecutionFeedback(
-            test_case_id=row['test_case_id'],
-            executed_at=datetime.fromisoformat(row['executed_at']),
-            actual_execution_time=row['actual_execution_time'],
-            success=bool(row['success']),
-            tester_rating=row['tester_rating'],
-            required_reset=bool(row['required_reset']),
-            followed_recommendation=bool(row['followed_recommendation'])
-        )
-        feedbacks.append(feedback)
+    try:
+        workers = int(data.get('workers', 2))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'workers deve ser um número inteiro'}), 400
+    if not 1 <= workers <= 64:
+        return jsonify({'error': 'workers deve estar entre 1 e 64'}), 400
+    
+    all_available_tests = get_all_test_cases(user_id)
+    all_tests_map = {t.id: t for t in all_available_tests}
+    test_ids = data.get('test_ids')
+    if test_ids is not None and (
+        not isinstance(test_ids, list) or not all(isinstance(tid, str) for tid in test_ids)
+    ):
+        return jsonify({'error': 'test_ids deve ser uma lista de IDs'}), 400
+    if test_ids is None:
+        testes_selecionados = all_available_tests
+    else:
+        selected_ids = set(test_ids)
+        testes_selecionados = [t for t in all_available_tests if t.id in selected_ids]
+    if not testes_selecionados:
+        return jsonify({'error': 'Nenhum teste selecionado'}), 400
+    
+    graph = dependency_graphs.get(user_id, lambda: list(all_tests_map.values())).subgraph(testes_selecionados)
+    plan = team_scheduler.schedule(
+        testes_selecionados,
+        duration_model.predict_many(user_id, testes_selecionados),
+        graph.explicit,
+        workers,
+        baseline_state=team_baseline_state
+    )
+    result = plan.to_dict()
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify(result)
     
-    # Detectar anomalias
-    anomalies_result = anomaly_detector.detect_anomalies(feedbacks, test_dict)
+@app.route('/api/anomalies')
+@login_required
+def get_anomalies():
+    """
+    Retorna anomalias pré-calculadas dos feedbacks do usuário
     
-    return jsonify(anomalies_result)
+    Com ?scope=global, analisa os padrões (falhas, variabilidade e degradação)
+    sobre todos os feedbacks do banco, pelo caminho colunar vetorizado.
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    if request.args.get('scope') == 'global':
+        columns = FeedbackColumns.from_database(db)
+        patterns = anomaly_detector.detect_patterns_columnar(columns)
+        return jsonify({
+            'anomalies': [],
+            'patterns': patterns,
+            'alerts': anomaly_detector.pattern_alerts(patterns),
+            'summary': {
+                'scope': 'global',
+                'total': len(columns),
+                'tests': len(columns.test_ids),
+                'anomalies_count': 0,
+                'anomaly_rate': 0.0,
+                'failure_rate': float((~columns.success).mean() * 100) if len(columns) else 0.0
+            }
+        })
+    
+    # Primeiro acesso do usuário neste processo: carregar histórico
+    if not streaming_anomaly_detector.is_loaded(user_id):
+        _bootstrap_anomaly_detector(user_id, fit_now=True)
+    
+    return jsonify(streaming_anomaly_detector.get_result(user_id))
 
 @app.route('/api/feature-importance')
 @login_required
 def get_feature_importance():
     """Retorna importância das features do modelo"""
-    global explainer
-    
     if not recommender.global_recommender.is_trained:
         return jsonify({'error': 'Modelo não treinado'}), 400
     
-    if explainer is None or not hasattr(explainer, 'model'):
-        explainer = RecommendationExplainer(
-            recommender.global_recommender.model,
-            recommender.global_recommender.feature_extractor
-        )
-    
     try:
-        importance = explainer._get_feature_importance()
+        importance = _get_explainer()._get_feature_importance()
         return jsonify(importance)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2048,6 +2367,9 @@ def create_user_test_case():
     
     # Criar teste
     db.create_user_test_case(user_id, test_data)
+    recommendation_cache.invalidate_user(user_id)  # catálogo do usuário mudou
+    dependency_graphs.invalidate_user(user_id)
+    context_stats.invalidate_user(user_id)
     
     return jsonify({'status': 'success', 'message': 'Teste criado com sucesso'})
 
@@ -2094,6 +2416,9 @@ def update_user_test_case(test_id):
         update_data['impact_level'] = data['impact_level']
     
     success = db.update_user_test_case(user_id, test_id, update_data)
+    recommendation_cache.invalidate_user(user_id)  # catálogo do usuário mudou
+    dependency_graphs.invalidate_user(user_id)
+    context_stats.invalidate_user(user_id)
     
     if not success:
         return jsonify({'error': 'Teste não encontrado'}), 404
@@ -2106,6 +2431,9 @@ def delete_user_test_case(test_id):
     """Deleta um teste personalizado"""
     user_id = session.get('user_id')
     success = db.delete_user_test_case(user_id, test_id)
+    recommendation_cache.invalidate_user(user_id)  # catálogo do usuário mudou
+    dependency_graphs.invalidate_user(user_id)
+    context_stats.invalidate_user(user_id)
     
     if not success:
         return jsonify({'error': 'Teste não encontrado'}), 404
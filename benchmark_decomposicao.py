@@ -0,0 +1,104 @@
+"""
+Benchmark da ordenação por decomposição em seleções grandes
+
+Compara, em suítes sintéticas de 500 a 10.000 testes:
+- Monolítico: ordem base heurística + ordenação contextual + repair
+  (o mesmo caminho do app para seleções pequenas)
+- Decomposição: partições ordenadas uma a uma + encadeamento + repair
+- Decomposição com pool de processos (se houver mais de uma CPU)
+
+Mostra tempo, resets e trocas de módulo de cada ordem final.
+O monolítico é quadrático; por padrão só roda até 2.000 testes.
+"""
+import sys
+import io
+import os
+import random
+import time
+from pathlib import Path
+
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+root_dir = Path(__file__).parent
+sys.path.insert(0, str(root_dir))
+
+from src.recommender.contextual_order import contextual_reorder, repair_order_for_logic
+from src.recommender.decomposition import DecompositionOrderer
+from src.recommender.ml_recommender import MLTestRecommender
+from src.utils.data_generator import SyntheticDataGenerator
+from src.utils.dependency_graph import CatalogDependencyGraph
+from src.utils.order_metrics import OrderMetrics
+
+TAMANHOS = [500, 1000, 2000, 5000, 10000]
+MAX_MONOLITICO = 2000
+
+
+def medir(tests, order_ids):
+    """Resets e trocas de módulo da ordem final."""
+    by_id = {tc.id: tc for tc in tests}
+    metrics = OrderMetrics.from_order([by_id[tid] for tid in order_ids])
+    return metrics.resets, len(metrics.same_module) - sum(metrics.same_module)
+
+
+def monolitico(tests, graph, risk_map):
+    base = MLTestRecommender()._heuristic_ordering(tests)
+    ordered = contextual_reorder(tests, [tc.id for tc in base], risk_map, {}, graph=graph)
+    return repair_order_for_logic(tests, [tc.id for tc in ordered], graph=graph)
+
+
+def decomposicao(orderer, tests, graph, risk_map, parallel):
+    result = orderer.order(tests, risk_map, {}, graph=graph, parallel=parallel)
+    return repair_order_for_logic(tests, result.order, graph=graph), result
+
+
+def main():
+    print("="*70)
+    print("⏱️  BENCHMARK - ORDENAÇÃO POR DECOMPOSIÇÃO")
+    print("="*70)
+
+    cpus = os.cpu_count() or 1
+    orderer = DecompositionOrderer()
+    print(f"\nCPUs: {cpus} | partição máxima: {orderer.max_partition} testes")
+
+    modos = [('serial', False)]
+    if cpus > 1:
+        modos.append(('pool', True))
+        # Aquecer o pool (criação dos processos fora da medição)
+        aquecimento = SyntheticDataGenerator(seed=7).generate_test_suite(50).test_cases
+        orderer.order(aquecimento, {}, {}, parallel=True)
+
+    try:
+        for n in TAMANHOS:
+            tests = SyntheticDataGenerator(seed=1).generate_test_suite(n).test_cases
+            rng = random.Random(0)
+            risk_map = {tc.id: rng.uniform(0.0, 0.3) for tc in tests}
+            graph = CatalogDependencyGraph(tests).subgraph(tests)
+
+            print(f"\n📦 {n} TESTES")
+            print("-"*70)
+
+            if n <= MAX_MONOLITICO:
+                inicio = time.perf_counter()
+                ordem = monolitico(tests, graph, risk_map)
+                tempo = time.perf_counter() - inicio
+                resets, trocas = medir(tests, ordem)
+                print(f"   {'Monolítico:':<24}{tempo:8.2f}s | resets: {resets:5d} | trocas de módulo: {trocas:5d}")
+            else:
+                print(f"   {'Monolítico:':<24}(pulado: quadrático)")
+
+            for nome, parallel in modos:
+                inicio = time.perf_counter()
+                ordem, result = decomposicao(orderer, tests, graph, risk_map, parallel)
+                tempo = time.perf_counter() - inicio
+                resets, trocas = medir(tests, ordem)
+                print(f"   {'Decomposição (' + nome + '):':<24}{tempo:8.2f}s | resets: {resets:5d} | trocas de módulo: {trocas:5d}"
+                      f" | partições: {len(result.partition_sizes)}")
+    finally:
+        orderer.shutdown()
+
+    print("\n" + "="*70)
+
+
+if __name__ == '__main__':
+    main()
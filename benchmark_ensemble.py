@@ -0,0 +1,95 @@
+"""
+Benchmark do treino do ensemble (RF + GB + MLP)
+
+Compara o tempo de parede de EnsembleRecommender.train:
+- Sequencial (n_jobs=1): membros e dobras K-fold no próprio processo
+- Pool (n_jobs=-1): membros e dobras em um pool de processos reaproveitado
+  entre treinos (o primeiro treino inclui a criação do pool)
+
+Mostra o tempo de cada modo, a queda percentual e os pesos obtidos.
+Em máquina de um núcleo o modo pool não é executado.
+"""
+import sys
+import io
+import os
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+root_dir = Path(__file__).parent
+sys.path.insert(0, str(root_dir))
+
+from src.recommender.ensemble_recommender import EnsembleRecommender
+
+AMOSTRAS = 300
+REPETICOES = 3
+
+
+def dados(n, seed=0):
+    """Amostras sintéticas no formato de _generate_training_sample."""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(2, 40, n),            # testes na ordem
+        rng.uniform(100, 3000, n),         # tempo total
+        rng.uniform(1, 5, n),              # prioridade média
+        rng.integers(0, 6, n),             # destrutivos
+        rng.integers(0, 30, n),            # transições compatíveis
+        rng.integers(0, 30, n),            # transições no mesmo módulo
+    ]).astype(np.float32)
+    y = 100 - 20 * X[:, 3] + 10 * X[:, 4] / np.maximum(X[:, 0], 1) + rng.normal(0, 5, n)
+    return X, y
+
+
+def medir(n_jobs, X, y):
+    """Tempos de REPETICOES treinos com o mesmo recomendador (pool reaproveitado)."""
+    recommender = EnsembleRecommender(use_deep_learning=True, n_jobs=n_jobs)
+    recommender.training_data = {'X': list(X), 'y': list(y)}
+    tempos = []
+    try:
+        for _ in range(REPETICOES):
+            inicio = time.perf_counter()
+            recommender.train()
+            tempos.append(time.perf_counter() - inicio)
+    finally:
+        recommender.shutdown()
+    return tempos, recommender.model_weights
+
+
+def main():
+    print("="*70)
+    print("⏱️  BENCHMARK - TREINO DO ENSEMBLE")
+    print("="*70)
+
+    cpus = os.cpu_count() or 1
+    X, y = dados(AMOSTRAS)
+    print(f"\nCPUs: {cpus} | amostras: {AMOSTRAS} | treinos por modo: {REPETICOES}")
+
+    modos = [('Sequencial', 1)]
+    if cpus > 1:
+        modos.append(('Pool', -1))
+
+    medianas = {}
+    for nome, n_jobs in modos:
+        tempos, pesos = medir(n_jobs, X, y)
+        medianas[nome] = statistics.median(tempos)
+        print(f"\n📦 {nome.upper()} (n_jobs={n_jobs})")
+        print("-"*70)
+        print(f"   Treinos: {', '.join(f'{t:.2f}s' for t in tempos)} | mediana: {medianas[nome]:.2f}s")
+        print(f"   Pesos: {', '.join(f'{k}={v:.2f}' for k, v in pesos.items())}")
+
+    if 'Pool' in medianas:
+        queda = 100.0 * (1 - medianas['Pool'] / medianas['Sequencial'])
+        print(f"\n📉 Queda do tempo de parede com o pool: {queda:.1f}%")
+    else:
+        print("\n⚠ Apenas um núcleo: modo pool não medido")
+
+    print("\n" + "="*70)
+
+
+if __name__ == '__main__':
+    main()
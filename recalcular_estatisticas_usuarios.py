@@ -0,0 +1,68 @@
+"""
+Script para RECALCULAR as estatísticas de aprendizado dos usuários
+
+Reconstrói user_learning_stats (somas acumuladas, médias e módulos
+preferidos) e user_module_stats a partir de todos os feedbacks, com os
+módulos resolvidos pelo catálogo atual de testes (padrão + personalizados).
+
+Use após migrar um banco antigo ou se as estatísticas incrementais
+divergirem da tabela feedbacks.
+"""
+import sys
+import io
+from pathlib import Path
+
+# Configurar encoding UTF-8 para Windows
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+root_dir = Path(__file__).parent
+sys.path.insert(0, str(root_dir))
+
+from src.utils.database import get_database
+from src.recommender.personalized_recommender import PersonalizedMLRecommender
+from testes_dialer_importados import criar_testes_dialer
+from testes_motorola_melhorados import criar_testes_motorola as criar_testes_motorola_melhorados
+from testes_detalhados_expandidos import criar_testes_detalhados_expandidos
+
+print("="*70)
+print("📊 RECÁLCULO DAS ESTATÍSTICAS DE APRENDIZADO")
+print("="*70)
+
+db = get_database("iartes.db")
+recommender = PersonalizedMLRecommender()
+
+# Catálogo padrão (mesmo usado pela interface web)
+catalog = criar_testes_motorola_melhorados() + criar_testes_dialer() + criar_testes_detalhados_expandidos()
+base_modules = {tc.id: tc.module for tc in catalog}
+
+cursor = db.conn.cursor()
+cursor.execute("SELECT id, username FROM users ORDER BY id")
+users = cursor.fetchall()
+
+print(f"\n👥 Usuários encontrados: {len(users)}")
+print("-"*70)
+
+for user in users:
+    # Testes personalizados têm prioridade sobre os padrão (como em get_all_test_cases)
+    test_to_module = dict(base_modules)
+    for user_test in db.get_user_test_cases(user['id']):
+        if user_test.get('module'):
+            test_to_module[user_test['test_id']] = user_test['module']
+
+    recommender.rebuild_user_learning_stats(user['id'], db, test_to_module)
+
+    cursor.execute("""
+        SELECT total_feedbacks, preferred_modules FROM user_learning_stats WHERE user_id = ?
+    """, (user['id'],))
+    row = cursor.fetchone()
+    if row:
+        print(f"✅ {user['username']}: {row['total_feedbacks']} feedbacks | "
+              f"módulos: {row['preferred_modules'] or '-'}")
+    else:
+        print(f"⚪ {user['username']}: sem feedbacks")
+
+print("\n" + "="*70)
+print("✅ RECÁLCULO CONCLUÍDO")
+print("="*70)
@@ -9,3 +9,4 @@ Objetivo:
 
 from src.execution.hierarchical_executor import HierarchicalExecutor, HierarchicalExecutionResult
 
+from src.execution.prefix_planner import PrefixPlan, PrefixPlanner
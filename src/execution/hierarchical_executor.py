@@ -9,13 +9,14 @@ Este executor implementa:
 """
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 from typing import List, Dict, Set, Optional, Tuple
 from collections import defaultdict
 
 from src.models.test_case import TestCase
 from src.execution.executor_base import ExecutionResult, State, TestExecutor
+from src.execution.prefix_planner import Path, PrefixPlanner, PrefixStep
 from src.utils.hierarchy_utils import (
     get_tree_level, get_ancestors, get_descendants,
     find_shared_path, order_by_hierarchy
@@ -35,6 +36,8 @@ class HierarchicalExecutionResult:
     sequence_started_at: datetime
     sequence_finished_at: datetime
     notes: List[str] = field(default_factory=list)
+    saved_action_time: float = 0.0  # Tempo estimado das ações puladas (prefixos compartilhados)
+    skipped_actions: Dict[str, int] = field(default_factory=dict)  # ID do teste -> ações iniciais puladas
 
 
 class HierarchicalExecutor:
@@ -46,14 +49,18 @@ class HierarchicalExecutor:
     - Propagação de falhas: se pai falha, filhos também falham
     - Reinício da raiz: quando há falha hierárquica, reinicia da próxima raiz
     - Teardown automático: executa teardown para testes com teardown_restores=True
+    - Prefixos compartilhados (opcional): ações iniciais iguais às que já estão no
+      dispositivo são puladas e o tronco comum com o próximo teste roda uma vez
     """
     
-    def __init__(self, base_executor: TestExecutor):
+    def __init__(self, base_executor: TestExecutor, prefix_planner: Optional[PrefixPlanner] = None):
         """
         Args:
             base_executor: Executor base (SimulatorExecutor ou AndroidAppiumExecutor)
+            prefix_planner: Planejador de prefixos compartilhados (None = executar cada teste inteiro)
         """
         self.base_executor = base_executor
+        self.prefix_planner = prefix_planner
         self.test_by_id: Dict[str, TestCase] = {}
     
     def execute_hierarchical_sequence(
@@ -103,6 +110,10 @@ class HierarchicalExecutor:
         results: Dict[str, ExecutionResult] = {}
         notes: List[str] = []
         total_time = 0.0
+        # Ações cujo efeito está no dispositivo (prefixos compartilhados); vazio após reset
+        path: Path = ()
+        saved_action_time = 0.0
+        skipped_actions: Dict[str, int] = {}
         
         # Executar testes em ordem
         i = 0
@@ -135,9 +146,20 @@ class HierarchicalExecutor:
                 i += 1
                 continue
             
-            # Executar teste
+            # Executar teste (pulando o prefixo que já está no dispositivo, se planejado)
+            step = None
+            if self.prefix_planner is not None:
+                next_test = test_order[i + 1] if i + 1 < len(test_order) else None
+                step = self.prefix_planner.next_step(path, test, next_test)
             try:
-                result, new_state = self.base_executor.execute_test_case(test, state)
+                if step is not None and step.trunk_end > 0:
+                    result, new_state, state = self._execute_with_prefix(test, state, step)
+                    if step.skip:
+                        saved_action_time += step.saved_time
+                        skipped_actions[test.id] = step.skip
+                        notes.append(f"TEST-{test.id}: {step.skip} ações iniciais já executadas (prefixo compartilhado)")
+                else:
+                    result, new_state = self.base_executor.execute_test_case(test, state)
                 results[test.id] = result
                 executed_tests.append(test.id)
                 total_time += result.actual_execution_time
@@ -166,6 +188,7 @@ class HierarchicalExecutor:
                         notes.append(f"Reiniciando da raiz: TEST-{next_root.id}")
                         # Resetar estado e continuar da raiz
                         state = self.base_executor.reset()
+                        path = ()
                         resets += 1
                         # Encontrar índice do próximo root
                         for idx, tc in enumerate(test_order):
@@ -194,9 +217,13 @@ class HierarchicalExecutor:
                 if test.has_destructive_actions():
                     state = set()
                 
+                if step is not None:
+                    path = self.prefix_planner.advance(path, test, step)
+                
                 # Verificar se precisa de reset
                 if result.required_reset:
                     state = self.base_executor.reset()
+                    path = ()
                     resets += 1
                     notes.append(f"Reset necessário após TEST-{test.id}")
                 
@@ -216,6 +243,7 @@ class HierarchicalExecutor:
                 next_root = self._find_next_root(test_order, i + 1, executed_tests, failed_tests)
                 if next_root is not None:
                     state = self.base_executor.reset()
+                    path = ()
                     resets += 1
                     for idx, tc in enumerate(test_order):
                         if tc.id == next_root.id:
@@ -241,9 +269,51 @@ class HierarchicalExecutor:
             total_resets=resets,
             sequence_started_at=sequence_started_at,
             sequence_finished_at=sequence_finished_at,
-            notes=notes
+            notes=notes,
+            saved_action_time=saved_action_time,
+            skipped_actions=skipped_actions
         )
     
+    def _execute_with_prefix(
+        self,
+        test: TestCase,
+        state: State,
+        step: PrefixStep
+    ) -> Tuple[ExecutionResult, State, State]:
+        """
+        Executa o teste sem as ações iniciais puladas e com o tronco compartilhado
+        
+        O tronco (ações [skip:trunk_end]) roda como um passo comum, que muda o
+        estado; a ramificação (ações a partir de trunk_end) roda com a semântica
+        de teardown_restores/context_preserving do teste, voltando ao fim do tronco.
+        
+        Args:
+            test: Teste a executar
+            state: Estado atual do dispositivo
+            step: Passo planejado pelo PrefixPlanner
+        
+        Returns:
+            Tupla (resultado do teste, estado após a ramificação, estado antes da ramificação)
+        """
+        trunk_time = 0.0
+        if step.trunk_end > step.skip:
+            trunk = replace(
+                test,
+                actions=test.actions[step.skip:step.trunk_end],
+                teardown_restores=False,
+                context_preserving=False
+            )
+            trunk_result, trunk_state = self.base_executor.execute_test_case(trunk, state)
+            if not trunk_result.success:
+                return trunk_result, trunk_state, state
+            trunk_time = trunk_result.actual_execution_time
+            state = trunk_state
+        
+        branch = replace(test, actions=test.actions[step.trunk_end:])
+        result, new_state = self.base_executor.execute_test_case(branch, state)
+        result.actual_execution_time += trunk_time
+        return result, new_state, state
+    
     def _has_failed_ancestor(self, test: TestCase, failed_tests: Set[str]) -> bool:
         """Verifica se algum ancestral do teste falhou."""
         ancestors = get_ancestors(test, self.test_by_id)
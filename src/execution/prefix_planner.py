@@ -0,0 +1,238 @@
+"""
+Plano de execução com prefixos de ações compartilhados (trie).
+
+Muitos testes começam pelas mesmas ações (abrir o app, navegar até a tela).
+Sobre uma ordem de testes, este planejador decide, para cada teste, quantas
+ações iniciais podem ser puladas porque o dispositivo já está no ponto em
+que elas terminam:
+
+    - o "caminho" é a sequência de ações cujo efeito está no dispositivo
+      agora (vazio após reset);
+    - um teste pula as ações iniciais se o caminho inteiro é prefixo dele;
+    - um teste que restaura o contexto (teardown_restores ou
+      context_preserving) e compartilha um prefixo maior com o próximo teste
+      executa esse prefixo como tronco; a ramificação (resto do teste) volta
+      ao fim do tronco, e o próximo teste parte dali;
+    - um teste que não restaura deixa o dispositivo no fim das suas ações;
+    - um teste destrutivo deixa o dispositivo limpo (caminho vazio), mesmo
+      que restaure o contexto.
+
+Ações são iguais quando tipo, descrição, impacto e pré/pós-condições
+coincidem (os IDs mudam entre testes). Todo teste executa pelo menos a sua
+última ação. A trie das sequências da seleção dá, além disso, o máximo que
+se economizaria se cada prefixo comum rodasse uma única vez.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.models.test_case import Action, TestCase
+
+
+ActionKey = Tuple
+Path = Tuple[ActionKey, ...]
+
+
+def action_key(action: Action) -> ActionKey:
+    """Identidade de uma ação entre testes diferentes."""
+    return (
+        action.action_type.value,
+        action.description.strip().lower(),
+        action.impact.value,
+        frozenset(action.preconditions),
+        frozenset(action.postconditions)
+    )
+
+
+def restores_context(test: TestCase) -> bool:
+    """Teste que devolve o dispositivo ao estado anterior (teardown ou contexto preservado)."""
+    return test.teardown_restores or test.context_preserving
+
+
+class _TrieNode:
+    __slots__ = ('children', 'tests', 'time')
+
+    def __init__(self, time: float = 0.0):
+        self.children: Dict[ActionKey, '_TrieNode'] = {}
+        self.tests = 0
+        self.time = time
+
+
+class ActionTrie:
+    """Trie das sequências de ações de uma seleção."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.nodes = 0
+        self.actions_time = 0.0       # soma das ações de todos os testes
+
+    def insert(self, test: TestCase):
+        """Insere a sequência de ações do teste."""
+        node = self.root
+        for action in test.actions:
+            key = action_key(action)
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = _TrieNode(action.estimated_time)
+                self.nodes += 1
+            child.tests += 1
+            node = child
+            self.actions_time += action.estimated_time
+
+    def shared_time(self) -> float:
+        """Tempo das ações repetidas entre testes (cada nó roda uma vez por teste que passa por ele)."""
+        total = 0.0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for child in node.children.values():
+                total += child.time * (child.tests - 1)
+                stack.append(child)
+        return total
+
+    def shared_prefixes(self, min_tests: int = 2) -> List[Dict]:
+        """
+        Prefixos comuns mais longos (nós onde os testes se separam)
+
+        Args:
+            min_tests: Mínimo de testes que compartilham o prefixo
+
+        Returns:
+            Lista de {'depth', 'tests', 'time'} ordenada pelo tempo economizável
+        """
+        result = []
+        stack = [(self.root, 0, 0.0)]
+        while stack:
+            node, depth, time = stack.pop()
+            for child in node.children.values():
+                child_time = time + child.time
+                if child.tests < min_tests:
+                    continue
+                # Fim do prefixo comum: nenhum filho continua com todos os testes
+                if all(grand.tests < child.tests for grand in child.children.values()):
+                    result.append({'depth': depth + 1, 'tests': child.tests, 'time': round(child_time, 2)})
+                stack.append((child, depth + 1, child_time))
+        result.sort(key=lambda item: -item['time'] * (item['tests'] - 1))
+        return result
+
+
+@dataclass
+class PrefixStep:
+    """Como um teste é executado no plano."""
+    test_id: str
+    skip: int            # ações iniciais puladas (já estão no dispositivo)
+    trunk_end: int       # ações [skip:trunk_end] formam o tronco compartilhado com o próximo teste
+    saved_time: float    # tempo estimado das ações puladas
+
+
+@dataclass
+class PrefixPlan:
+    """Plano de uma ordem: passos e economia estimada."""
+    steps: List[PrefixStep]
+    saved_action_time: float          # economia do plano (ordem dada)
+    potential_saved_time: float       # se cada prefixo comum rodasse uma única vez (trie)
+    total_action_time: float
+    shared_prefixes: List[Dict] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            'saved_action_time': round(self.saved_action_time, 2),
+            'potential_saved_time': round(self.potential_saved_time, 2),
+            'total_action_time': round(self.total_action_time, 2),
+            'saved_pct': round(100.0 * self.saved_action_time / self.total_action_time, 2) if self.total_action_time else 0.0,
+            'steps': [
+                {'test_id': s.test_id, 'skip': s.skip, 'trunk_end': s.trunk_end}
+                for s in self.steps if s.skip or s.trunk_end > s.skip
+            ],
+            'shared_prefixes': self.shared_prefixes[:10]
+        }
+
+
+class PrefixPlanner:
+    """Decide, teste a teste, o prefixo pulado e o tronco compartilhado."""
+
+    @staticmethod
+    def keys(test: TestCase) -> Path:
+        return tuple(action_key(action) for action in test.actions)
+
+    def next_step(self, path: Path, test: TestCase, next_test: Optional[TestCase] = None) -> PrefixStep:
+        """
+        Passo de execução do teste a partir do caminho atual do dispositivo
+
+        Args:
+            path: Ações cujo efeito está no dispositivo (vazio após reset)
+            test: Teste a executar
+            next_test: Próximo teste da ordem (para montar o tronco)
+
+        Returns:
+            PrefixStep do teste
+        """
+        keys = self.keys(test)
+        last = max(len(keys) - 1, 0)  # a última ação sempre é executada
+        skip = len(path) if path and len(path) <= last and keys[:len(path)] == path else 0
+        trunk_end = skip
+        if next_test is not None and restores_context(test) and not test.has_destructive_actions():
+            shared = self._common_prefix(keys, self.keys(next_test))
+            trunk_end = max(skip, min(shared, last))
+        saved = sum(action.estimated_time for action in test.actions[:skip])
+        return PrefixStep(test_id=test.id, skip=skip, trunk_end=trunk_end, saved_time=saved)
+
+    def advance(self, path: Path, test: TestCase, step: PrefixStep) -> Path:
+        """
+        Caminho do dispositivo depois que o teste passou
+
+        Args:
+            path: Caminho antes do teste
+            test: Teste executado
+            step: Passo usado na execução
+
+        Returns:
+            Novo caminho
+        """
+        # Destrutivo limpa o estado (como no executor), mesmo com teardown/contexto preservado
+        if test.has_destructive_actions():
+            return ()
+        keys = self.keys(test)
+        if restores_context(test):
+            # A ramificação volta ao fim do tronco (ou ao caminho anterior, sem tronco)
+            return keys[:step.trunk_end] if step.trunk_end > step.skip else path
+        return keys
+
+    def plan(self, test_order: Sequence[TestCase], initial_path: Path = ()) -> PrefixPlan:
+        """
+        Plano para uma ordem de testes, supondo que todos passam
+
+        Args:
+            test_order: Testes na ordem de execução
+            initial_path: Caminho inicial do dispositivo (vazio = após reset)
+
+        Returns:
+            PrefixPlan com os passos e a economia estimada
+        """
+        trie = ActionTrie()
+        for test in test_order:
+            trie.insert(test)
+
+        steps: List[PrefixStep] = []
+        path = tuple(initial_path)
+        for i, test in enumerate(test_order):
+            next_test = test_order[i + 1] if i + 1 < len(test_order) else None
+            step = self.next_step(path, test, next_test)
+            steps.append(step)
+            path = self.advance(path, test, step)
+
+        return PrefixPlan(
+            steps=steps,
+            saved_action_time=sum(step.saved_time for step in steps),
+            potential_saved_time=trie.shared_time(),
+            total_action_time=trie.actions_time,
+            shared_prefixes=trie.shared_prefixes()
+        )
+
+    @staticmethod
+    def _common_prefix(a: Path, b: Path) -> int:
+        size = 0
+        for x, y in zip(a, b):
+            if x != y:
+                break
+            size += 1
+        return size
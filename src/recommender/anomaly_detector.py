@@ -2,40 +2,294 @@
 Sistema de Detecção de Anomalias
 Identifica padrões anômalos em execuções de testes
 """
+import threading
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Hashable
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import OrderedDict
+from dataclasses import dataclass
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 
 from src.models.test_case import ExecutionFeedback
 
 
+# Chave do detector treinado com os dados de todos os usuários
+GLOBAL_DETECTOR_KEY = 'global'
+
+
+@dataclass
+class FeedbackColumns:
+    """
+    Feedbacks em formato colunar (um array NumPy por campo)
+    
+    Os testes são codificados como inteiros na ordem da primeira ocorrência,
+    o que permite agregações por teste com np.bincount.
+    """
+    test_ids: List[str]
+    test_codes: np.ndarray
+    execution_time: np.ndarray
+    success: np.ndarray
+    rating: np.ndarray
+    required_reset: np.ndarray
+    followed_recommendation: np.ndarray
+    
+    def __len__(self) -> int:
+        return len(self.test_codes)
+    
+    @classmethod
+    def from_arrays(
+        cls,
+        test_case_ids: np.ndarray,
+        execution_time: np.ndarray,
+        success: np.ndarray,
+        rating: np.ndarray,
+        required_reset: np.ndarray,
+        followed_recommendation: np.ndarray
+    ) -> 'FeedbackColumns':
+        """Monta as colunas, codificando os IDs de teste por ordem de aparição"""
+        if len(test_case_ids) == 0:
+            unique_ids, codes = np.array([], dtype=object), np.array([], dtype=np.int64)
+        else:
+            unique_ids, first_index, inverse = np.unique(
+                test_case_ids, return_index=True, return_inverse=True
+            )
+            order = np.argsort(first_index, kind='stable')
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            codes = rank[inverse.ravel()]
+            unique_ids = unique_ids[order]
+        
+        return cls(
+            test_ids=[str(test_id) for test_id in unique_ids],
+            test_codes=codes,
+            execution_time=np.asarray(execution_time, dtype=np.float64),
+            success=np.asarray(success, dtype=bool),
+            rating=np.asarray(rating, dtype=np.float64),
+            required_reset=np.asarray(required_reset, dtype=bool),
+            followed_recommendation=np.asarray(followed_recommendation, dtype=bool)
+        )
+    
+    @classmethod
+    def from_feedbacks(cls, feedbacks: List[ExecutionFeedback]) -> 'FeedbackColumns':
+        """Converte uma lista de ExecutionFeedback"""
+        return cls.from_arrays(
+            np.array([f.test_case_id for f in feedbacks], dtype=object),
+            [f.actual_execution_time for f in feedbacks],
+            [f.success for f in feedbacks],
+            [f.tester_rating if f.tester_rating else np.nan for f in feedbacks],
+            [f.required_reset for f in feedbacks],
+            [f.followed_recommendation for f in feedbacks]
+        )
+    
+    @classmethod
+    def from_database(cls, db, tester_id: Optional[int] = None) -> 'FeedbackColumns':
+        """
+        Carrega os feedbacks do banco em ordem cronológica
+        
+        Args:
+            db: Instância do banco de dados
+            tester_id: Filtrar por testador (None = todos os usuários)
+        """
+        cursor = db.conn.cursor()
+        cursor.row_factory = None  # Tuplas simples: bem mais rápido que sqlite3.Row
+        query = """
+            SELECT test_case_id, actual_execution_time, success,
+                   tester_rating, required_reset, followed_recommendation
+            FROM feedbacks
+        """
+        params = ()
+        if tester_id is not None:
+            query += " WHERE tester_id = ?"
+            params = (tester_id,)
+        cursor.execute(query + " ORDER BY executed_at ASC, id ASC", params)
+        rows = cursor.fetchall()
+        
+        if not rows:
+            return cls.from_arrays(np.array([], dtype=object), [], [], [], [], [])
+        
+        test_ids, times, success, rating, reset, followed = zip(*rows)
+        return cls.from_arrays(
+            np.array(test_ids, dtype=object),
+            times,
+            success,
+            [r if r else np.nan for r in rating],
+            reset,
+            followed
+        )
+
+
+@dataclass
+class FittedDetector:
+    """IsolationForest já treinado, com o scaler e os metadados do treino"""
+    isolation_forest: IsolationForest
+    scaler: StandardScaler
+    fitted_at: datetime
+    n_samples: int
+    data_version: Optional[int]
+    feature_mean: np.ndarray
+    feature_std: np.ndarray
+
+
+class DetectorCache:
+    """
+    Cache LRU de detectores treinados (por usuário e global)
+    
+    Cada entrada é imutável depois de instalada: um re-treino cria uma nova
+    entrada em vez de re-treinar o modelo que outra requisição pode estar
+    usando. Re-treina quando:
+        - a entrada não existe (ou foi removida pelo LRU);
+        - chegaram `refit_after` feedbacks novos desde o treino;
+        - a média das features se deslocou mais que `drift_threshold`
+          desvios padrão (em qualquer feature) em relação ao treino.
+    """
+    
+    def __init__(
+        self,
+        contamination: float = 0.1,
+        max_entries: int = 128,
+        refit_after: int = 20,
+        drift_threshold: float = 1.0
+    ):
+        """
+        Args:
+            contamination: Proporção esperada de anomalias (0-1)
+            max_entries: Número máximo de detectores em memória
+            refit_after: Feedbacks novos que forçam re-treino
+            drift_threshold: Deslocamento (em desvios padrão) que força re-treino
+        """
+        self.contamination = contamination
+        self.max_entries = max_entries
+        self.refit_after = refit_after
+        self.drift_threshold = drift_threshold
+        self._entries: "OrderedDict[Hashable, FittedDetector]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.fits = 0
+    
+    def get(self, key: Hashable) -> Optional[FittedDetector]:
+        """Retorna o detector treinado da chave (ou None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def drift(self, entry: FittedDetector, features: np.ndarray) -> float:
+        """Maior deslocamento da média das features, em desvios padrão do treino"""
+        std = entry.feature_std
+        varying = std > 1e-9
+        if not varying.any() or len(features) == 0:
+            return 0.0
+        shift = np.abs(features.mean(axis=0) - entry.feature_mean)[varying] / std[varying]
+        return float(shift.max())
+    
+    def needs_refit(
+        self,
+        key: Hashable,
+        features: np.ndarray,
+        data_version: Optional[int] = None
+    ) -> bool:
+        """
+        Indica se o detector da chave deve ser (re)treinado
+        
+        Args:
+            key: Usuário ou GLOBAL_DETECTOR_KEY
+            features: Features atuais
+            data_version: Total de feedbacks da chave (None = só verifica drift)
+        """
+        entry = self.get(key)
+        if entry is None:
+            return True
+        if (data_version is not None and entry.data_version is not None and
+                data_version - entry.data_version >= self.refit_after):
+            return True
+        return self.drift(entry, features) > self.drift_threshold
+    
+    def fit(
+        self,
+        key: Hashable,
+        features: np.ndarray,
+        data_version: Optional[int] = None
+    ) -> FittedDetector:
+        """Treina um novo detector (fora do lock) e o instala no cache"""
+        scaler = StandardScaler()
+        features_scaled = scaler.fit_transform(features)
+        isolation_forest = IsolationForest(
+            contamination=self.contamination,
+            random_state=42
+        )
+        isolation_forest.fit(features_scaled)
+        
+        entry = FittedDetector(
+            isolation_forest=isolation_forest,
+            scaler=scaler,
+            fitted_at=datetime.now(),
+            n_samples=len(features),
+            data_version=data_version,
+            feature_mean=features.mean(axis=0),
+            feature_std=features.std(axis=0)
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.fits += 1
+        return entry
+    
+    def get_or_fit(
+        self,
+        key: Hashable,
+        features: np.ndarray,
+        data_version: Optional[int] = None
+    ) -> FittedDetector:
+        """Retorna o detector da chave, re-treinando conforme a política"""
+        if self.needs_refit(key, features, data_version):
+            return self.fit(key, features, data_version)
+        return self.get(key)
+    
+    def invalidate(self, key: Hashable):
+        """Remove o detector de uma chave"""
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def stats(self) -> Dict:
+        """Estatísticas do cache"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'fits': self.fits
+            }
+
+
 class AnomalyDetector:
     """
     Detecta anomalias em execuções de testes
     """
     
-    def __init__(self, contamination: float = 0.1):
+    def __init__(self, contamination: float = 0.1, cache: Optional[DetectorCache] = None):
         """
         Inicializa o detector de anomalias
         
         Args:
             contamination: Proporção esperada de anomalias (0-1)
+            cache: Cache de detectores treinados (compartilhável)
         """
         self.contamination = contamination
-        self.isolation_forest = IsolationForest(
-            contamination=contamination,
-            random_state=42
-        )
-        self.scaler = StandardScaler()
-        self.is_fitted = False
+        self.cache = cache or DetectorCache(contamination=contamination)
+    
+    @property
+    def is_fitted(self) -> bool:
+        """Indica se o detector global já foi treinado"""
+        return self.cache.get(GLOBAL_DETECTOR_KEY) is not None
     
     def detect_anomalies(
         self,
         feedbacks: List[ExecutionFeedback],
-        test_cases: Optional[Dict[str, any]] = None
+        test_cases: Optional[Dict[str, any]] = None,
+        cache_key: Optional[Hashable] = None,
+        data_version: Optional[int] = None
     ) -> Dict:
         """
         Detecta anomalias em uma lista de feedbacks
@@ -43,6 +297,8 @@ class AnomalyDetector:
         Args:
             feedbacks: Lista de feedbacks de execução
             test_cases: Dicionário de casos de teste (opcional)
+            cache_key: Dono do detector (ID do usuário); None usa o global
+            data_version: Total de feedbacks do dono, para a política de re-treino
         
         Returns:
             Dicionário com anomalias detectadas
@@ -62,13 +318,14 @@ class AnomalyDetector:
         # Extrair features dos feedbacks
         features = self._extract_features(feedbacks, test_cases)
         
-        # Treinar modelo se necessário
-        if not self.is_fitted or len(feedbacks) > 50:
-            self._fit_model(features)
+        # Obter detector treinado (re-treina só por volume de dados novos ou drift)
+        key = cache_key if cache_key is not None else GLOBAL_DETECTOR_KEY
+        fitted = self.cache.get_or_fit(key, features, data_version)
         
         # Detectar anomalias
-        predictions = self.isolation_forest.predict(features)
-        anomaly_scores = self.isolation_forest.score_samples(features)
+        features_scaled = fitted.scaler.transform(features)
+        predictions = fitted.isolation_forest.predict(features_scaled)
+        anomaly_scores = fitted.isolation_forest.score_samples(features_scaled)
         
         # Identificar anomalias
         anomalies = []
@@ -113,37 +370,42 @@ class AnomalyDetector:
         Returns:
             Array numpy com features
         """
-        features = []
-        
-        for feedback in feedbacks:
-            feature_vector = [
-                feedback.actual_execution_time,
-                feedback.tester_rating if feedback.tester_rating else 3.0,
-                1.0 if feedback.success else 0.0,
-                1.0 if feedback.required_reset else 0.0,
-                1.0 if feedback.followed_recommendation else 0.0,
-            ]
-            
-            # Adicionar features do teste se disponível
-            if test_cases and feedback.test_case_id in test_cases:
-                test = test_cases[feedback.test_case_id]
-                feature_vector.extend([
-                    test.priority,
-                    test.get_total_estimated_time(),
-                    1.0 if test.has_destructive_actions() else 0.0,
-                ])
-            else:
-                feature_vector.extend([3.0, 20.0, 0.0])  # Valores padrão
-            
-            features.append(feature_vector)
-        
-        return np.array(features)
+        return self.extract_features_columnar(FeedbackColumns.from_feedbacks(feedbacks), test_cases)
     
-    def _fit_model(self, features: np.ndarray):
-        """Treina o modelo de detecção de anomalias"""
-        features_scaled = self.scaler.fit_transform(features)
-        self.isolation_forest.fit(features_scaled)
-        self.is_fitted = True
+    def extract_features_columnar(
+        self,
+        columns: FeedbackColumns,
+        test_cases: Optional[Dict] = None
+    ) -> np.ndarray:
+        """
+        Extrai features de feedbacks em formato colunar
+        
+        Os atributos do teste (prioridade, tempo estimado, ações destrutivas)
+        são calculados uma vez por teste distinto e replicados por índice.
+        """
+        # Valores padrão para testes desconhecidos
+        test_features = np.tile([3.0, 20.0, 0.0], (len(columns.test_ids), 1))
+        if test_cases:
+            for code, test_id in enumerate(columns.test_ids):
+                test = test_cases.get(test_id)
+                if test is not None:
+                    test_features[code] = [
+                        test.priority,
+                        test.get_total_estimated_time(),
+                        1.0 if test.has_destructive_actions() else 0.0,
+                    ]
+        
+        rating = np.where(np.isnan(columns.rating), 3.0, columns.rating)
+        per_feedback = np.column_stack([
+            columns.execution_time,
+            rating,
+            columns.success.astype(np.float64),
+            columns.required_reset.astype(np.float64),
+            columns.followed_recommendation.astype(np.float64),
+        ])
+        if len(columns) == 0:
+            return per_feedback.reshape(0, 8)
+        return np.hstack([per_feedback, test_features[columns.test_codes]])
     
     def _explain_anomaly(
         self,
@@ -212,70 +474,90 @@ class AnomalyDetector:
         Returns:
             Lista de padrões identificados
         """
-        patterns = []
+        return self.detect_patterns_columnar(FeedbackColumns.from_feedbacks(feedbacks))
+    
+    def detect_patterns_columnar(self, columns: FeedbackColumns, window: int = 10) -> List[Dict]:
+        """
+        Detecta padrões recorrentes com reduções agrupadas por teste
         
-        # Padrão 1: Testes que falham frequentemente
-        failure_counts = defaultdict(int)
-        test_counts = defaultdict(int)
+        Mesmos critérios de _detect_patterns, em O(n) vetorizado: taxas de
+        falha e coeficientes de variação saem de np.bincount sobre os códigos
+        dos testes, e a degradação compara as duas últimas janelas de tempo.
         
-        for feedback in feedbacks:
-            test_counts[feedback.test_case_id] += 1
-            if not feedback.success:
-                failure_counts[feedback.test_case_id] += 1
+        Args:
+            columns: Feedbacks em ordem cronológica
+            window: Tamanho das janelas da análise de degradação
         
-        for test_id, failures in failure_counts.items():
-            failure_rate = (failures / test_counts[test_id]) * 100
-            if failure_rate > 50 and test_counts[test_id] >= 3:
-                patterns.append({
-                    'type': 'high_failure_rate',
-                    'test_id': test_id,
-                    'failure_rate': failure_rate,
-                    'total_executions': test_counts[test_id],
-                    'failures': failures,
-                    'severity': 'high' if failure_rate > 75 else 'medium',
-                    'message': f"Teste {test_id} falha em {failure_rate:.1f}% das execuções"
-                })
+        Returns:
+            Lista de padrões identificados
+        """
+        patterns = []
+        n_tests = len(columns.test_ids)
+        codes = columns.test_codes
+        times = columns.execution_time
+        counts = np.bincount(codes, minlength=n_tests)
+        
+        # Padrão 1: Testes que falham frequentemente (ordem da primeira falha)
+        failed_idx = np.flatnonzero(~columns.success)
+        failures = np.bincount(codes[failed_idx], minlength=n_tests)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            failure_rate = np.where(counts > 0, failures / counts * 100, 0.0)
+        
+        failed_codes, first_pos = np.unique(codes[failed_idx], return_index=True)
+        first_failure = failed_idx[first_pos]
+        flagged = (failure_rate[failed_codes] > 50) & (counts[failed_codes] >= 3)
+        for code in failed_codes[flagged][np.argsort(first_failure[flagged], kind='stable')]:
+            test_id = columns.test_ids[code]
+            rate = float(failure_rate[code])
+            patterns.append({
+                'type': 'high_failure_rate',
+                'test_id': test_id,
+                'failure_rate': rate,
+                'total_executions': int(counts[code]),
+                'failures': int(failures[code]),
+                'severity': 'high' if rate > 75 else 'medium',
+                'message': f"Teste {test_id} falha em {rate:.1f}% das execuções"
+            })
         
         # Padrão 2: Degradação de performance ao longo do tempo
-        if len(feedbacks) >= 10:
-            recent_feedbacks = feedbacks[-10:]
-            older_feedbacks = feedbacks[-20:-10] if len(feedbacks) >= 20 else feedbacks[:-10]
+        if len(times) >= window:
+            recent_times = times[-window:]
+            older_times = times[-2 * window:-window] if len(times) >= 2 * window else times[:-window]
             
-            if older_feedbacks:
-                recent_avg_time = np.mean([f.actual_execution_time for f in recent_feedbacks])
-                older_avg_time = np.mean([f.actual_execution_time for f in older_feedbacks])
+            if len(older_times):
+                recent_avg_time = float(recent_times.mean())
+                older_avg_time = float(older_times.mean())
                 
                 if recent_avg_time > older_avg_time * 1.5:
+                    degradation = ((recent_avg_time - older_avg_time) / older_avg_time) * 100
                     patterns.append({
                         'type': 'performance_degradation',
                         'recent_avg': recent_avg_time,
                         'older_avg': older_avg_time,
-                        'degradation': ((recent_avg_time - older_avg_time) / older_avg_time) * 100,
+                        'degradation': degradation,
                         'severity': 'medium',
-                        'message': f"Tempo de execução aumentou {((recent_avg_time - older_avg_time) / older_avg_time) * 100:.1f}% recentemente"
+                        'message': f"Tempo de execução aumentou {degradation:.1f}% recentemente"
                     })
         
-        # Padrão 3: Testes com tempo muito variável
-        test_times = defaultdict(list)
-        for feedback in feedbacks:
-            test_times[feedback.test_case_id].append(feedback.actual_execution_time)
-        
-        for test_id, times in test_times.items():
-            if len(times) >= 5:
-                std_dev = np.std(times)
-                mean_time = np.mean(times)
-                cv = (std_dev / mean_time) * 100 if mean_time > 0 else 0
-                
-                if cv > 50:  # Coeficiente de variação > 50%
-                    patterns.append({
-                        'type': 'high_variability',
-                        'test_id': test_id,
-                        'mean_time': mean_time,
-                        'std_dev': std_dev,
-                        'coefficient_of_variation': cv,
-                        'severity': 'medium',
-                        'message': f"Teste {test_id} tem alta variabilidade de tempo (CV: {cv:.1f}%)"
-                    })
+        # Padrão 3: Testes com tempo muito variável (desvio populacional, como np.std)
+        if n_tests:
+            mean_time = np.bincount(codes, weights=times, minlength=n_tests) / np.maximum(counts, 1)
+            squared_dev = np.bincount(codes, weights=(times - mean_time[codes]) ** 2, minlength=n_tests)
+            std_dev = np.sqrt(squared_dev / np.maximum(counts, 1))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cv = np.where(mean_time > 0, std_dev / mean_time * 100, 0.0)
+            
+            for code in np.flatnonzero((counts >= 5) & (cv > 50)):
+                test_id = columns.test_ids[code]
+                patterns.append({
+                    'type': 'high_variability',
+                    'test_id': test_id,
+                    'mean_time': float(mean_time[code]),
+                    'std_dev': float(std_dev[code]),
+                    'coefficient_of_variation': float(cv[code]),
+                    'severity': 'medium',
+                    'message': f"Teste {test_id} tem alta variabilidade de tempo (CV: {cv[code]:.1f}%)"
+                })
         
         return patterns
     
@@ -307,6 +589,33 @@ class AnomalyDetector:
                 'action': 'Revisar execuções recentes e verificar problemas sistêmicos'
             })
         
+        alerts.extend(self.pattern_alerts(patterns))
+        
+        # Alerta 4: Múltiplas anomalias recentes
+        recent_anomalies = [a for a in anomalies if len(feedbacks) - a['index'] <= 5]
+        if len(recent_anomalies) >= 3:
+            alerts.append({
+                'type': 'multiple_recent_anomalies',
+                'severity': 'medium',
+                'count': len(recent_anomalies),
+                'message': f"{len(recent_anomalies)} anomalias detectadas nas últimas 5 execuções",
+                'action': 'Revisar execuções recentes para identificar causa comum'
+            })
+        
+        return alerts
+    
+    def pattern_alerts(self, patterns: List[Dict]) -> List[Dict]:
+        """
+        Alertas derivados apenas dos padrões (usados também na análise global)
+        
+        Args:
+            patterns: Padrões identificados
+        
+        Returns:
+            Lista de alertas
+        """
+        alerts = []
+        
         # Alerta 2: Testes com alta taxa de falha
         high_failure_patterns = [p for p in patterns if p['type'] == 'high_failure_rate' and p['severity'] == 'high']
         for pattern in high_failure_patterns:
@@ -328,15 +637,4 @@ class AnomalyDetector:
                 'action': 'Verificar se há mudanças no ambiente ou no sistema testado'
             })
         
-        # Alerta 4: Múltiplas anomalias recentes
-        recent_anomalies = [a for a in anomalies if len(feedbacks) - a['index'] <= 5]
-        if len(recent_anomalies) >= 3:
-            alerts.append({
-                'type': 'multiple_recent_anomalies',
-                'severity': 'medium',
-                'count': len(recent_anomalies),
-                'message': f"{len(recent_anomalies)} anomalias detectadas nas últimas 5 execuções",
-                'action': 'Revisar execuções recentes para identificar causa comum'
-            })
-        
         return alerts
@@ -0,0 +1,229 @@
+"""
+Seleção de testes com orçamento de tempo (mochila com dependências).
+
+Dado um conjunto de testes pedidos, a duração prevista de cada um e um
+valor esperado (prioridade × risco de falha), escolhe o subconjunto de
+maior valor que cabe no orçamento. Um teste só pode ser escolhido junto com
+as suas dependências e o seu pai que estejam entre os pedidos (fecho), para
+que todo teste escolhido seja executável.
+
+A mochila com precedências é NP-difícil; aqui são combinadas duas
+heurísticas rápidas e fica a de maior valor:
+
+    - DP + reparo: mochila 0/1 clássica (tempos discretizados, arredondados
+      para cima) ignorando as precedências; depois o fecho é completado e,
+      se o orçamento estourar, saem os testes de menor valor/tempo dos quais
+      nenhum outro escolhido depende;
+    - guloso por fecho: repetidamente inclui o teste cujo fecho ainda não
+      escolhido tem a melhor razão valor/tempo e cabe no que resta.
+
+Em ambas, o tempo restante é preenchido pelo guloso ao final.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+
+
+@dataclass
+class BudgetPlan:
+    """Resultado da seleção com orçamento de tempo."""
+    budget: float
+    selected: List[str]                 # na ordem do pedido
+    excluded: List[str]
+    total_time: float
+    total_value: float
+    requested_value: float              # valor de todos os testes pedidos
+    method: str                         # 'all', 'dp', 'greedy' ou 'none'
+    unreachable: List[str] = field(default_factory=list)  # fecho sozinho já excede o orçamento
+
+    def to_dict(self) -> Dict:
+        return {
+            'budget': self.budget,
+            'selected': self.selected,
+            'excluded': self.excluded,
+            'unreachable': self.unreachable,
+            'total_time': round(self.total_time, 1),
+            'total_value': round(self.total_value, 4),
+            'value_coverage': round(self.total_value / self.requested_value, 4) if self.requested_value else None,
+            'method': self.method
+        }
+
+
+class TimeBudgetPlanner:
+    """Mochila com fecho de dependências sobre os testes pedidos."""
+
+    def __init__(self, resolution: int = 2000):
+        """
+        Args:
+            resolution: Número de unidades em que o orçamento é discretizado no DP
+        """
+        self.resolution = resolution
+
+    def plan(
+        self,
+        test_ids: List[str],
+        durations: Dict[str, float],
+        values: Dict[str, float],
+        prerequisites: Dict[str, Set[str]],
+        budget: float
+    ) -> BudgetPlan:
+        """
+        Escolhe os testes a executar dentro do orçamento
+
+        Args:
+            test_ids: Testes pedidos (IDs únicos)
+            durations: Duração prevista de cada teste (segundos)
+            values: Valor esperado de cada teste
+            prerequisites: Teste -> dependências e pai que estão entre os pedidos
+            budget: Tempo disponível (segundos)
+
+        Returns:
+            BudgetPlan com os testes escolhidos
+        """
+        ids = list(dict.fromkeys(test_ids))
+        time = {tid: max(float(durations.get(tid, 0.0)), 0.0) for tid in ids}
+        value = {tid: max(float(values.get(tid, 0.0)), 0.0) for tid in ids}
+        requested_value = sum(value.values())
+        closures = self._closures(ids, prerequisites)
+
+        if sum(time.values()) <= budget:
+            return self._result(ids, set(ids), time, value, requested_value, budget, 'all', [])
+
+        unreachable = [tid for tid in ids if sum(time[t] for t in closures[tid]) > budget]
+        candidates = [tid for tid in ids if tid not in set(unreachable)] if unreachable else ids
+        if not candidates:
+            return self._result(ids, set(), time, value, requested_value, budget, 'none', unreachable)
+
+        dependents: Dict[str, Set[str]] = {tid: set() for tid in ids}
+        for tid in ids:
+            for pre in closures[tid]:
+                if pre != tid:
+                    dependents[pre].add(tid)
+
+        dp_selected = self._knapsack(candidates, time, value, budget)
+        dp_selected = self._repair(dp_selected, closures, dependents, time, value, budget)
+        dp_selected = self._fill(dp_selected, candidates, closures, time, value, budget)
+        greedy_selected = self._fill(set(), candidates, closures, time, value, budget)
+
+        def key(selected: Set[str]):
+            return (sum(value[t] for t in selected), -sum(time[t] for t in selected))
+
+        if key(greedy_selected) > key(dp_selected):
+            return self._result(ids, greedy_selected, time, value, requested_value, budget, 'greedy', unreachable)
+        return self._result(ids, dp_selected, time, value, requested_value, budget, 'dp', unreachable)
+
+    @staticmethod
+    def _closures(ids: List[str], prerequisites: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+        """Fecho transitivo (teste + pré-requisitos) de cada teste, restrito aos pedidos."""
+        requested = set(ids)
+        closures: Dict[str, Set[str]] = {}
+        for tid in ids:
+            closure = {tid}
+            stack = [tid]
+            while stack:
+                for pre in prerequisites.get(stack.pop(), ()):
+                    if pre in requested and pre not in closure:
+                        closure.add(pre)
+                        stack.append(pre)
+            closures[tid] = closure
+        return closures
+
+    def _knapsack(self, candidates: List[str], time: Dict[str, float], value: Dict[str, float], budget: float) -> Set[str]:
+        """Mochila 0/1 (sem precedências) com tempos arredondados para cima."""
+        unit = budget / self.resolution if budget > 0 else 1.0
+        capacity = int(budget / unit) if budget > 0 else 0
+        weights = [int(np.ceil(time[tid] / unit - 1e-9)) for tid in candidates]
+
+        best = np.zeros(capacity + 1, dtype=np.float64)
+        take = np.zeros((len(candidates), capacity + 1), dtype=bool)
+        for i, (tid, weight) in enumerate(zip(candidates, weights)):
+            if weight > capacity:
+                continue
+            with_item = np.full(capacity + 1, -np.inf)
+            with_item[weight:] = best[:capacity + 1 - weight] + value[tid]
+            better = with_item > best
+            take[i] = better
+            best = np.where(better, with_item, best)
+
+        selected: Set[str] = set()
+        remaining = capacity
+        for i in range(len(candidates) - 1, -1, -1):
+            if take[i, remaining]:
+                selected.add(candidates[i])
+                remaining -= weights[i]
+        return selected
+
+    @staticmethod
+    def _repair(
+        selected: Set[str],
+        closures: Dict[str, Set[str]],
+        dependents: Dict[str, Set[str]],
+        time: Dict[str, float],
+        value: Dict[str, float],
+        budget: float
+    ) -> Set[str]:
+        """Completa o fecho e remove testes sem dependentes escolhidos até caber no orçamento."""
+        selected = set().union(*(closures[tid] for tid in selected)) if selected else set()
+        total = sum(time[t] for t in selected)
+        while total > budget and selected:
+            # Sem dependentes escolhidos (em um ciclo de dependências, qualquer um)
+            removable = [tid for tid in selected if not (dependents[tid] & selected)] or list(selected)
+            worst = min(removable, key=lambda tid: (value[tid] / time[tid] if time[tid] > 0 else np.inf, value[tid]))
+            dropped = {worst} | (dependents[worst] & selected)
+            selected -= dropped
+            total -= sum(time[t] for t in dropped)
+        return selected
+
+    @staticmethod
+    def _fill(
+        selected: Set[str],
+        candidates: Iterable[str],
+        closures: Dict[str, Set[str]],
+        time: Dict[str, float],
+        value: Dict[str, float],
+        budget: float
+    ) -> Set[str]:
+        """Guloso: inclui o fecho de melhor valor/tempo que ainda cabe, até nenhum caber."""
+        selected = set(selected)
+        remaining = budget - sum(time[t] for t in selected)
+        pending = [tid for tid in candidates if tid not in selected]
+        while pending:
+            best_tid, best_key, best_missing = None, None, None
+            for tid in pending:
+                missing = closures[tid] - selected
+                cost = sum(time[t] for t in missing)
+                if cost > remaining:
+                    continue
+                gain = sum(value[t] for t in missing)
+                key = (gain / cost if cost > 0 else np.inf, gain)
+                if best_key is None or key > best_key:
+                    best_tid, best_key, best_missing = tid, key, missing
+            if best_tid is None:
+                break
+            selected |= best_missing
+            remaining -= sum(time[t] for t in best_missing)
+            pending = [tid for tid in pending if tid not in selected]
+        return selected
+
+    @staticmethod
+    def _result(
+        ids: List[str],
+        selected: Set[str],
+        time: Dict[str, float],
+        value: Dict[str, float],
+        requested_value: float,
+        budget: float,
+        method: str,
+        unreachable: List[str]
+    ) -> BudgetPlan:
+        return BudgetPlan(
+            budget=budget,
+            selected=[tid for tid in ids if tid in selected],
+            excluded=[tid for tid in ids if tid not in selected],
+            total_time=sum(time[t] for t in selected),
+            total_value=sum(value[t] for t in selected),
+            requested_value=requested_value,
+            method=method,
+            unreachable=unreachable
+        )
@@ -0,0 +1,364 @@
+"""
+Ordenação contextual e reparo lógico de uma seleção de testes.
+
+contextual_reorder respeita dependências explícitas, pai e dependências
+inferidas por pré/pós-condições e usa risco/contexto só como desempate
+entre testes executáveis; repair_order_for_logic garante a consistência
+lógica de uma ordem qualquer com um sort topológico estável.
+
+As funções só dependem dos testes e dos mapas recebidos (nada do app ou do
+banco), para que também rodem em processos separados (ver decomposition).
+"""
+import bisect
+import heapq
+from typing import Dict, List, Optional, Set
+
+from src.models.test_case import TestCase
+from src.utils.dependency_graph import CatalogDependencyGraph, DependencySubgraph
+
+
+def contextual_reorder(
+    test_cases: List[TestCase],
+    base_order_ids: List[str],
+    risk_map: Dict[str, float],
+    affinity_map: Dict[str, float],
+    initial_module: str = None,
+    graph: Optional[DependencySubgraph] = None,
+    initial_state: Optional[Set[str]] = None,
+    completed: Optional[Set[str]] = None
+) -> List[TestCase]:
+    """
+    Reordena respeitando a sequência lógica (dependências) e usando risco/contexto
+    apenas como critérios de desempate entre testes "executáveis".
+
+    Lógica:
+    - Primeiro: respeitar `dependencies` explícitas + dependências inferidas por pre/postconditions.
+    - Depois: entre candidatos executáveis, priorizar risco de falha + contexto + prioridade.
+
+    Args:
+        graph: Subgrafo de dependências da seleção (recortado do grafo do catálogo);
+            montado aqui se não for informado
+        initial_state: Condições já satisfeitas no início (re-planejamento no meio da sessão);
+            pré-condições nele não geram dependência de um provedor
+        completed: Testes já executados (dependências satisfeitas)
+    """
+    if graph is None:
+        graph = CatalogDependencyGraph(test_cases).subgraph(test_cases)
+    nodes = graph.nodes
+
+    base_rank = {tid: idx for idx, tid in enumerate(base_order_ids)}
+
+    # Inferir dependências lógicas via pre/postconditions dentro do conjunto selecionado
+    # IMPORTANTE: pré-condição pode ter múltiplos provedores; escolher 1 provedor (melhor) evita
+    # "super-dependências" (exigir todos os provedores) que geram ciclos e falsos conflitos.
+    # Índice de provedores ordenado pelo base_rank (sort estável = mesmo desempate do min)
+    post_providers: Dict[str, List[str]] = {
+        condition: sorted(providers, key=lambda pid: base_rank.get(pid, 10_000))
+        for condition, providers in graph.providers.items()
+    }
+
+    # IMPORTANTE: Respeitar parent_test_id como dependência explícita
+    # (dependências explícitas fora da seleção continuam bloqueando até o fallback)
+    completed = completed or set()
+    initial_state = initial_state or set()
+    inferred_deps: Dict[str, set] = {
+        tc.id: (set(nodes[tc.id].dependencies) | graph.explicit[tc.id]) - completed for tc in test_cases
+    }
+    
+    for tc in test_cases:
+        for pre in nodes[tc.id].preconditions:
+            if pre in initial_state:
+                continue
+            providers = [pid for pid in post_providers.get(pre, []) if pid != tc.id]
+            if not providers:
+                continue
+            
+            # Priorizar dependências explícitas: se já existe uma dependência explícita que fornece essa pré-condição,
+            # usar ela em vez de inferir outra
+            if any(pid in inferred_deps[tc.id] for pid in providers):
+                # Já temos uma dependência explícita que fornece essa pré-condição, não adicionar outra
+                continue
+            
+            # Escolher provedor mais "natural" pela ordem base (mais cedo no base_rank)
+            inferred_deps[tc.id].add(providers[0])
+
+    # Dados fixos de cada teste, calculados uma única vez
+    pre_internal: Dict[str, set] = {}
+    destructive: Dict[str, bool] = {}
+    total_time: Dict[str, float] = {}
+    consumers: Dict[str, List[TestCase]] = {}   # pré-condição interna -> testes que a exigem
+    by_module: Dict[str, List[TestCase]] = {}
+    for tc in test_cases:
+        pre_internal[tc.id] = graph.internal_preconditions(tc.id)
+        destructive[tc.id] = nodes[tc.id].destructive
+        total_time[tc.id] = nodes[tc.id].total_time
+        for p in pre_internal[tc.id]:
+            consumers.setdefault(p, []).append(tc)
+        by_module.setdefault(tc.module, []).append(tc)
+
+    # Grafo de dependências: grau de entrada = dependências ainda não executadas
+    dependents: Dict[str, List[TestCase]] = {}
+    pending_deps: Dict[TestCase, int] = {}
+    for tc in test_cases:
+        deps = inferred_deps[tc.id]
+        pending_deps[tc] = len(deps)
+        for dep_id in deps:
+            dependents.setdefault(dep_id, []).append(tc)
+
+    current_module = initial_module
+    current_state = set(initial_state)  # simulação simples de estado para preferir sequências compatíveis
+
+    def _score(tc: TestCase):
+        same_mod_bonus = 0.05 if current_module and tc.module == current_module else 0.0
+        # Considerar apenas pré-condições "internas" (que alguém da seleção produz).
+        internal = pre_internal[tc.id]
+        compat = len(current_state.intersection(internal)) / max(len(internal), 1) if internal else 1.0
+        # Penalizar se ainda falta muita precondição (mesmo deps satisfeitas, pode indicar necessidade de setup)
+        pre_penalty = (1.0 - compat) * 0.25 if internal else 0.0
+        return (
+            -risk_map.get(tc.id, 0.0),                           # risco (falha) alto primeiro
+            -(affinity_map.get(tc.id, 0.0) + same_mod_bonus),   # contexto
+            -tc.priority,                                       # prioridade alta
+            -compat,                                            # preferir sequência que encaixa no estado atual
+            pre_penalty,                                        # evitar testes "fora de sequência"
+            tc.module,                                          # agrupar módulo
+            destructive[tc.id],                                 # não-destrutivo primeiro
+            base_rank.get(tc.id, 10_000),                       # preservar tendência do modelo base
+            total_time[tc.id]                                   # rápidos antes
+        )
+
+    # Heap de testes executáveis com invalidação preguiçosa: cada teste guarda a versão
+    # da sua entrada válida e só é reavaliado quando módulo corrente ou estado o afetam.
+    position = {tc: idx for idx, tc in enumerate(test_cases)}
+    version: Dict[TestCase, int] = {}
+    ready_heap: List[tuple] = []
+    remaining = set(test_cases)
+
+    def _push(tc: TestCase):
+        version[tc] = version.get(tc, 0) + 1
+        heapq.heappush(ready_heap, (_score(tc), position[tc], version[tc], tc))
+
+    for tc in test_cases:
+        if pending_deps[tc] == 0:
+            _push(tc)
+
+    ordered: List[TestCase] = []
+    while remaining:
+        next_test = None
+        while ready_heap:
+            _, _, entry_version, tc = heapq.heappop(ready_heap)
+            if tc in remaining and entry_version == version[tc]:
+                next_test = tc
+                break
+
+        # Se houver ciclo/impasse, liberar pelo menos um teste (fallback seguro)
+        if next_test is None:
+            next_test = min(remaining, key=lambda tc: (_score(tc), position[tc]))
+
+        ordered.append(next_test)
+        remaining.remove(next_test)
+
+        # Atualizar estado "lógico"; se destrutivo, considerar que pode invalidar estado (aprox.)
+        previous_state = current_state
+        if destructive[next_test.id]:
+            current_state = set()
+        else:
+            current_state = previous_state | nodes[next_test.id].postconditions
+        previous_module, current_module = current_module, next_test.module
+
+        # Testes liberados pela execução
+        released = []
+        for tc in dependents.get(next_test.id, ()):
+            pending_deps[tc] -= 1
+            if pending_deps[tc] == 0 and tc in remaining:
+                released.append(tc)
+
+        # Reavaliar apenas os testes cujo score pode ter mudado
+        affected = set(released)
+        if previous_module != current_module:
+            for module in (previous_module, current_module):
+                affected.update(by_module.get(module, ()))
+        for condition in previous_state.symmetric_difference(current_state):
+            affected.update(consumers.get(condition, ()))
+        for tc in affected:
+            if tc in remaining and pending_deps[tc] == 0:
+                _push(tc)
+
+    return ordered
+
+
+def strongly_connected_components(nodes: List[str], outgoing: Dict[str, set]) -> List[List[str]]:
+    """
+    Componentes fortemente conexas (Tarjan iterativo, sem recursão).
+
+    Args:
+        nodes: Vértices do grafo
+        outgoing: Arestas de saída de cada vértice
+
+    Returns:
+        Lista de componentes (cada uma uma lista de vértices)
+    """
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack = set()
+    components: List[List[str]] = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(outgoing.get(root, ())))]
+        while work:
+            node, neighbors = work[-1]
+            for nxt in neighbors:
+                if nxt not in index:
+                    index[nxt] = low[nxt] = len(index)
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, iter(outgoing.get(nxt, ()))))
+                    break
+                if nxt in on_stack:
+                    low[node] = min(low[node], index[nxt])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def repair_order_for_logic(
+    test_cases: List[TestCase],
+    order_ids: List[str],
+    graph: Optional[DependencySubgraph] = None,
+    initial_state: Optional[Set[str]] = None,
+    completed: Optional[Set[str]] = None
+) -> List[str]:
+    """
+    "Repair" de ordem para garantir consistência lógica:
+    - respeita dependencies explícitas
+    - respeita pré-condições internas (produzidas por algum teste da seleção)
+    - usa topological sort estável (mantém o máximo possível da ordem original)
+    - se detectar ciclo, descarta apenas as dependências inferidas dentro das
+      componentes fortemente conexas (Tarjan) que formam o ciclo
+
+    Args:
+        graph: Subgrafo de dependências da seleção; montado aqui se não for informado
+        initial_state: Condições já satisfeitas no início (re-planejamento no meio da sessão);
+            pré-condições nele não geram dependência de um provedor
+        completed: Testes já executados (dependências satisfeitas)
+    """
+    if not test_cases or not order_ids:
+        return order_ids
+
+    if graph is None:
+        graph = CatalogDependencyGraph(test_cases).subgraph(test_cases)
+    nodes = graph.nodes
+    order = [tid for tid in order_ids if tid in nodes]
+    pos = {tid: idx for idx, tid in enumerate(order)}
+
+    # mapear provedores de pós-condições (apenas testes da ordem, ordenados por posição)
+    post_providers: Dict[str, List[int]] = {}
+    for st, providers in graph.providers.items():
+        positions = sorted(pos[pid] for pid in providers if pid in pos)
+        if positions:
+            post_providers[st] = positions
+
+    outgoing: Dict[str, set] = {tid: set() for tid in order}
+    inferred_edges = set()
+
+    def add_edge(a: str, b: str) -> bool:
+        if a == b or a not in outgoing or b not in outgoing or b in outgoing[a]:
+            return False
+        outgoing[a].add(b)
+        return True
+
+    # dependencies explícitas + IMPORTANTE: parent_test_id como dependência explícita
+    completed = completed or set()
+    initial_state = initial_state or set()
+    for tid in order:
+        for dep in graph.explicit[tid]:
+            if dep not in completed:
+                add_edge(dep, tid)
+
+    # inferir dependências via pré-condições: escolher provedor mais próximo ANTES na ordem atual
+    for tid in order:
+        node = nodes[tid]
+        here = pos[tid]
+        for req in node.preconditions:
+            if req in initial_state:
+                continue
+            positions = post_providers.get(req)
+            if not positions:
+                continue
+
+            # Priorizar dependências explícitas: se já existe uma dependência explícita que fornece
+            # essa pré-condição, a aresta já existe (percorre as poucas dependências, não os provedores)
+            if any(
+                dep != tid and dep in pos and req in nodes[dep].postconditions
+                for dep in graph.explicit[tid]
+            ):
+                continue
+
+            # escolher provedor mais próximo antes; se nenhum antes, escolher o mais cedo
+            before = bisect.bisect_left(positions, here)
+            if before > 0:
+                best = order[positions[before - 1]]
+            else:
+                earliest = next((p for p in positions if p != here), None)
+                if earliest is None:
+                    continue
+                best = order[earliest]
+            if add_edge(best, tid):
+                inferred_edges.add((best, tid))
+
+    def topo_sort() -> List[str]:
+        # Kahn com estabilidade por posição original (heap pela posição)
+        indeg = {tid: 0 for tid in order}
+        for targets in outgoing.values():
+            for nxt in targets:
+                indeg[nxt] += 1
+        zeros = [pos[tid] for tid in order if indeg[tid] == 0]
+        heapq.heapify(zeros)
+        res: List[str] = []
+        while zeros:
+            tid = order[heapq.heappop(zeros)]
+            res.append(tid)
+            for nxt in outgoing[tid]:
+                indeg[nxt] -= 1
+                if indeg[nxt] == 0:
+                    heapq.heappush(zeros, pos[nxt])
+        return res
+
+    res = topo_sort()
+    if len(res) == len(order):
+        return res
+
+    # ciclo: remover só as arestas inferidas internas às componentes cíclicas
+    for component in strongly_connected_components(order, outgoing):
+        if len(component) < 2:
+            continue
+        members = set(component)
+        for a in component:
+            for b in list(outgoing[a]):
+                if b in members and (a, b) in inferred_edges:
+                    outgoing[a].discard(b)
+
+    res = topo_sort()
+    if len(res) == len(order):
+        return res
+
+    # fallback final (ciclo entre dependências explícitas): ordem original
+    return order_ids
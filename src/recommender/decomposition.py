@@ -0,0 +1,351 @@
+"""
+Ordenação por decomposição para seleções muito grandes.
+
+A ordem base heurística e a ordenação contextual são quadráticas no número
+de testes: com milhares de testes, só elas levam minutos. Aqui a seleção é
+dividida em partições pequenas, cada uma ordenada de forma independente, e
+as partições são encadeadas:
+
+    1. partição: árvores pai/filhos (raiz da hierarquia) ficam inteiras; as
+       árvores são agrupadas pelo módulo da raiz e módulos maiores que
+       max_partition são cortados em clusters de condições (árvores com
+       assinaturas de pré/pós-condições parecidas ficam no mesmo pedaço);
+    2. cada partição recebe a ordem base (mesmos critérios de
+       MLTestRecommender._heuristic_ordering, via heap) e a ordenação
+       contextual (risco/afinidade), em um pool de processos quando a seleção
+       é grande o bastante para compensar o custo de enviar os testes;
+    3. a matriz de transição entre partições (reset se o estado ao fim de uma
+       não satisfaz as pré-condições do primeiro teste da outra, mais a troca
+       de módulo) define o encadeamento: guloso pela menor transição,
+       respeitando dependências explícitas entre partições, com o maior risco
+       como desempate.
+
+O resultado ainda deve passar por repair_order_for_logic, que corrige as
+dependências inferidas entre partições.
+"""
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.models.test_case import TestCase
+from src.recommender.contextual_order import contextual_reorder
+from src.utils.dependency_graph import CatalogDependencyGraph, DependencySubgraph
+from src.utils.order_metrics import ConditionBits
+
+
+def heuristic_order(test_cases: List[TestCase]) -> List[TestCase]:
+    """
+    Ordem base com os critérios de MLTestRecommender._heuristic_ordering em O(n log n)
+
+    Entre os testes com dependências (da seleção) já executadas, escolhe o de
+    maior prioridade, agrupando por módulo, não-destrutivos e rápidos primeiro.
+    Dependências fora da seleção são ignoradas.
+
+    Args:
+        test_cases: Testes a ordenar
+
+    Returns:
+        Testes na ordem heurística
+    """
+    ids = {tc.id for tc in test_cases}
+    key = {
+        tc.id: (-tc.priority, tc.module, tc.has_destructive_actions(), tc.get_total_estimated_time(), position)
+        for position, tc in enumerate(test_cases)
+    }
+    by_id = {tc.id: tc for tc in test_cases}
+    pending = {tc.id: len({dep for dep in tc.dependencies if dep in ids and dep != tc.id}) for tc in test_cases}
+    dependents: Dict[str, List[str]] = {}
+    for tc in test_cases:
+        for dep in {dep for dep in tc.dependencies if dep in ids and dep != tc.id}:
+            dependents.setdefault(dep, []).append(tc.id)
+
+    ready = [key[tid] + (tid,) for tid, count in pending.items() if count == 0]
+    heapq.heapify(ready)
+    done = set()
+    ordered: List[TestCase] = []
+    while len(ordered) < len(test_cases):
+        if ready:
+            tid = heapq.heappop(ready)[-1]
+        else:
+            # Ciclo de dependências: libera o melhor teste restante
+            tid = min((tid for tid in pending if tid not in done), key=key.get)
+        if tid in done:
+            continue
+        done.add(tid)
+        ordered.append(by_id[tid])
+        for nxt in dependents.get(tid, ()):
+            pending[nxt] -= 1
+            if pending[nxt] == 0 and nxt not in done:
+                heapq.heappush(ready, key[nxt] + (nxt,))
+    return ordered
+
+
+def _solve_partition(job: Tuple[List[TestCase], Dict[str, float], Dict[str, float]]) -> List[str]:
+    """Ordena uma partição (executada no pool de processos; só recebe dados)."""
+    tests, risk_map, affinity_map = job
+    ids = {tc.id for tc in tests}
+    graph = CatalogDependencyGraph(tests).subgraph(tests)
+    base = heuristic_order(tests)
+    # Dependências em outras partições: resolvidas no encadeamento e no repair
+    external = {dep for tc in tests for dep in tc.dependencies if dep not in ids}
+    ordered = contextual_reorder(
+        tests, [tc.id for tc in base], risk_map, affinity_map, graph=graph, completed=external
+    )
+    return [tc.id for tc in ordered]
+
+
+@dataclass
+class DecompositionResult:
+    """Ordem encadeada e estatísticas da decomposição."""
+    order: List[str]
+    partition_sizes: List[int]          # na ordem de encadeamento
+    parallel: bool
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return {
+            'partitions': len(self.partition_sizes),
+            'largest_partition': max(self.partition_sizes, default=0),
+            'parallel': self.parallel,
+            'timings_ms': {k: round(v, 1) for k, v in self.timings_ms.items()}
+        }
+
+
+class DecompositionOrderer:
+    """Divide, ordena as partições (em paralelo) e encadeia. Thread-safe."""
+
+    def __init__(
+        self,
+        max_partition: int = 250,
+        min_tests: int = 1000,
+        parallel_min_tests: int = 2000,
+        max_workers: Optional[int] = None,
+        reset_time: float = 60.0,
+        switch_time: float = 10.0
+    ):
+        """
+        Args:
+            max_partition: Tamanho máximo de uma partição (árvores maiores ficam inteiras)
+            min_tests: Tamanho de seleção a partir do qual a decomposição deve ser usada
+            parallel_min_tests: Tamanho a partir do qual as partições vão para o pool de processos
+            max_workers: Processos do pool (padrão: CPUs disponíveis)
+            reset_time: Custo (segundos) de um reset na matriz de transição
+            switch_time: Custo (segundos) de uma troca de módulo na matriz de transição
+        """
+        self.max_partition = max_partition
+        self.min_tests = min_tests
+        self.parallel_min_tests = parallel_min_tests
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.reset_time = reset_time
+        self.switch_time = switch_time
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def order(
+        self,
+        test_cases: List[TestCase],
+        risk_map: Dict[str, float],
+        affinity_map: Dict[str, float],
+        initial_module: Optional[str] = None,
+        graph: Optional[DependencySubgraph] = None,
+        parallel: Optional[bool] = None
+    ) -> DecompositionResult:
+        """
+        Ordena uma seleção grande por decomposição
+
+        Args:
+            test_cases: Testes da seleção (IDs únicos)
+            risk_map: Risco de falha por teste (desempate dentro e entre partições)
+            affinity_map: Afinidade de contexto por teste
+            initial_module: Módulo do último teste executado (primeira transição)
+            graph: Subgrafo de dependências da seleção; montado aqui se não for informado
+            parallel: Força (True) ou desliga (False) o pool; padrão pelo tamanho da seleção
+
+        Returns:
+            DecompositionResult com a ordem encadeada (ainda sem repair)
+        """
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        if graph is None:
+            graph = CatalogDependencyGraph(test_cases).subgraph(test_cases)
+        partitions = self.partition(test_cases, graph)
+        timings['partition'] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        jobs = [
+            (
+                part,
+                {tc.id: risk_map.get(tc.id, 0.0) for tc in part},
+                {tc.id: affinity_map.get(tc.id, 0.0) for tc in part}
+            )
+            for part in partitions
+        ]
+        if parallel is None:
+            parallel = len(test_cases) >= self.parallel_min_tests and len(partitions) > 1 and self.max_workers > 1
+        solved = None
+        if parallel:
+            try:
+                chunksize = max(1, len(jobs) // (self.max_workers * 4))
+                solved = list(self._pool().map(_solve_partition, jobs, chunksize=chunksize))
+            except Exception as e:
+                # Pool quebrado (ex.: processo morto): descarta e ordena no próprio processo
+                print(f"Erro no pool de decomposição, ordenando sem paralelismo: {e}")
+                self.shutdown()
+                parallel = False
+        if solved is None:
+            solved = [_solve_partition(job) for job in jobs]
+        timings['solve'] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        modules = {tc.id: tc.module for tc in test_cases}
+        sequence = self._chain(solved, graph, modules, risk_map, initial_module)
+        timings['stitch'] = (time.perf_counter() - started) * 1000
+
+        return DecompositionResult(
+            order=[tid for p in sequence for tid in solved[p]],
+            partition_sizes=[len(solved[p]) for p in sequence],
+            parallel=parallel,
+            timings_ms=timings
+        )
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """Pool de processos, criado na primeira seleção grande e reaproveitado."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def shutdown(self):
+        """Encerra o pool de processos (recriado sob demanda)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def partition(self, test_cases: List[TestCase], graph: DependencySubgraph) -> List[List[TestCase]]:
+        """
+        Divide a seleção por raiz da hierarquia, módulo e clusters de condições
+
+        Args:
+            test_cases: Testes da seleção
+            graph: Subgrafo de dependências da seleção
+
+        Returns:
+            Partições (listas de testes, na ordem da seleção)
+        """
+        # Árvores pai/filhos dentro da seleção (union-find pelo pai)
+        root = {tc.id: tc.id for tc in test_cases}
+
+        def find(tid: str) -> str:
+            while root[tid] != tid:
+                root[tid] = root[root[tid]]
+                tid = root[tid]
+            return tid
+
+        for tc in test_cases:
+            if tc.parent_test_id and tc.parent_test_id in root:
+                root[find(tc.id)] = find(tc.parent_test_id)
+
+        trees: Dict[str, List[TestCase]] = {}
+        for tc in test_cases:
+            trees.setdefault(find(tc.id), []).append(tc)
+
+        by_module: Dict[str, List[List[TestCase]]] = {}
+        for tree_root, members in trees.items():
+            module = next((tc.module for tc in members if tc.id == tree_root), members[0].module)
+            by_module.setdefault(module or "N/A", []).append(members)
+
+        partitions: List[List[TestCase]] = []
+        for module in sorted(by_module):
+            module_trees = by_module[module]
+            if sum(len(t) for t in module_trees) <= self.max_partition:
+                partitions.append([tc for t in module_trees for tc in t])
+                continue
+            # Clusters de condições: assinaturas parecidas ficam adjacentes e são cortadas em pedaços
+            def signature(members: List[TestCase]) -> Tuple[str, ...]:
+                conditions = set()
+                for tc in members:
+                    node = graph.nodes[tc.id]
+                    conditions.update(node.preconditions)
+                    conditions.update(node.postconditions)
+                return tuple(sorted(conditions))
+
+            current: List[TestCase] = []
+            for members in sorted(module_trees, key=signature):
+                if current and len(current) + len(members) > self.max_partition:
+                    partitions.append(current)
+                    current = []
+                current.extend(members)
+            if current:
+                partitions.append(current)
+        return partitions
+
+    def _chain(
+        self,
+        solved: List[List[str]],
+        graph: DependencySubgraph,
+        modules: Dict[str, str],
+        risk_map: Dict[str, float],
+        initial_module: Optional[str]
+    ) -> List[int]:
+        """Encadeia as partições pela matriz de transição, respeitando dependências explícitas entre elas."""
+        count = len(solved)
+        nodes = graph.nodes
+        bits = ConditionBits()
+        providers = set(graph.providers)
+
+        owner = {tid: p for p, ids in enumerate(solved) for tid in ids}
+        start_pre = [0] * count
+        end_state = [0] * count
+        for p, ids in enumerate(solved):
+            state = 0
+            for position, tid in enumerate(ids):
+                node = nodes[tid]
+                pre = bits.mask(c for c in node.preconditions if c in providers)
+                if position == 0:
+                    start_pre[p] = pre
+                if pre & ~state:
+                    state = 0
+                state = 0 if node.destructive else state | bits.mask(node.postconditions)
+            end_state[p] = state
+
+        modules_first = np.array([modules[ids[0]] for ids in solved], dtype=object)
+        modules_last = np.array([modules[ids[-1]] for ids in solved], dtype=object)
+        # transition[a, b]: custo de executar b logo após a
+        needs_reset = np.array([[(start_pre[b] & ~end_state[a]) != 0 for b in range(count)] for a in range(count)])
+        transition = needs_reset * self.reset_time + (modules_last[:, None] != modules_first[None, :]) * self.switch_time
+        opening = np.array([
+            (self.reset_time if start_pre[b] else 0.0) + (self.switch_time if initial_module and modules_first[b] != initial_module else 0.0)
+            for b in range(count)
+        ])
+        max_risk = np.array([max((risk_map.get(tid, 0.0) for tid in ids), default=0.0) for ids in solved])
+
+        # Precedência entre partições (dependências explícitas e pai)
+        predecessors: List[set] = [set() for _ in range(count)]
+        for tid, deps in graph.explicit.items():
+            for dep in deps:
+                a, b = owner.get(dep), owner.get(tid)
+                if a is not None and b is not None and a != b:
+                    predecessors[b].add(a)
+
+        placed: List[int] = []
+        placed_set = set()
+        current: Optional[int] = None
+        while len(placed) < count:
+            remaining = [p for p in range(count) if p not in placed_set]
+            ready = [p for p in remaining if predecessors[p] <= placed_set]
+            if not ready:
+                # Ciclo entre partições: a com menos predecessores pendentes
+                fewest = min(len(predecessors[p] - placed_set) for p in remaining)
+                ready = [p for p in remaining if len(predecessors[p] - placed_set) == fewest]
+            costs = opening if current is None else transition[current]
+            current = min(ready, key=lambda p: (costs[p], -max_risk[p], p))
+            placed.append(current)
+            placed_set.add(current)
+        return placed
@@ -0,0 +1,246 @@
+"""
+Modelo de duração dos testes aprendido com os feedbacks.
+
+get_total_estimated_time() soma as estimativas digitadas nas ações; a
+tabela feedbacks guarda o tempo real de cada execução. O modelo aprende,
+por teste e por (usuário, teste), a razão log(tempo real / estimativa) e
+prevê
+
+    estimativa * exp(razão do usuário)
+
+com shrinkage em dois níveis:
+
+    - razão do teste = média das razões dos OUTROS usuários, puxada para 0
+      (isto é, para a própria estimativa) com peso test_strength;
+    - razão do usuário = média das razões dele, puxada para a razão do
+      teste com peso user_strength.
+
+Trabalhar com a razão (e não com segundos) mantém o aprendizado válido
+quando a estimativa de um teste personalizado é editada, e o log limita o
+efeito de execuções muito longas (ainda recortadas em max_log_ratio).
+
+Cada feedback atualiza dois contadores em O(1). Antes de incorporá-lo, o
+modelo compara a sua previsão e a estimativa estática com o tempo real
+(avaliação prequencial), e metrics() expõe MAE/RMSE/MAPE de ambos.
+"""
+import math
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.models.test_case import TestCase
+
+
+ANONYMOUS_USER = 0  # chave dos feedbacks sem testador
+
+
+@dataclass
+class ErrorStats:
+    """Erros acumulados de previsões de duração."""
+    count: int = 0
+    abs_error: float = 0.0
+    squared_error: float = 0.0
+    abs_pct_error: float = 0.0
+
+    def add(self, predicted: float, actual: float):
+        error = predicted - actual
+        self.count += 1
+        self.abs_error += abs(error)
+        self.squared_error += error * error
+        self.abs_pct_error += abs(error) / actual
+
+    def to_dict(self) -> Dict[str, Optional[float]]:
+        if not self.count:
+            return {'mae': None, 'rmse': None, 'mape': None}
+        return {
+            'mae': round(self.abs_error / self.count, 3),
+            'rmse': round(math.sqrt(self.squared_error / self.count), 3),
+            'mape': round(100.0 * self.abs_pct_error / self.count, 2)
+        }
+
+
+@dataclass
+class _Evaluation:
+    """Erros do modelo e da estimativa estática sobre as mesmas execuções."""
+    model: ErrorStats
+    static: ErrorStats
+
+    def to_dict(self) -> Dict:
+        model = self.model.to_dict()
+        static = self.static.to_dict()
+        improvement = None
+        if model['mae'] is not None and static['mae']:
+            improvement = round(100.0 * (1.0 - model['mae'] / static['mae']), 2)
+        return {
+            'evaluated': self.model.count,
+            'model': model,
+            'static': static,
+            'mae_improvement_pct': improvement
+        }
+
+
+class DurationModel:
+    """Previsão de duração por teste e por usuário, atualizada a cada feedback. Thread-safe."""
+
+    def __init__(
+        self,
+        db=None,
+        catalog_loader: Optional[Callable[[Optional[int]], Dict[str, TestCase]]] = None,
+        test_strength: float = 3.0,
+        user_strength: float = 3.0,
+        max_log_ratio: float = 3.0,
+        min_prior: float = 1.0
+    ):
+        """
+        Args:
+            db: Instância do banco de dados (histórico carregado na primeira consulta)
+            catalog_loader: Função user_id -> catálogo do usuário (estimativas na carga)
+            test_strength: Execuções equivalentes da estimativa estática no nível do teste
+            user_strength: Execuções equivalentes do nível do teste no nível do usuário
+            max_log_ratio: Limite de |log(tempo real / estimativa)| de uma execução
+            min_prior: Estimativa mínima em segundos (testes sem tempo nas ações)
+        """
+        self.db = db
+        self.catalog_loader = catalog_loader
+        self.test_strength = test_strength
+        self.user_strength = user_strength
+        self.max_log_ratio = max_log_ratio
+        self.min_prior = min_prior
+        self._tests: Dict[str, List[float]] = {}                  # teste -> [execuções, Σ razão]
+        self._users: Dict[Tuple[int, str], List[float]] = {}      # (usuário, teste) -> [execuções, Σ razão]
+        self._overall = _Evaluation(ErrorStats(), ErrorStats())
+        self._by_user: Dict[int, _Evaluation] = {}
+        self._loaded = db is None
+        self._replayed_upto = 0  # maior ID de feedback lido na carga (record ignora os anteriores)
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        """Reproduz o histórico de feedbacks, em ordem de gravação, na primeira consulta."""
+        if self._loaded:
+            return
+        self._loaded = True
+        catalogs: Dict[Optional[int], Dict[str, TestCase]] = {}
+        for row in self.db.get_feedback_durations():
+            self._replayed_upto = max(self._replayed_upto, row['id'])
+            user_id = row['tester_id']
+            if user_id not in catalogs:
+                catalogs[user_id] = self.catalog_loader(user_id) if self.catalog_loader else {}
+            tc = catalogs[user_id].get(row['test_case_id'])
+            if tc is not None:
+                self._observe(user_id, tc.id, tc.get_total_estimated_time(), row['actual_execution_time'])
+
+    def _prior(self, estimated_time: float) -> float:
+        return max(float(estimated_time or 0.0), self.min_prior)
+
+    def _log_ratio(self, user_key: int, test_id: str) -> float:
+        """Razão log(real/estimativa) prevista para o usuário (0 = estimativa estática)."""
+        test_n, test_sum = self._tests.get(test_id, (0, 0.0))
+        user_n, user_sum = self._users.get((user_key, test_id), (0, 0.0))
+        # Nível do teste sem as execuções do próprio usuário
+        other_n = test_n - user_n
+        test_ratio = (test_sum - user_sum) / (other_n + self.test_strength)
+        return (user_sum + self.user_strength * test_ratio) / (user_n + self.user_strength)
+
+    def _observe(self, user_id: Optional[int], test_id: str, estimated_time: float, actual_time: float):
+        if actual_time is None or actual_time <= 0:
+            return
+        user_key = user_id or ANONYMOUS_USER
+        prior = self._prior(estimated_time)
+
+        # Avaliação prequencial: prever ANTES de aprender com a execução
+        predicted = prior * math.exp(self._log_ratio(user_key, test_id))
+        evaluation = self._by_user.get(user_key)
+        if evaluation is None:
+            evaluation = self._by_user[user_key] = _Evaluation(ErrorStats(), ErrorStats())
+        for target in (self._overall, evaluation):
+            target.model.add(predicted, actual_time)
+            target.static.add(prior, actual_time)
+
+        ratio = max(-self.max_log_ratio, min(self.max_log_ratio, math.log(actual_time / prior)))
+        test_counts = self._tests.setdefault(test_id, [0, 0.0])
+        test_counts[0] += 1
+        test_counts[1] += ratio
+        user_counts = self._users.setdefault((user_key, test_id), [0, 0.0])
+        user_counts[0] += 1
+        user_counts[1] += ratio
+
+    def record(
+        self,
+        user_id: Optional[int],
+        test_case: TestCase,
+        actual_time: float,
+        feedback_id: Optional[int] = None
+    ):
+        """
+        Incorpora um feedback recém-gravado na tabela feedbacks (O(1))
+
+        Args:
+            user_id: ID do testador (None = sem testador)
+            test_case: Teste executado (a estimativa estática vem das ações)
+            actual_time: Tempo real da execução em segundos
+            feedback_id: ID do feedback na tabela (evita contar duas vezes um
+                feedback já lido pela carga, feita entre a gravação e esta chamada)
+        """
+        with self._lock:
+            # Ainda não carregado: a carga lerá o feedback do banco
+            if not self._loaded:
+                return
+            if feedback_id is not None and feedback_id <= self._replayed_upto:
+                return
+            self._observe(user_id, test_case.id, test_case.get_total_estimated_time(), actual_time)
+
+    def predict(self, user_id: Optional[int], test_case: TestCase) -> float:
+        """Duração prevista do teste para o usuário, em segundos."""
+        with self._lock:
+            self._ensure_loaded()
+            prior = self._prior(test_case.get_total_estimated_time())
+            return prior * math.exp(self._log_ratio(user_id or ANONYMOUS_USER, test_case.id))
+
+    def predict_many(self, user_id: Optional[int], test_cases: Iterable[TestCase]) -> Dict[str, float]:
+        """
+        Durações previstas de vários testes
+
+        Args:
+            user_id: ID do usuário
+            test_cases: Testes
+
+        Returns:
+            Dicionário test_id -> duração prevista (segundos)
+        """
+        with self._lock:
+            self._ensure_loaded()
+            user_key = user_id or ANONYMOUS_USER
+            return {
+                tc.id: self._prior(tc.get_total_estimated_time()) * math.exp(self._log_ratio(user_key, tc.id))
+                for tc in test_cases
+            }
+
+    def metrics(self, user_id: Optional[int] = None) -> Dict:
+        """
+        Erros prequenciais do modelo e da estimativa estática
+
+        Args:
+            user_id: Se informado, inclui também os erros nas execuções do usuário
+
+        Returns:
+            Dicionário com MAE/RMSE/MAPE do modelo e da estimativa estática
+        """
+        with self._lock:
+            self._ensure_loaded()
+            result = {
+                'tests_learned': len(self._tests),
+                'overall': self._overall.to_dict()
+            }
+            if user_id is not None:
+                evaluation = self._by_user.get(user_id)
+                result['user'] = evaluation.to_dict() if evaluation else _Evaluation(ErrorStats(), ErrorStats()).to_dict()
+            return result
+
+    def clear(self):
+        """Descarta o aprendizado (recarregado do banco na próxima consulta)."""
+        with self._lock:
+            self._tests.clear()
+            self._users.clear()
+            self._overall = _Evaluation(ErrorStats(), ErrorStats())
+            self._by_user.clear()
+            self._loaded = self.db is None
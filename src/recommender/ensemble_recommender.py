@@ -2,16 +2,70 @@
 Sistema de Ensemble de Múltiplos Modelos
 Combina diferentes algoritmos para melhorar recomendações
 """
+import os
+import threading
+import warnings
 import numpy as np
-from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, VotingRegressor
+from sklearn.model_selection import KFold
 from sklearn.neural_network import MLPRegressor
 from sklearn.preprocessing import StandardScaler
+from sklearn.utils import Bunch
 import pickle
 
 from src.models.test_case import TestCase, RecommendationResult, ExecutionFeedback
 from src.features.feature_extractor import FeatureExtractor
 from src.recommender.ml_recommender import MLTestRecommender
+from src.utils.order_metrics import OrderMetrics
+
+
+# Nomes curtos (VotingRegressor) -> chaves de model_weights
+MEMBER_KEYS = {
+    'rf': 'random_forest',
+    'gb': 'gradient_boosting',
+    'nn': 'neural_network'
+}
+
+
+def _fit_member(name: str, estimator, X: np.ndarray, y: np.ndarray):
+    """
+    Treina um membro do ensemble (executado em processo separado)
+    
+    Para a Random Forest também devolve as predições out-of-bag, que servem
+    para estimar o erro sem treinar modelos extras.
+    
+    Returns:
+        Tupla (nome, estimador treinado, predições OOB ou None, máscara OOB ou None)
+    """
+    with warnings.catch_warnings():
+        # Poucas amostras: algumas linhas podem não ter predição OOB
+        warnings.simplefilter('ignore', UserWarning)
+        estimator.fit(X, y)
+    
+    if name == 'rf' and getattr(estimator, 'oob_score', False):
+        in_bag = np.zeros((len(estimator.estimators_), len(y)), dtype=bool)
+        for k, sample_idx in enumerate(estimator.estimators_samples_):
+            in_bag[k, sample_idx] = True
+        return name, estimator, estimator.oob_prediction_, ~in_bag.all(axis=0)
+    
+    return name, estimator, None, None
+
+
+def _fit_fold(name: str, estimator, X: np.ndarray, y: np.ndarray,
+              train_idx: np.ndarray, val_idx: np.ndarray):
+    """
+    Treina um clone do membro em uma dobra e prediz a parte de validação
+    (executado em processo separado)
+    
+    Returns:
+        Tupla (nome, índices de validação, predições)
+    """
+    fold_model = clone(estimator)
+    fold_model.fit(X[train_idx], y[train_idx])
+    return name, val_idx, fold_model.predict(X[val_idx])
 
 
 class EnsembleRecommender:
@@ -19,23 +73,34 @@ class EnsembleRecommender:
     Recomendador que combina múltiplos modelos usando ensemble
     """
     
-    def __init__(self, use_deep_learning: bool = False):
+    def __init__(self, use_deep_learning: bool = False, n_jobs: int = -1, n_folds: int = 3):
         """
         Inicializa o ensemble de modelos
         
         Args:
             use_deep_learning: Se True, inclui modelo de Deep Learning
+            n_jobs: Processos do pool de treino (-1 = todos os núcleos, 1 = sequencial;
+                o pool é reaproveitado entre treinos, ver shutdown)
+            n_folds: Dobras da validação cruzada usada nos pesos de GB/MLP
         """
         self.feature_extractor = FeatureExtractor()
         self.scaler = StandardScaler()
         self.use_deep_learning = use_deep_learning
+        self.n_jobs = n_jobs
+        self.n_folds = n_folds
+        
+        # Pool de processos do treino, criado no primeiro treino paralelo e reaproveitado
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
         
         # Modelos individuais
+        # oob_score: predições out-of-bag usadas no cálculo dos pesos
         self.random_forest = RandomForestRegressor(
             n_estimators=100,
             max_depth=10,
             random_state=42,
-            n_jobs=-1
+            n_jobs=-1,
+            oob_score=True
         )
         
         self.gradient_boosting = GradientBoostingRegressor(
@@ -92,25 +157,13 @@ class EnsembleRecommender:
             return 0.0
         
         score = 100.0
+        metrics = OrderMetrics.from_order(test_order)
         
         # Penalizar quebras de dependências
-        for i, test in enumerate(test_order):
-            for dep_id in test.dependencies:
-                executed_ids = {t.id for t in test_order[:i]}
-                if dep_id not in executed_ids:
-                    score -= 20
+        score -= metrics.dependency_violations * 20
         
         # Bonificar transições compatíveis
-        for i in range(len(test_order) - 1):
-            current = test_order[i]
-            next_test = test_order[i + 1]
-            
-            post_current = current.get_postconditions()
-            pre_next = next_test.get_preconditions()
-            
-            if pre_next:
-                compatibility = len(post_current.intersection(pre_next)) / len(pre_next)
-                score += compatibility * 10
+        score += metrics.state_compatibility * 10
         
         # Incorporar feedback
         if feedback:
@@ -133,38 +186,15 @@ class EnsembleRecommender:
         score: float
     ) -> tuple:
         """Gera amostra de treinamento"""
-        features = []
-        
-        total_time = sum(tc.get_total_estimated_time() for tc in test_order)
-        avg_priority = np.mean([tc.priority for tc in test_order])
-        num_destructive = sum(1 for tc in test_order if tc.has_destructive_actions())
-        
-        features.extend([
+        metrics = OrderMetrics.from_order(test_order)
+        features = [
             len(test_order),
-            total_time,
-            avg_priority,
-            num_destructive,
-        ])
-        
-        compatible_transitions = 0
-        same_module_transitions = 0
-        
-        for i in range(len(test_order) - 1):
-            current = test_order[i]
-            next_test = test_order[i + 1]
-            
-            post = current.get_postconditions()
-            pre = next_test.get_preconditions()
-            if pre and post.intersection(pre):
-                compatible_transitions += 1
-            
-            if current.module == next_test.module:
-                same_module_transitions += 1
-        
-        features.extend([
-            compatible_transitions,
-            same_module_transitions,
-        ])
+            metrics.total_time,
+            metrics.priority_sum / len(test_order) if test_order else np.nan,
+            metrics.destructive_count,
+            metrics.compatible_transitions,
+            metrics.same_module_transitions,
+        ]
         
         return np.array(features, dtype=np.float32), score
     
@@ -183,7 +213,14 @@ class EnsembleRecommender:
             self.train()
     
     def train(self):
-        """Treina todos os modelos do ensemble"""
+        """
+        Treina todos os modelos do ensemble
+        
+        Cada membro é treinado uma única vez, em paralelo (pool de processos).
+        Os pesos vêm das predições out-of-bag (Random Forest) e de validação
+        cruzada K-fold (GB/MLP), calculadas no mesmo pool; o VotingRegressor
+        é montado a partir dos membros já treinados, sem re-treiná-los.
+        """
         if len(self.training_data['y']) < 5:
             return
         
@@ -192,57 +229,167 @@ class EnsembleRecommender:
         
         X_scaled = self.scaler.fit_transform(X)
         
-        # Treinar cada modelo individualmente primeiro
-        self.random_forest.fit(X_scaled, y)
-        self.gradient_boosting.fit(X_scaled, y)
+        members = [(name, est) for name, est in self.ensemble.estimators]
+        compute_weights = len(y) >= 10
         
-        if self.neural_network:
-            self.neural_network.fit(X_scaled, y)
+        fitted, oof_predictions = self._fit_members(members, X_scaled, y, compute_weights)
         
-        # Treinar ensemble
-        self.ensemble.fit(X_scaled, y)
-        self.is_trained = True
+        self.random_forest = fitted['rf']
+        self.gradient_boosting = fitted['gb']
+        if self.neural_network:
+            self.neural_network = fitted['nn']
         
         # Calcular pesos dinâmicos baseados em performance
-        self._update_model_weights(X_scaled, y)
-    
-    def _update_model_weights(self, X_scaled: np.ndarray, y: np.ndarray):
-        """Atualiza pesos dos modelos baseado em performance"""
-        if len(y) < 10:
-            return
+        if compute_weights:
+            self._update_model_weights(oof_predictions, y)
         
-        # Usar validação cruzada simples
-        split = len(y) // 2
-        X_train, X_val = X_scaled[:split], X_scaled[split:]
-        y_train, y_val = y[:split], y[split:]
+        self._build_voting_ensemble([name for name, _ in members], fitted, compute_weights)
+        self.is_trained = True
+    
+    def _max_workers(self) -> int:
+        """Processos do pool de treino (n_jobs; -1 = todos os núcleos)"""
+        return (os.cpu_count() or 1) if self.n_jobs == -1 else max(1, self.n_jobs)
+    
+    def _pool(self) -> ProcessPoolExecutor:
+        """Pool de processos, criado no primeiro treino paralelo e reaproveitado."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers())
+            return self._executor
+    
+    def shutdown(self):
+        """Encerra o pool de processos (recriado sob demanda)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _fit_tasks(
+        self,
+        members: List[Tuple[str, object]],
+        X_scaled: np.ndarray,
+        y: np.ndarray,
+        compute_weights: bool,
+        parallel: bool = False
+    ) -> Tuple[list, list]:
+        """
+        Monta as tarefas de treino (membros) e de validação (dobras)
         
-        # Treinar modelos temporários
-        rf_temp = RandomForestRegressor(n_estimators=50, random_state=42)
-        gb_temp = GradientBoostingRegressor(n_estimators=50, random_state=42)
+        Em paralelo, cada tarefa já ocupa um processo: membros com n_jobs
+        (Random Forest) usam n_jobs=1 para não multiplicar os processos
+        pelos núcleos.
+        """
+        if parallel:
+            members = [
+                (name, clone(est).set_params(n_jobs=1) if 'n_jobs' in est.get_params() else est)
+                for name, est in members
+            ]
+        member_tasks = [(name, clone(est), X_scaled, y) for name, est in members]
+        
+        fold_tasks = []
+        if compute_weights:
+            n_splits = min(self.n_folds, len(y))
+            kfold = KFold(n_splits=n_splits, shuffle=True, random_state=42)
+            for name, est in members:
+                if name == 'rf':
+                    continue  # Random Forest usa out-of-bag
+                for train_idx, val_idx in kfold.split(X_scaled):
+                    fold_tasks.append((name, est, X_scaled, y, train_idx, val_idx))
+        
+        return member_tasks, fold_tasks
+    
+    def _fit_members(
+        self,
+        members: List[Tuple[str, object]],
+        X_scaled: np.ndarray,
+        y: np.ndarray,
+        compute_weights: bool
+    ) -> Tuple[Dict[str, object], Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Treina os membros e calcula as predições fora da amostra
         
-        rf_temp.fit(X_train, y_train)
-        gb_temp.fit(X_train, y_train)
+        Returns:
+            Tupla (membros treinados por nome,
+                   nome -> (predições fora da amostra, máscara de linhas válidas))
+        """
+        parallel = self._max_workers() > 1
+        member_tasks, fold_tasks = self._fit_tasks(members, X_scaled, y, compute_weights, parallel)
+        
+        member_results, fold_results = None, None
+        if parallel:
+            try:
+                pool = self._pool()
+                member_futures = [pool.submit(_fit_member, *task) for task in member_tasks]
+                fold_futures = [pool.submit(_fit_fold, *task) for task in fold_tasks]
+                member_results = [f.result() for f in member_futures]
+                fold_results = [f.result() for f in fold_futures]
+            except Exception as e:
+                # Sem multiprocessing ou pool quebrado: descarta o pool e treina sequencialmente
+                print(f"⚠ Treino paralelo indisponível ({e}); treinando sequencialmente")
+                self.shutdown()
+                member_results, fold_results = None, None
+                member_tasks, fold_tasks = self._fit_tasks(members, X_scaled, y, compute_weights)
+        
+        if member_results is None:
+            member_results = [_fit_member(*task) for task in member_tasks]
+            fold_results = [_fit_fold(*task) for task in fold_tasks]
+        
+        fitted = {}
+        oof_predictions = {}
+        for name, estimator, oob_pred, oob_mask in member_results:
+            fitted[name] = estimator
+            if compute_weights and oob_pred is not None:
+                oof_predictions[name] = (oob_pred, oob_mask)
+        
+        for name, val_idx, predictions in fold_results:
+            if name not in oof_predictions:
+                oof_predictions[name] = (np.zeros(len(y)), np.zeros(len(y), dtype=bool))
+            oof_pred, mask = oof_predictions[name]
+            oof_pred[val_idx] = predictions
+            mask[val_idx] = True
+        
+        return fitted, oof_predictions
+    
+    def _build_voting_ensemble(
+        self,
+        names: List[str],
+        fitted: Dict[str, object],
+        use_model_weights: bool
+    ):
+        """Monta o VotingRegressor com os membros já treinados (sem novo fit)"""
+        estimators = [(name, fitted[name]) for name in names]
+        if use_model_weights:
+            weights = [self.model_weights[MEMBER_KEYS[name]] for name in names]
+        else:
+            weights = self.ensemble.weights
         
-        # Avaliar performance
-        rf_score = -np.mean((rf_temp.predict(X_val) - y_val) ** 2)
-        gb_score = -np.mean((gb_temp.predict(X_val) - y_val) ** 2)
+        self.ensemble = VotingRegressor(estimators=estimators, weights=weights)
+        self.ensemble.estimators_ = [est for _, est in estimators]
+        self.ensemble.named_estimators_ = Bunch(**dict(estimators))
+    
+    def _update_model_weights(
+        self,
+        oof_predictions: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        y: np.ndarray
+    ):
+        """
+        Atualiza pesos dos modelos baseado em performance
         
-        # Normalizar pesos
-        total = abs(rf_score) + abs(gb_score)
+        Peso proporcional ao inverso do erro quadrático médio fora da amostra
+        (out-of-bag para RF, K-fold para GB/MLP): modelo com menor erro
+        recebe maior peso.
+        """
+        inverse_errors = {}
+        for name, (predictions, mask) in oof_predictions.items():
+            if not mask.any():
+                continue
+            mse = float(np.mean((predictions[mask] - y[mask]) ** 2))
+            inverse_errors[MEMBER_KEYS[name]] = 1.0 / max(mse, 1e-9)
+        
+        total = sum(inverse_errors.values())
         if total > 0:
-            self.model_weights['random_forest'] = abs(rf_score) / total
-            self.model_weights['gradient_boosting'] = abs(gb_score) / total
-        
-        if self.neural_network:
-            nn_temp = MLPRegressor(hidden_layer_sizes=(50, 25), random_state=42, max_iter=200)
-            nn_temp.fit(X_train, y_train)
-            nn_score = -np.mean((nn_temp.predict(X_val) - y_val) ** 2)
-            
-            total = abs(rf_score) + abs(gb_score) + abs(nn_score)
-            if total > 0:
-                self.model_weights['random_forest'] = abs(rf_score) / total
-                self.model_weights['gradient_boosting'] = abs(gb_score) / total
-                self.model_weights['neural_network'] = abs(nn_score) / total
+            for key, inverse_error in inverse_errors.items():
+                self.model_weights[key] = inverse_error / total
     
     def recommend_order(
         self,
@@ -267,13 +414,12 @@ class EnsembleRecommender:
             ordered = self._ensemble_ordering(test_cases)
             confidence = 0.95  # Ensemble tem maior confiança
         
-        total_time = sum(tc.get_total_estimated_time() for tc in ordered)
-        estimated_resets = self._estimate_resets(ordered)
+        metrics = OrderMetrics.from_order(ordered)
         
         return RecommendationResult(
             recommended_order=[tc.id for tc in ordered],
-            estimated_total_time=total_time,
-            estimated_resets=estimated_resets,
+            estimated_total_time=metrics.total_time,
+            estimated_resets=metrics.resets,
             confidence_score=confidence,
             reasoning={
                 'method': 'ensemble',
@@ -344,22 +490,6 @@ class EnsembleRecommender:
         X_scaled = self.scaler.transform(X.reshape(1, -1))
         return self.ensemble.predict(X_scaled)[0]
     
-    def _estimate_resets(self, test_order: List[TestCase]) -> int:
-        """Estima número de reinicializações"""
-        resets = 0
-        current_state = set()
-        
-        for test in test_order:
-            required = test.get_preconditions()
-            
-            if required and not required.issubset(current_state):
-                resets += 1
-                current_state = set()
-            
-            current_state.update(test.get_postconditions())
-        
-        return resets
-    
     def get_model_performance(self) -> Dict:
         """Retorna performance de cada modelo no ensemble"""
         if not self.is_trained:
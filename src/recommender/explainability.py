@@ -2,13 +2,35 @@
 Sistema de Explicabilidade da IA
 Explica por que testes foram recomendados e quais fatores influenciaram
 """
+import threading
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Dict, Tuple, Optional
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.inspection import permutation_importance
 
 from src.models.test_case import TestCase, RecommendationResult
 from src.features.feature_extractor import FeatureExtractor
+from src.recommender.ml_recommender import ORDER_FEATURE_NAMES
+from src.recommender.tree_shap import TreeShap
+from src.utils.order_metrics import OrderBatchEvaluator, OrderMetrics
+
+
+# Rótulos das ordens contrafactuais geradas para comparação
+COUNTERFACTUAL_LABELS = {
+    'priority': 'Somente por prioridade',
+    'module_grouping': 'Somente agrupando por módulo',
+    'selection_order': 'Ordem em que os testes foram selecionados',
+    'runner_up': 'Alternativa próxima (troca de testes vizinhos)',
+    'custom': 'Ordem alternativa informada',
+}
+
+
+def _total_time(tests: List[TestCase], durations: Optional[Dict[str, float]] = None) -> float:
+    """Tempo total dos testes: duração prevista, se houver, senão a soma das estimativas das ações."""
+    if not durations:
+        return sum(tc.get_total_estimated_time() for tc in tests)
+    return sum(durations.get(tc.id, tc.get_total_estimated_time()) for tc in tests)
 
 
 class RecommendationExplainer:
@@ -16,30 +38,61 @@ class RecommendationExplainer:
     Explica as recomendações da IA de forma transparente
     """
     
-    def __init__(self, model: RandomForestRegressor, feature_extractor: FeatureExtractor):
+    def __init__(
+        self,
+        model: RandomForestRegressor,
+        feature_extractor: FeatureExtractor,
+        scaler: Any = None,
+        sample_builder: Optional[Callable] = None,
+        model_version: Optional[Callable[[], Hashable]] = None,
+        max_cached_contributions: int = 256
+    ):
         """
         Inicializa o explicador
         
         Args:
             model: Modelo ML treinado
             feature_extractor: Extrator de features usado
+            scaler: Normalizador aplicado às features antes do modelo
+            sample_builder: Função (ordem, score) -> (features, score) usada no treino
+            model_version: Função que retorna a versão atual do modelo (chave de cache)
+            max_cached_contributions: Tamanho do cache de contribuições por ordem
         """
         self.model = model
         self.feature_extractor = feature_extractor
-        self.feature_names = [
-            'num_tests',
-            'total_time',
-            'avg_priority',
-            'num_destructive',
-            'compatible_transitions',
-            'same_module_transitions'
-        ]
+        self.scaler = scaler
+        self.sample_builder = sample_builder
+        self.model_version = model_version
+        self.feature_names = list(ORDER_FEATURE_NAMES)
+        
+        # TreeSHAP é reconstruído apenas quando a versão do modelo muda
+        self._tree_shap: Optional[TreeShap] = None
+        self._tree_shap_version: Optional[Hashable] = None
+        self._contributions: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._max_cached_contributions = max_cached_contributions
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_recommender(cls, recommender) -> 'RecommendationExplainer':
+        """
+        Cria o explicador ligado a um MLTestRecommender (modelo, scaler,
+        construção das features e versão do modelo)
+        """
+        return cls(
+            recommender.model,
+            recommender.feature_extractor,
+            scaler=recommender.scaler,
+            sample_builder=recommender._generate_training_sample,
+            model_version=lambda: recommender.model_version
+        )
     
     def explain_recommendation(
         self,
         test_cases: List[TestCase],
         recommended_order: List[str],
-        alternative_orders: Optional[List[List[str]]] = None
+        alternative_orders: Optional[List[List[str]]] = None,
+        metrics: Optional[OrderMetrics] = None,
+        durations: Optional[Dict[str, float]] = None
     ) -> Dict:
         """
         Explica por que uma ordem específica foi recomendada
@@ -47,7 +100,11 @@ class RecommendationExplainer:
         Args:
             test_cases: Lista completa de casos de teste
             recommended_order: Ordem recomendada
-            alternative_orders: Ordens alternativas para comparação
+            alternative_orders: Ordens alternativas extras para comparação (além
+                das contrafactuais geradas automaticamente)
+            metrics: Métricas de transição já calculadas na ordenação
+                (recalculadas se ausentes ou de outra ordem)
+            durations: Duração prevista por teste (padrão: soma das estimativas das ações)
         
         Returns:
             Dicionário com explicações detalhadas
@@ -56,6 +113,7 @@ class RecommendationExplainer:
             'recommended_order': recommended_order,
             'factors': [],
             'feature_importance': self._get_feature_importance(),
+            'feature_contributions': None,
             'test_scores': {},
             'comparison_with_alternatives': None,
             'reasoning': []
@@ -64,31 +122,87 @@ class RecommendationExplainer:
         # Calcular scores para cada teste na ordem recomendada
         test_dict = {tc.id: tc for tc in test_cases}
         ordered_tests = [test_dict[tid] for tid in recommended_order if tid in test_dict]
+        if metrics is None or not metrics.matches(ordered_tests):
+            metrics = OrderMetrics.from_order(ordered_tests)
         
         # Analisar fatores que influenciaram
-        factors = self._analyze_factors(ordered_tests)
+        factors = self._analyze_factors(ordered_tests, metrics, durations)
         explanation['factors'] = factors
         
-        # Calcular scores individuais
-        for i, test_id in enumerate(recommended_order):
-            if test_id in test_dict:
-                test = test_dict[test_id]
-                score = self._calculate_test_score(test, i, ordered_tests)
-                explanation['test_scores'][test_id] = score
-        
-        # Comparar com alternativas se fornecidas
-        if alternative_orders:
-            explanation['comparison_with_alternatives'] = self._compare_orders(
-                ordered_tests,
-                alternative_orders,
-                test_dict
-            )
+        # Calcular scores individuais (posições relativas à ordem filtrada)
+        for i, test in enumerate(ordered_tests):
+            score = self._calculate_test_score(test, i, ordered_tests, metrics)
+            explanation['test_scores'][test.id] = score
+        
+        # Comparar com ordens contrafactuais (e alternativas fornecidas)
+        explanation['comparison_with_alternatives'] = self._compare_orders(
+            ordered_tests,
+            alternative_orders or [],
+            test_dict,
+            metrics,
+            selection=test_cases,
+            durations=durations
+        )
+        
+        # Contribuição de cada feature para o score previsto desta ordem
+        explanation['feature_contributions'] = self.get_feature_contributions(ordered_tests)
         
         # Gerar explicação textual
-        explanation['reasoning'] = self._generate_textual_explanation(factors, ordered_tests)
+        explanation['reasoning'] = self._generate_textual_explanation(
+            factors,
+            ordered_tests,
+            explanation['feature_contributions'],
+            explanation['comparison_with_alternatives'],
+            durations
+        )
         
         return explanation
     
+    def get_feature_contributions(self, ordered_tests: List[TestCase]) -> Optional[Dict]:
+        """
+        Atribui o score previsto da ordem às features do modelo (TreeSHAP)
+        
+        Resultados ficam em cache por (versão do modelo, ordem).
+        
+        Args:
+            ordered_tests: Testes na ordem recomendada
+        
+        Returns:
+            Dicionário com base_value, prediction e contributions
+            (ou None se o modelo não suportar/não estiver treinado)
+        """
+        if not ordered_tests or self.scaler is None or self.sample_builder is None:
+            return None
+        if not TreeShap.supports(self.model):
+            return None
+        
+        version = self.model_version() if self.model_version else None
+        key = (version, tuple(tc.id for tc in ordered_tests))
+        with self._lock:
+            cached = self._contributions.get(key)
+            if cached is not None:
+                self._contributions.move_to_end(key)
+                return cached
+            
+            if self._tree_shap is None or self._tree_shap_version != version or self._tree_shap.model is not self.model:
+                self._tree_shap = TreeShap(self.model)
+                self._tree_shap_version = version
+                self._contributions.clear()
+            tree_shap = self._tree_shap
+        
+        features, _ = self.sample_builder(ordered_tests, 0)
+        x = self.scaler.transform(features.reshape(1, -1))[0]
+        result = tree_shap.explain(x, self.feature_names)
+        for item in result['contributions']:
+            item['value'] = float(features[self.feature_names.index(item['feature'])])
+        
+        with self._lock:
+            self._contributions[key] = result
+            while len(self._contributions) > self._max_cached_contributions:
+                self._contributions.popitem(last=False)
+        
+        return result
+    
     def _get_feature_importance(self) -> Dict[str, float]:
         """
         Obtém importância de cada feature do modelo
@@ -107,12 +221,19 @@ class RecommendationExplainer:
             for name, imp in zip(self.feature_names, importances)
         }
     
-    def _analyze_factors(self, ordered_tests: List[TestCase]) -> List[Dict]:
+    def _analyze_factors(
+        self,
+        ordered_tests: List[TestCase],
+        metrics: Optional[OrderMetrics] = None,
+        durations: Optional[Dict[str, float]] = None
+    ) -> List[Dict]:
         """
         Analisa fatores que influenciaram a ordenação
         
         Args:
             ordered_tests: Testes na ordem recomendada
+            metrics: Métricas de transição da ordem
+            durations: Duração prevista por teste
         
         Returns:
             Lista de fatores identificados
@@ -122,8 +243,11 @@ class RecommendationExplainer:
         if not ordered_tests:
             return factors
         
+        if metrics is None:
+            metrics = OrderMetrics.from_order(ordered_tests)
+        
         # Fator 1: Agrupamento por módulo
-        module_groups = self._count_module_groups(ordered_tests)
+        module_groups = metrics.module_groups
         if module_groups > 0:
             factors.append({
                 'name': 'Agrupamento por Módulo',
@@ -134,7 +258,7 @@ class RecommendationExplainer:
             })
         
         # Fator 2: Compatibilidade de estados
-        compatible = self._count_compatible_transitions(ordered_tests)
+        compatible = metrics.compatible_transitions
         total_transitions = len(ordered_tests) - 1
         if total_transitions > 0:
             compatibility_rate = (compatible / total_transitions) * 100
@@ -175,7 +299,7 @@ class RecommendationExplainer:
                 })
         
         # Fator 5: Tempo total estimado
-        total_time = sum(tc.get_total_estimated_time() for tc in ordered_tests)
+        total_time = _total_time(ordered_tests, durations)
         factors.append({
             'name': 'Tempo Total Estimado',
             'description': f'{total_time:.0f} segundos estimados',
@@ -186,39 +310,12 @@ class RecommendationExplainer:
         
         return factors
     
-    def _count_module_groups(self, tests: List[TestCase]) -> int:
-        """Conta quantos grupos de módulos existem"""
-        if len(tests) <= 1:
-            return 0
-        
-        groups = 1
-        for i in range(1, len(tests)):
-            if tests[i].module != tests[i-1].module:
-                groups += 1
-        
-        return groups
-    
-    def _count_compatible_transitions(self, tests: List[TestCase]) -> int:
-        """Conta transições compatíveis entre testes"""
-        compatible = 0
-        
-        for i in range(len(tests) - 1):
-            current = tests[i]
-            next_test = tests[i + 1]
-            
-            post_current = current.get_postconditions()
-            pre_next = next_test.get_preconditions()
-            
-            if pre_next and post_current.intersection(pre_next):
-                compatible += 1
-        
-        return compatible
-    
     def _calculate_test_score(
         self,
         test: TestCase,
         position: int,
-        all_tests: List[TestCase]
+        all_tests: List[TestCase],
+        metrics: Optional[OrderMetrics] = None
     ) -> Dict:
         """
         Calcula score explicativo para um teste específico
@@ -227,6 +324,7 @@ class RecommendationExplainer:
             test: Caso de teste
             position: Posição na ordem
             all_tests: Todos os testes na ordem
+            metrics: Métricas de transição da ordem (evita recalcular pares)
         
         Returns:
             Dicionário com score e razões
@@ -239,18 +337,17 @@ class RecommendationExplainer:
             score += 20
             reasons.append('Alta prioridade no início')
         
-        # Bonificar agrupamento por módulo
-        if position > 0 and all_tests[position - 1].module == test.module:
-            score += 15
-            reasons.append('Agrupado com mesmo módulo')
-        
-        # Bonificar compatibilidade de estado
         if position > 0:
-            prev_test = all_tests[position - 1]
-            post_prev = prev_test.get_postconditions()
-            pre_current = test.get_preconditions()
+            if metrics is None:
+                metrics = OrderMetrics.from_order(all_tests)
             
-            if pre_current and post_prev.intersection(pre_current):
+            # Bonificar agrupamento por módulo
+            if metrics.same_module[position - 1]:
+                score += 15
+                reasons.append('Agrupado com mesmo módulo')
+            
+            # Bonificar compatibilidade de estado
+            if metrics.compatible[position - 1]:
                 score += 25
                 reasons.append('Estado compatível com teste anterior')
         
@@ -269,65 +366,177 @@ class RecommendationExplainer:
         self,
         recommended: List[TestCase],
         alternatives: List[List[str]],
-        test_dict: Dict[str, TestCase]
-    ) -> Dict:
+        test_dict: Dict[str, TestCase],
+        metrics: Optional[OrderMetrics] = None,
+        selection: Optional[List[TestCase]] = None,
+        max_runners_up: int = 2,
+        durations: Optional[Dict[str, float]] = None
+    ) -> Optional[Dict]:
         """
-        Compara ordem recomendada com alternativas
+        Compara a ordem recomendada com ordens contrafactuais
+        
+        Gera ordens por prioridade, por agrupamento de módulo, na ordem da
+        seleção e as melhores trocas de vizinhos (runners-up), e avalia todas
+        em uma única passada vetorizada (bitsets + matrizes de transição) e
+        uma única chamada ao modelo.
         
         Args:
             recommended: Testes na ordem recomendada
-            alternatives: Lista de ordens alternativas
+            alternatives: Ordens alternativas extras
             test_dict: Dicionário de testes
+            metrics: Métricas de transição da ordem recomendada
+            selection: Testes na ordem em que foram selecionados
+            max_runners_up: Quantidade de alternativas próximas reportadas
+            durations: Duração prevista por teste (tempos das ordens comparadas)
         
         Returns:
-            Comparação detalhada
+            Comparação com deltas de tempo, resets e score (None sem testes)
         """
-        rec_time = sum(tc.get_total_estimated_time() for tc in recommended)
-        rec_resets = self._estimate_resets(recommended)
+        if not recommended:
+            return None
+        
+        evaluator = OrderBatchEvaluator(recommended, durations=durations)
+        recommended_ids = [tc.id for tc in recommended]
+        candidates = self._counterfactual_orders(recommended, selection or recommended)
+        for i, alt_order in enumerate(alternatives, 1):
+            alt_ids = [tid for tid in alt_order if tid in test_dict]
+            candidates.append((f'custom_{i}', 'custom', alt_ids))
+        
+        # Alternativas próximas: melhores trocas de vizinhos pelas métricas
+        # vetorizadas; apenas essas vão para o modelo
+        base = evaluator.encode_orders([recommended_ids])[0]
+        if len(base) > 1:
+            swaps = np.tile(base, (len(base) - 1, 1))
+            positions = np.arange(len(base) - 1)
+            swaps[positions, positions], swaps[positions, positions + 1] = base[positions + 1], base[positions]
+            swap_metrics = evaluator.evaluate(swaps)
+            best = np.lexsort((
+                -swap_metrics['same_module_transitions'],
+                -swap_metrics['compatible_transitions'],
+                swap_metrics['resets']
+            ))[:max_runners_up * 3]
+            for rank, row in enumerate(best, 1):
+                candidates.append((f'runner_up_{rank}', 'runner_up', [evaluator.tests[i].id for i in swaps[row]]))
+        
+        # Descartar ordens repetidas (ou iguais à recomendada)
+        seen = {tuple(recommended_ids)}
+        unique_candidates = []
+        for name, kind, order_ids in candidates:
+            if tuple(order_ids) not in seen:
+                seen.add(tuple(order_ids))
+                unique_candidates.append((name, kind, order_ids))
+        
+        # Permutações da mesma seleção: avaliação em lote
+        same_tests = set(recommended_ids)
+        batch = [c for c in unique_candidates if len(c[2]) == len(recommended_ids) and set(c[2]) == same_tests]
+        orders = [recommended_ids] + [order_ids for _, _, order_ids in batch]
+        batch_metrics = evaluator.evaluate(evaluator.encode_orders(orders))
+        scores = self._predict_scores([[test_dict[tid] for tid in order_ids] for order_ids in orders])
+        
+        # (nome, tipo, ordem, métricas, linha nas métricas, score)
+        rows = [
+            (name, kind, order_ids, batch_metrics, i, scores[i] if scores is not None else None)
+            for i, (name, kind, order_ids) in enumerate(batch, 1)
+        ]
+        # Alternativas com outro conjunto de testes: avaliadas separadamente
+        batch_names = {name for name, _, _ in batch}
+        for name, kind, order_ids in unique_candidates:
+            if name not in batch_names and order_ids:
+                other = OrderBatchEvaluator([test_dict[tid] for tid in order_ids], durations=durations)
+                rows.append((name, kind, order_ids, other.evaluate(other.encode_orders([order_ids])), 0, None))
+        
+        def summary(values: Dict[str, np.ndarray], i: int) -> Dict:
+            return {
+                'time': float(values['total_time'][i]),
+                'resets': int(values['resets'][i]),
+                'compatible_transitions': int(values['compatible_transitions'][i]),
+                'same_module_transitions': int(values['same_module_transitions'][i]),
+                'critical_time': float(values['critical_time'][i]),
+            }
+        
+        rec = summary(batch_metrics, 0)
+        rec['score'] = float(scores[0]) if scores is not None else None
+        if metrics is not None:
+            rec['resets'] = metrics.resets
         
         comparisons = []
-        for alt_order in alternatives:
-            alt_tests = [test_dict[tid] for tid in alt_order if tid in test_dict]
-            alt_time = sum(tc.get_total_estimated_time() for tc in alt_tests)
-            alt_resets = self._estimate_resets(alt_tests)
-            
-            comparisons.append({
-                'order': alt_order,
-                'time': alt_time,
-                'resets': alt_resets,
-                'time_diff': alt_time - rec_time,
-                'resets_diff': alt_resets - rec_resets,
-                'better': alt_time < rec_time and alt_resets <= rec_resets
+        runners_up = []
+        for name, kind, order_ids, values, i, score in rows:
+            alt = summary(values, i)
+            alt['score'] = float(score) if score is not None else None
+            alt.update({
+                'name': name,
+                'label': COUNTERFACTUAL_LABELS[kind],
+                'order': order_ids,
+                'time_diff': alt['time'] - rec['time'],
+                'resets_diff': alt['resets'] - rec['resets'],
+                'critical_time_diff': alt['critical_time'] - rec['critical_time'],
+                'score_diff': (alt['score'] - rec['score']) if alt['score'] is not None and rec['score'] is not None else None,
             })
+            alt['better'] = (
+                alt['resets_diff'] <= 0 and alt['time_diff'] <= 0
+                and (alt['resets_diff'] < 0 or alt['time_diff'] < 0 or (alt['score_diff'] or 0) > 0)
+            )
+            (runners_up if kind == 'runner_up' else comparisons).append(alt)
+        
+        # Reportar só as melhores alternativas próximas (pelo score do modelo, se houver)
+        runners_up.sort(key=lambda alt: (-(alt['score'] or 0), alt['resets'], -alt['compatible_transitions']))
+        for rank, alt in enumerate(runners_up[:max_runners_up], 1):
+            alt['name'] = f'runner_up_{rank}'
+            comparisons.append(alt)
         
         return {
-            'recommended': {
-                'time': rec_time,
-                'resets': rec_resets
-            },
+            'recommended': rec,
             'alternatives': comparisons
         }
     
-    def _estimate_resets(self, tests: List[TestCase]) -> int:
-        """Estima número de resets necessários"""
-        resets = 0
-        current_state = set()
-        
-        for test in tests:
-            required = test.get_preconditions()
-            
-            if required and not required.issubset(current_state):
-                resets += 1
-                current_state = set()
-            
-            current_state.update(test.get_postconditions())
+    def _counterfactual_orders(
+        self,
+        recommended: List[TestCase],
+        selection: List[TestCase]
+    ) -> List[Tuple[str, str, List[str]]]:
+        """
+        Gera ordens contrafactuais simples para os mesmos testes
         
-        return resets
+        Returns:
+            Lista de (nome, tipo, ordem de IDs)
+        """
+        recommended_ids = {tc.id for tc in recommended}
+        selection_order = [tc for tc in selection if tc.id in recommended_ids]
+        if len(selection_order) != len(recommended):
+            selection_order = list(recommended)
+        
+        by_priority = sorted(selection_order, key=lambda tc: -tc.priority)
+        
+        module_rank: Dict[str, int] = {}
+        for tc in selection_order:
+            module_rank.setdefault(tc.module, len(module_rank))
+        by_module = sorted(selection_order, key=lambda tc: module_rank[tc.module])
+        
+        return [
+            ('priority', 'priority', [tc.id for tc in by_priority]),
+            ('module_grouping', 'module_grouping', [tc.id for tc in by_module]),
+            ('selection_order', 'selection_order', [tc.id for tc in selection_order]),
+        ]
+    
+    def _predict_scores(self, orders: List[List[TestCase]]) -> Optional[np.ndarray]:
+        """Scores previstos pelo modelo para várias ordens (uma única predição)"""
+        if self.scaler is None or self.sample_builder is None or not orders:
+            return None
+        try:
+            X = np.array([self.sample_builder(order, 0)[0] for order in orders])
+            return self.model.predict(self.scaler.transform(X))
+        except (ValueError, AttributeError):
+            # Modelo/normalizador ainda não treinados
+            return None
     
     def _generate_textual_explanation(
         self,
         factors: List[Dict],
-        ordered_tests: List[TestCase]
+        ordered_tests: List[TestCase],
+        contributions: Optional[Dict] = None,
+        comparison: Optional[Dict] = None,
+        durations: Optional[Dict[str, float]] = None
     ) -> List[str]:
         """
         Gera explicação textual da recomendação
@@ -335,6 +544,9 @@ class RecommendationExplainer:
         Args:
             factors: Fatores identificados
             ordered_tests: Testes ordenados
+            contributions: Contribuições das features (TreeSHAP), se disponíveis
+            comparison: Comparação com as ordens contrafactuais
+            durations: Duração prevista por teste
         
         Returns:
             Lista de explicações em texto
@@ -360,6 +572,28 @@ class RecommendationExplainer:
                     f"({factor['reason']})"
                 )
         
+        # Explicar o que mais pesou no score previsto pelo modelo
+        if contributions and contributions['contributions']:
+            top = contributions['contributions'][:3]
+            explanation_parts = [
+                f"{item['feature']} ({item['contribution']:+.2f})" for item in top
+            ]
+            explanations.append(
+                f"\nScore previsto {contributions['prediction']:.2f} "
+                f"(média do modelo {contributions['base_value']:.2f}); "
+                f"maiores influências: {', '.join(explanation_parts)}."
+            )
+        
+        # Explicar o ganho em relação às ordens contrafactuais
+        if comparison and comparison['alternatives']:
+            gains = [
+                f"{alt['label'].lower()} exigiria {alt['resets_diff']} reset(s) a mais"
+                for alt in comparison['alternatives']
+                if alt['resets_diff'] > 0
+            ]
+            if gains:
+                explanations.append(f"\nAlternativas avaliadas: {'; '.join(gains[:2])}.")
+        
         # Explicar estrutura da ordem
         modules = [tc.module for tc in ordered_tests]
         unique_modules = len(set(modules))
@@ -369,7 +603,7 @@ class RecommendationExplainer:
         )
         
         # Explicar tempo estimado
-        total_time = sum(tc.get_total_estimated_time() for tc in ordered_tests)
+        total_time = _total_time(ordered_tests, durations)
         explanations.append(
             f"Tempo total estimado: {total_time:.0f} segundos "
             f"({total_time/60:.1f} minutos)."
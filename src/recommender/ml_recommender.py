@@ -3,6 +3,7 @@ Sistema de recomendação baseado em Machine Learning
 """
 import numpy as np
 from typing import List, Dict, Tuple, Optional
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 import pickle
@@ -10,6 +11,23 @@ from datetime import datetime
 
 from src.models.test_case import TestCase, RecommendationResult, ExecutionFeedback
 from src.features.feature_extractor import FeatureExtractor
+from src.utils.order_metrics import OrderMetrics
+
+
+# Nomes das features geradas por _generate_training_sample, na mesma ordem
+ORDER_FEATURE_NAMES = [
+    'num_tests',
+    'total_time',
+    'avg_priority',
+    'num_destructive',
+    'compatible_transitions',
+    'same_module_transitions',
+    'avg_tree_level',
+    'num_shared_path_groups',
+    'num_context_preserving',
+    'num_teardown',
+    'hierarchy_violations',
+]
 
 
 class MLTestRecommender:
@@ -47,6 +65,9 @@ class MLTestRecommender:
         self.is_trained = False
         self.feedback_history: List[ExecutionFeedback] = []
         self.training_data = {'X': [], 'y': []}
+        # Versão do modelo: incrementada a cada (re)treino ou carregamento.
+        # Usada como parte da chave de caches de recomendação/explicação.
+        self.model_version = 0
     
     def _calculate_order_score(
         self, 
@@ -73,76 +94,33 @@ class MLTestRecommender:
             return 0.0
         
         score = 100.0  # Score inicial
+        metrics = OrderMetrics.from_order(test_order)
         
         # Penalizar quebras de dependências
-        for i, test in enumerate(test_order):
-            for dep_id in test.dependencies:
-                # Verificar se dependência foi executada antes
-                executed_ids = {t.id for t in test_order[:i]}
-                if dep_id not in executed_ids:
-                    score -= 20  # Grande penalidade
+        score -= metrics.dependency_violations * 20  # Grande penalidade
         
         # Bonificar transições de estado compatíveis
-        for i in range(len(test_order) - 1):
-            current = test_order[i]
-            next_test = test_order[i + 1]
-            
-            post_current = current.get_postconditions()
-            pre_next = next_test.get_preconditions()
-            
-            if pre_next:
-                compatibility = len(post_current.intersection(pre_next)) / len(pre_next)
-                score += compatibility * 10
+        score += metrics.state_compatibility * 10
         
         # Penalizar ações destrutivas seguidas de não-destrutivas do mesmo módulo
-        for i in range(len(test_order) - 1):
-            current = test_order[i]
-            next_test = test_order[i + 1]
-            
-            if (current.module == next_test.module and 
-                current.has_destructive_actions() and 
-                not next_test.has_destructive_actions()):
-                score -= 5
+        score -= metrics.destructive_followups * 5
         
         # Bonificar agrupamento por módulo (reduz context switching)
-        for i in range(len(test_order) - 1):
-            if test_order[i].module == test_order[i + 1].module:
-                score += 3
+        score += metrics.same_module_transitions * 3
         
         # Bônus por hierarquia (NOVO)
         try:
-            from src.utils.hierarchy_utils import (
-                get_tree_level, group_tests_by_shared_path, 
-                calculate_hierarchy_score
-            )
-            test_by_id = {tc.id: tc for tc in test_order}
+            from src.utils.hierarchy_utils import group_tests_by_shared_path
             
             # Bônus por agrupamento de testes com caminho compartilhado
             groups = group_tests_by_shared_path(test_order)
             score += len(groups) * 15
             
             # Bônus por agrupar testes context_preserving
-            context_preserving_groups = 0
-            i = 0
-            while i < len(test_order):
-                if test_order[i].context_preserving:
-                    group_start = i
-                    while i < len(test_order) and test_order[i].context_preserving:
-                        i += 1
-                    if i - group_start > 1:
-                        context_preserving_groups += 1
-                else:
-                    i += 1
-            score += context_preserving_groups * 10
+            score += metrics.context_preserving_groups * 10
             
             # Penalizar violações de hierarquia
-            hierarchy_violations = 0
-            executed = set()
-            for tc in test_order:
-                if tc.parent_test_id and tc.parent_test_id not in executed:
-                    hierarchy_violations += 1
-                executed.add(tc.id)
-            score -= hierarchy_violations * 25
+            score -= metrics.hierarchy_violations * 25
         except ImportError:
             pass  # Se hierarchy_utils não estiver disponível, ignorar
         
@@ -180,42 +158,22 @@ class MLTestRecommender:
         Returns:
             Tupla (features, score)
         """
-        # Extrair features da ordenação
+        # Extrair features da ordenação (métricas em uma única passada)
         features = []
+        metrics = OrderMetrics.from_order(test_order)
         
         # Features agregadas da ordenação
-        total_time = sum(tc.get_total_estimated_time() for tc in test_order)
-        avg_priority = np.mean([tc.priority for tc in test_order])
-        num_destructive = sum(1 for tc in test_order if tc.has_destructive_actions())
-        
         features.extend([
             len(test_order),
-            total_time,
-            avg_priority,
-            num_destructive,
+            metrics.total_time,
+            metrics.priority_sum / len(test_order) if test_order else np.nan,
+            metrics.destructive_count,
         ])
         
         # Features de transições
-        compatible_transitions = 0
-        same_module_transitions = 0
-        
-        for i in range(len(test_order) - 1):
-            current = test_order[i]
-            next_test = test_order[i + 1]
-            
-            # Compatibilidade de estado
-            post = current.get_postconditions()
-            pre = next_test.get_preconditions()
-            if pre and post.intersection(pre):
-                compatible_transitions += 1
-            
-            # Mesmo módulo
-            if current.module == next_test.module:
-                same_module_transitions += 1
-        
         features.extend([
-            compatible_transitions,
-            same_module_transitions,
+            metrics.compatible_transitions,
+            metrics.same_module_transitions,
         ])
         
         # Features hierárquicas (NOVO)
@@ -231,26 +189,12 @@ class MLTestRecommender:
             groups = group_tests_by_shared_path(test_order)
             num_shared_path_groups = len(groups)
             
-            # Número de testes que preservam contexto
-            num_context_preserving = sum(1 for tc in test_order if tc.context_preserving)
-            
-            # Número de testes com teardown
-            num_teardown = sum(1 for tc in test_order if tc.teardown_restores)
-            
-            # Violações de hierarquia (filho antes de pai)
-            hierarchy_violations = 0
-            executed = set()
-            for tc in test_order:
-                if tc.parent_test_id and tc.parent_test_id not in executed:
-                    hierarchy_violations += 1
-                executed.add(tc.id)
-            
             features.extend([
                 avg_tree_level,
                 num_shared_path_groups,
-                num_context_preserving,
-                num_teardown,
-                hierarchy_violations,
+                metrics.context_preserving_count,   # Testes que preservam contexto
+                metrics.teardown_count,             # Testes com teardown
+                metrics.hierarchy_violations,       # Filho antes de pai
             ])
         except ImportError:
             # Se hierarchy_utils não estiver disponível, usar zeros
@@ -290,12 +234,19 @@ class MLTestRecommender:
         X = np.array(self.training_data['X'])
         y = np.array(self.training_data['y'])
         
+        # Treinar cópias novas e trocar no fim: quem guardou referências ao
+        # modelo/scaler (ex.: snapshot do write-behind) não vê um fit pela metade
+        scaler = clone(self.scaler)
+        model = clone(self.model)
+        
         # Normalizar features
-        X_scaled = self.scaler.fit_transform(X)
+        X_scaled = scaler.fit_transform(X)
         
         # Treinar modelo
-        self.model.fit(X_scaled, y)
+        model.fit(X_scaled, y)
+        self.scaler, self.model = scaler, model
         self.is_trained = True
+        self.model_version += 1
         
         print(f"Modelo treinado com {len(y)} amostras")
     
@@ -331,13 +282,12 @@ class MLTestRecommender:
             confidence = 0.9
         
         # Calcular métricas da ordenação
-        total_time = sum(tc.get_total_estimated_time() for tc in ordered)
-        estimated_resets = self._estimate_resets(ordered)
+        metrics = OrderMetrics.from_order(ordered)
         
         return RecommendationResult(
             recommended_order=[tc.id for tc in ordered],
-            estimated_total_time=total_time,
-            estimated_resets=estimated_resets,
+            estimated_total_time=metrics.total_time,
+            estimated_resets=metrics.resets,
             confidence_score=confidence,
             reasoning={
                 'method': 'heuristic' if not self.is_trained else 'ml',
@@ -359,13 +309,14 @@ class MLTestRecommender:
         # Criar grafo de dependências
         remaining = set(test_cases)
         ordered = []
+        executed_ids = set()
         
         while remaining:
             # Encontrar testes cujas dependências já foram executadas
             executable = []
             for tc in remaining:
                 deps_satisfied = all(
-                    dep_id in {t.id for t in ordered}
+                    dep_id in executed_ids
                     for dep_id in tc.dependencies
                 )
                 if deps_satisfied:
@@ -386,6 +337,7 @@ class MLTestRecommender:
             # Adicionar o melhor candidato
             next_test = executable[0]
             ordered.append(next_test)
+            executed_ids.add(next_test.id)
             remaining.remove(next_test)
         
         return ordered
@@ -425,24 +377,6 @@ class MLTestRecommender:
         X_scaled = self.scaler.transform(X.reshape(1, -1))
         return self.model.predict(X_scaled)[0]
     
-    def _estimate_resets(self, test_order: List[TestCase]) -> int:
-        """Estima número de reinicializações necessárias"""
-        resets = 0
-        current_state = set()
-        
-        for test in test_order:
-            required = test.get_preconditions()
-            
-            # Se estado atual não satisfaz as pré-condições, precisa reset
-            if required and not required.issubset(current_state):
-                resets += 1
-                current_state = set()
-            
-            # Atualizar estado com pós-condições
-            current_state.update(test.get_postconditions())
-        
-        return resets
-    
     def save_model(self, filepath: str):
         """Salva o modelo treinado"""
         model_data = {
@@ -468,5 +402,6 @@ class MLTestRecommender:
         self.is_trained = model_data['is_trained']
         self.training_data = model_data['training_data']
         self.feedback_history = model_data['feedback_history']
+        self.model_version += 1
         
         print(f"Modelo carregado de: {filepath}")
@@ -0,0 +1,204 @@
+"""
+Modelo online de risco de falha (Beta hierárquico + Thompson sampling).
+
+O risco era um smoothing Beta estático por teste. Aqui as evidências ficam
+em três níveis, com pooling entre usuários:
+
+    módulo  ->  teste (todos os usuários)  ->  usuário
+
+    - o posterior do módulo parte de um prior fixo;
+    - o prior de cada teste é a média do posterior do seu módulo (mais um
+      acréscimo para testes destrutivos/de alta prioridade);
+    - o prior do usuário é a média do posterior do teste calculada SEM as
+      execuções do próprio usuário (leave-user-out), e as execuções dele
+      atualizam esse prior.
+
+Cada escopo global (testes, módulos) é guardado em dois arrays float
+(falhas e sucessos) indexados por um dicionário chave -> posição; um
+feedback atualiza duas posições em O(1) e a consulta de milhares de testes
+é feita com indexação NumPy, sem consultas ao banco. As contagens do
+usuário vêm de quem chama (ex.: UserContextStats).
+
+Além da média do posterior, o modelo sorteia riscos do posterior em lote
+(Thompson sampling), para explorar testes com pouca evidência ao ordenar os
+de maior risco primeiro.
+"""
+import threading
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class BetaCounts:
+    """Falhas/sucessos por chave, em dois arrays float (posição 0 = sem evidência)."""
+
+    def __init__(self, capacity: int = 64):
+        """
+        Args:
+            capacity: Capacidade inicial dos arrays (dobra quando necessário)
+        """
+        self.index: Dict[Hashable, int] = {}
+        self.failures = np.zeros(max(2, capacity), dtype=np.float64)
+        self.successes = np.zeros(max(2, capacity), dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def slot(self, key: Hashable) -> int:
+        """Posição da chave (alocada na primeira vez)."""
+        pos = self.index.get(key)
+        if pos is None:
+            pos = len(self.index) + 1
+            if pos >= len(self.failures):
+                self.failures = np.concatenate([self.failures, np.zeros_like(self.failures)])
+                self.successes = np.concatenate([self.successes, np.zeros_like(self.successes)])
+            self.index[key] = pos
+        return pos
+
+    def add(self, key: Hashable, failures: float, successes: float):
+        """Soma evidências à chave (O(1) amortizado)."""
+        pos = self.slot(key)
+        self.failures[pos] += failures
+        self.successes[pos] += successes
+
+    def lookup(self, keys: Sequence[Hashable]) -> Tuple[np.ndarray, np.ndarray]:
+        """Falhas e sucessos de várias chaves (zeros para chaves sem evidência)."""
+        index = self.index
+        positions = np.fromiter((index.get(k, 0) for k in keys), dtype=np.intp, count=len(keys))
+        return self.failures[positions], self.successes[positions]
+
+
+class OnlineRiskModel:
+    """Posteriores Beta por módulo e por teste, atualizados a cada feedback. Thread-safe."""
+
+    def __init__(
+        self,
+        prior_fail: float = 0.15,
+        module_strength: float = 8.0,
+        test_strength: float = 10.0,
+        user_strength: float = 8.0,
+        destructive_prior: float = 0.05,
+        high_priority_prior: float = 0.03,
+        high_priority: int = 4,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            prior_fail: Prior de falha de um módulo sem histórico
+            module_strength: Peso do prior no posterior do módulo
+            test_strength: Peso da média do módulo no posterior do teste
+            user_strength: Peso do posterior do teste no posterior do usuário
+                (com n execuções, o usuário pesa n / (n + user_strength))
+            destructive_prior: Acréscimo ao prior do teste destrutivo
+            high_priority_prior: Acréscimo ao prior do teste de alta prioridade
+            high_priority: Prioridade a partir da qual o teste é de alta prioridade
+            seed: Semente do gerador usado no Thompson sampling
+        """
+        self.prior_fail = prior_fail
+        self.module_strength = module_strength
+        self.test_strength = test_strength
+        self.user_strength = user_strength
+        self.destructive_prior = destructive_prior
+        self.high_priority_prior = high_priority_prior
+        self.high_priority = high_priority
+        self.tests = BetaCounts()
+        self.modules = BetaCounts()
+        self.version = 0  # incrementada a cada evidência (chave de caches de risco)
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def observe(self, test_id: str, module: str, executions: int = 1, failures: int = 0):
+        """
+        Incorpora execuções de um teste (O(1))
+
+        Args:
+            test_id: ID do teste
+            module: Módulo do teste
+            executions: Número de execuções
+            failures: Quantas dessas execuções falharam
+        """
+        successes = executions - failures
+        with self._lock:
+            self.tests.add(test_id, failures, successes)
+            self.modules.add(module or "N/A", failures, successes)
+            self.version += 1
+
+    def reset(self):
+        """Descarta todas as evidências."""
+        with self._lock:
+            self.tests = BetaCounts()
+            self.modules = BetaCounts()
+            self.version += 1
+
+    def posterior(
+        self,
+        test_ids: List[str],
+        modules: List[str],
+        user_executions=0,
+        user_failures=0,
+        destructive=False,
+        priority=0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Parâmetros (alpha = falhas, beta = sucessos) do posterior de cada teste para o usuário
+
+        Args:
+            test_ids: IDs dos testes
+            modules: Módulo de cada teste
+            user_executions: Execuções do usuário por teste (já incluídas nos totais globais)
+            user_failures: Falhas do usuário por teste
+            destructive: Se o teste tem ações destrutivas
+            priority: Prioridade do teste
+
+        Returns:
+            Tupla (alpha, beta) de arrays alinhados com test_ids
+        """
+        with self._lock:
+            module_fails, module_succ = self.modules.lookup([m or "N/A" for m in modules])
+            test_fails, test_succ = self.tests.lookup(test_ids)
+
+        user_executions = np.asarray(user_executions, dtype=np.float64)
+        user_failures = np.asarray(user_failures, dtype=np.float64)
+
+        # Módulo: prior fixo + evidências de todos os usuários
+        module_mean = (module_fails + self.prior_fail * self.module_strength) / (
+            module_fails + module_succ + self.module_strength
+        )
+
+        # Teste: prior = média do módulo (+ tipo do teste); evidências dos OUTROS usuários
+        test_prior = np.clip(
+            module_mean
+            + np.where(np.asarray(destructive, dtype=bool), self.destructive_prior, 0.0)
+            + np.where(np.asarray(priority) >= self.high_priority, self.high_priority_prior, 0.0),
+            0.01, 0.99
+        )
+        other_fails = np.maximum(test_fails - user_failures, 0.0)
+        other_succ = np.maximum(test_succ - (user_executions - user_failures), 0.0)
+        test_mean = (other_fails + test_prior * self.test_strength) / (
+            other_fails + other_succ + self.test_strength
+        )
+
+        # Usuário: prior = posterior do teste; evidências do próprio usuário
+        alpha = test_mean * self.user_strength + user_failures
+        beta = (1.0 - test_mean) * self.user_strength + (user_executions - user_failures)
+        return alpha, beta
+
+    @staticmethod
+    def mean(alpha: np.ndarray, beta: np.ndarray) -> np.ndarray:
+        """Média do posterior (probabilidade de falha esperada)."""
+        return alpha / (alpha + beta)
+
+    def thompson(self, alpha: np.ndarray, beta: np.ndarray, draws: int = 1) -> np.ndarray:
+        """
+        Sorteia riscos do posterior (Thompson sampling em lote)
+
+        Args:
+            alpha: Parâmetros alpha (um por teste)
+            beta: Parâmetros beta (um por teste)
+            draws: Número de sorteios por teste
+
+        Returns:
+            Array (draws, n_testes) de riscos em [0, 1]
+        """
+        with self._lock:
+            return self._rng.beta(alpha, beta, size=(draws, len(alpha)))
@@ -0,0 +1,312 @@
+"""
+Ordens Pareto-ótimas (tempo total, resets, tempo até a primeira falha).
+
+O recomendador combina os objetivos com pesos fixos. Aqui eles são
+mantidos separados e é devolvida uma pequena fronteira de Pareto de ordens
+da mesma seleção, para que a interface mostre alternativas sem novas
+requisições. Objetivos (todos minimizados):
+
+    - tempo total: durações previstas + custo de cada reset + custo de cada
+      troca de módulo;
+    - resets: testes cujas pré-condições não estão satisfeitas pelo estado;
+    - tempo esperado até a primeira falha: com falhas independentes de
+      probabilidade p_i (mapa de risco), Σ_i P(primeira falha em i) ×
+      instante em que i termina, mais P(nenhuma falha) × tempo total.
+
+A busca é um NSGA simplificado sobre o OrderBatchEvaluator: parte da ordem
+recomendada e de sementes (razão risco/tempo, prioridade, agrupamento por
+módulo), gera mutações (trocas e reinserções) em lote, descarta as que
+violam dependências/pai, avalia todas de uma vez e mantém um arquivo de
+soluções não dominadas, limitado pela distância de aglomeração.
+"""
+import heapq
+from typing import Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from src.models.test_case import TestCase
+from src.utils.order_metrics import OrderBatchEvaluator
+
+
+OBJECTIVES = ('total_time', 'resets', 'expected_time_to_failure')
+
+# Rótulos das ordens devolvidas na fronteira
+PARETO_LABELS = {
+    'recommended': 'Ordem recomendada',
+    'total_time': 'Menor tempo total',
+    'resets': 'Menos resets',
+    'expected_time_to_failure': 'Detecta falhas mais cedo',
+    'balanced': 'Equilíbrio entre os objetivos',
+}
+
+
+def non_dominated(objectives: np.ndarray) -> np.ndarray:
+    """Máscara das linhas não dominadas (minimização em todas as colunas)."""
+    le = (objectives[:, None, :] <= objectives[None, :, :]).all(axis=2)
+    lt = (objectives[:, None, :] < objectives[None, :, :]).any(axis=2)
+    dominates = le & lt   # [j, i]: j domina i
+    return ~dominates.any(axis=0)
+
+
+def crowding_distance(objectives: np.ndarray) -> np.ndarray:
+    """Distância de aglomeração (NSGA-II); extremos recebem infinito."""
+    m, k = objectives.shape
+    distance = np.zeros(m)
+    if m <= 2:
+        return np.full(m, np.inf)
+    for column in range(k):
+        order = np.argsort(objectives[:, column], kind='stable')
+        values = objectives[order, column]
+        span = values[-1] - values[0]
+        distance[order[0]] = distance[order[-1]] = np.inf
+        if span > 0:
+            distance[order[1:-1]] += (values[2:] - values[:-2]) / span
+    return distance
+
+
+class ParetoOrderSearch:
+    """Busca evolutiva vetorizada de ordens não dominadas."""
+
+    def __init__(
+        self,
+        generations: int = 25,
+        offspring: int = 96,
+        archive_size: int = 32,
+        reset_time: float = 60.0,
+        switch_time: float = 10.0,
+        seed: Optional[int] = 0
+    ):
+        """
+        Args:
+            generations: Número de gerações
+            offspring: Mutações geradas por geração
+            archive_size: Máximo de soluções mantidas no arquivo
+            reset_time: Custo (segundos) de um reset no tempo total
+            switch_time: Custo (segundos) de uma troca de módulo no tempo total
+            seed: Semente das mutações (fixa: mesma entrada, mesma fronteira)
+        """
+        self.generations = generations
+        self.offspring = offspring
+        self.archive_size = archive_size
+        self.reset_time = reset_time
+        self.switch_time = switch_time
+        self.seed = seed
+
+    def objectives(
+        self,
+        evaluator: OrderBatchEvaluator,
+        orders: np.ndarray,
+        risk: np.ndarray
+    ) -> np.ndarray:
+        """
+        Calcula os três objetivos de várias ordens de uma vez
+
+        Args:
+            evaluator: Avaliador da seleção (durações já nos tempos)
+            orders: Matriz (K, n) de índices dos testes
+            risk: Probabilidade de falha de cada teste (índices do avaliador)
+
+        Returns:
+            Matriz (K, 3) com tempo total, resets e tempo esperado até a primeira falha
+        """
+        reset_before = evaluator.reset_positions(orders)
+        step = evaluator.times[orders] + reset_before * self.reset_time
+        step[:, 1:] += ~evaluator.same_module[orders[:, :-1], orders[:, 1:]] * self.switch_time
+        elapsed = np.cumsum(step, axis=1)
+        total = elapsed[:, -1]
+
+        p = risk[orders]
+        survive = np.cumprod(1.0 - p, axis=1)
+        survive_before = np.hstack([np.ones((len(orders), 1)), survive[:, :-1]])
+        time_to_failure = (survive_before * p * elapsed).sum(axis=1) + survive[:, -1] * total
+
+        return np.column_stack([total, reset_before.sum(axis=1), time_to_failure])
+
+    def search(
+        self,
+        tests: List[TestCase],
+        recommended_order: List[str],
+        risk_map: Dict[str, float],
+        durations: Dict[str, float],
+        prerequisites: Dict[str, Set[str]],
+        max_solutions: int = 5
+    ) -> List[Dict]:
+        """
+        Fronteira de Pareto de ordens da seleção
+
+        Args:
+            tests: Testes da seleção
+            recommended_order: Ordem recomendada (sempre avaliada)
+            risk_map: Probabilidade de falha por teste
+            durations: Duração prevista por teste
+            prerequisites: Teste -> dependências e pai dentro da seleção
+            max_solutions: Máximo de ordens devolvidas
+
+        Returns:
+            Lista de alternativas (rótulo, ordem e objetivos), a recomendada primeiro
+        """
+        by_id = {tc.id: tc for tc in tests}
+        ids = [tid for tid in dict.fromkeys(recommended_order) if tid in by_id]
+        listed = set(ids)
+        ids += [tid for tid in by_id if tid not in listed]
+        if not ids:
+            return []
+        evaluator = OrderBatchEvaluator([by_id[tid] for tid in ids], durations=durations)
+        n = len(ids)
+        risk = np.clip(np.array([risk_map.get(tid, 0.0) for tid in ids], dtype=np.float64), 0.0, 1.0)
+        index = evaluator.index
+
+        recommended = np.arange(n)
+        # Restrições: pré-requisito antes do teste (arestas em ciclos ficam de fora)
+        edges = np.array([
+            (index[pre], index[tid]) for tid in ids for pre in prerequisites.get(tid, ())
+            if pre in index and pre != tid
+        ], dtype=np.intp).reshape(-1, 2)
+        base = self._precedence_order(recommended, edges, n)
+        if len(base) < n:
+            stuck = np.ones(n, dtype=bool)
+            stuck[base] = False
+            edges = edges[~(stuck[edges[:, 0]] & stuck[edges[:, 1]])]
+            base = self._precedence_order(recommended, edges, n)
+
+        tests_in_order = evaluator.tests
+        seeds = [
+            base,
+            self._precedence_order(np.argsort(-(risk / np.maximum(evaluator.times, 1e-9)), kind='stable'), edges, n),
+            self._precedence_order(np.argsort([-tc.priority for tc in tests_in_order], kind='stable'), edges, n),
+            self._precedence_order(
+                np.array(sorted(recommended, key=lambda i: (tests_in_order[i].module, i)), dtype=np.intp), edges, n
+            ),
+        ]
+        population = np.unique(np.array(seeds, dtype=np.intp), axis=0)
+        scores = self.objectives(evaluator, population, risk)
+        population, scores = self._select(population, scores)
+
+        rng = np.random.default_rng(self.seed)
+        if n > 1:
+            for _ in range(self.generations):
+                children = self._mutate(population, rng)
+                children = children[self._feasible(children, edges)]
+                if not len(children):
+                    continue
+                merged = np.vstack([population, children])
+                merged_scores = np.vstack([scores, self.objectives(evaluator, children, risk)])
+                merged, unique_rows = np.unique(merged, axis=0, return_index=True)
+                population, scores = self._select(merged, merged_scores[unique_rows])
+
+        return self._pick(ids, population, scores, self.objectives(evaluator, recommended[None, :], risk)[0], max_solutions)
+
+    def _select(self, population: np.ndarray, scores: np.ndarray):
+        """Mantém as soluções não dominadas, limitadas pela distância de aglomeração."""
+        mask = non_dominated(scores)
+        population, scores = population[mask], scores[mask]
+        if len(population) > self.archive_size:
+            keep = np.argsort(-crowding_distance(scores), kind='stable')[:self.archive_size]
+            population, scores = population[keep], scores[keep]
+        return population, scores
+
+    def _mutate(self, population: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """Gera mutações em lote: troca de dois testes ou reinserção de um teste em outra posição."""
+        k, n = population.shape
+        children = population[rng.integers(0, k, self.offspring)].copy()
+        rows = np.arange(self.offspring)
+        a = rng.integers(0, n, self.offspring)
+        b = rng.integers(0, n, self.offspring)
+        swap = rng.random(self.offspring) < 0.5
+
+        # Troca
+        sa, sb, sr = a[swap], b[swap], rows[swap]
+        children[sr, sa], children[sr, sb] = children[sr, sb], children[sr, sa]
+
+        # Reinserção: o teste da posição a vai para a posição b
+        for row, src, dst in zip(rows[~swap], a[~swap], b[~swap]):
+            moved = children[row, src]
+            if src < dst:
+                children[row, src:dst] = children[row, src + 1:dst + 1]
+            elif src > dst:
+                children[row, dst + 1:src + 1] = children[row, dst:src]
+            children[row, dst] = moved
+        return children
+
+    @staticmethod
+    def _feasible(orders: np.ndarray, edges: np.ndarray) -> np.ndarray:
+        """Ordens em que todo pré-requisito vem antes do teste que depende dele."""
+        if not len(edges):
+            return np.ones(len(orders), dtype=bool)
+        position = np.empty_like(orders)
+        rows = np.arange(len(orders))[:, None]
+        position[rows, orders] = np.arange(orders.shape[1])
+        return (position[:, edges[:, 0]] < position[:, edges[:, 1]]).all(axis=1)
+
+    @staticmethod
+    def _precedence_order(preferred: Sequence[int], edges: np.ndarray, n: int) -> np.ndarray:
+        """
+        Ordem mais próxima da preferida que respeita as arestas (Kahn pela preferência)
+
+        Testes presos em ciclos (e os que dependem deles) ficam de fora do resultado.
+        """
+        rank = np.empty(n, dtype=np.intp)
+        rank[np.asarray(preferred, dtype=np.intp)] = np.arange(n)
+        indegree = np.zeros(n, dtype=np.intp)
+        successors: List[List[int]] = [[] for _ in range(n)]
+        for pre, post in edges:
+            successors[pre].append(post)
+            indegree[post] += 1
+        ready = [(rank[i], i) for i in range(n) if indegree[i] == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, node = heapq.heappop(ready)
+            order.append(node)
+            for post in successors[node]:
+                indegree[post] -= 1
+                if indegree[post] == 0:
+                    heapq.heappush(ready, (rank[post], post))
+        return np.array(order, dtype=np.intp)
+
+    @staticmethod
+    def _pick(
+        ids: List[str],
+        population: np.ndarray,
+        scores: np.ndarray,
+        recommended_scores: np.ndarray,
+        max_solutions: int
+    ) -> List[Dict]:
+        """Escolhe a recomendada, o melhor em cada objetivo e a de melhor equilíbrio."""
+        def describe(label: str, row: np.ndarray, values: np.ndarray) -> Dict:
+            return {
+                'label': label,
+                'description': PARETO_LABELS[label],
+                'order': [ids[i] for i in row],
+                'total_time': round(float(values[0]), 1),
+                'resets': int(values[1]),
+                'expected_time_to_failure': round(float(values[2]), 1),
+                'dominated': False
+            }
+
+        recommended = describe('recommended', np.arange(len(ids)), recommended_scores)
+        recommended['dominated'] = bool(
+            ((scores <= recommended_scores).all(axis=1) & (scores < recommended_scores).any(axis=1)).any()
+        )
+        chosen = [recommended]
+        seen = {tuple(recommended['order'])}
+
+        span = scores.max(axis=0) - scores.min(axis=0)
+        normalized = (scores - scores.min(axis=0)) / np.where(span > 0, span, 1.0)
+        balance = normalized.sum(axis=1)
+        # Melhor em cada objetivo (empates pelo equilíbrio) e a de menor soma normalizada
+        candidates = [
+            (label, int(np.lexsort((balance, scores[:, column]))[0]))
+            for column, label in enumerate(OBJECTIVES)
+        ]
+        candidates.append(('balanced', int(np.argmin(balance))))
+
+        for label, row in candidates:
+            if len(chosen) >= max_solutions:
+                break
+            order = tuple(ids[i] for i in population[row])
+            if order in seen:
+                continue
+            seen.add(order)
+            chosen.append(describe(label, population[row], scores[row]))
+        return chosen
@@ -7,11 +7,13 @@ from typing import List, Dict, Tuple, Optional
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 import pickle
+import threading
 from datetime import datetime
 
 from src.models.test_case import TestCase, RecommendationResult, ExecutionFeedback
 from src.features.feature_extractor import FeatureExtractor
 from src.recommender.ml_recommender import MLTestRecommender
+from src.recommender.pipeline import RecommendationPipeline, ModelSpec
 
 
 class PersonalizedMLRecommender:
@@ -37,6 +39,31 @@ class PersonalizedMLRecommender:
         
         # Cache de modelos personalizados (em memória)
         self.user_models: Dict[int, MLTestRecommender] = {}
+        
+        # Gravação write-behind dos modelos (None = gravação síncrona)
+        self.model_writer = None
+        
+        # Lock por usuário: treino e snapshot do modelo não se intercalam
+        self._user_locks: Dict[int, threading.Lock] = {}
+        self._user_locks_guard = threading.Lock()
+    
+    def enable_write_behind(self, db_path: str, flush_interval: float = 30.0, max_pending: int = 10):
+        """
+        Passa a gravar os modelos personalizados em lote, em segundo plano
+        
+        Args:
+            db_path: Caminho do banco SQLite
+            flush_interval: Intervalo máximo (s) entre gravações
+            max_pending: Modelos pendentes que disparam gravação imediata
+        """
+        from src.utils.model_write_behind import UserModelWriteBehind
+        self.model_writer = UserModelWriteBehind(
+            db_path,
+            serializer=pickle.dumps,
+            flush_interval=flush_interval,
+            max_pending=max_pending,
+            snapshot=self.snapshot_user_model
+        )
     
     def get_user_model(self, user_id: int, db) -> MLTestRecommender:
         """
@@ -71,6 +98,7 @@ class PersonalizedMLRecommender:
                 user_model.is_trained = model_data['is_trained']
                 user_model.training_data = model_data.get('training_data', {'X': [], 'y': []})
                 user_model.feedback_history = model_data.get('feedback_history', [])
+                user_model.model_version += 1
             except Exception as e:
                 print(f"Erro ao carregar modelo do usuário {user_id}: {e}")
                 user_model = MLTestRecommender()  # Criar novo
@@ -82,6 +110,58 @@ class PersonalizedMLRecommender:
         self.user_models[user_id] = user_model
         return user_model
     
+    def _user_lock(self, user_id: int) -> threading.Lock:
+        """Lock que protege o modelo personalizado do usuário"""
+        with self._user_locks_guard:
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = threading.Lock()
+            return lock
+    
+    def get_model_versions(self, user_id: Optional[int], db) -> Tuple[int, int]:
+        """
+        Retorna as versões (global, pessoal) dos modelos usados para um usuário
+        
+        Args:
+            user_id: ID do usuário (None para considerar apenas o global)
+            db: Instância do banco de dados
+            
+        Returns:
+            Tupla (versão do modelo global, versão do modelo pessoal)
+        """
+        global_version = self.global_recommender.model_version
+        if user_id is None:
+            return global_version, 0
+        return global_version, self.get_user_model(user_id, db).model_version
+    
+    def get_training_samples(self, user_id: int, db) -> int:
+        """Amostras de treino do modelo personalizado em memória (à frente do banco no write-behind)"""
+        return len(self.get_user_model(user_id, db).training_data.get('y', []))
+    
+    @staticmethod
+    def snapshot_user_model(user_model: MLTestRecommender) -> Dict:
+        """
+        Estado do modelo personalizado a gravar, sem serializar
+        
+        Copia as listas (add_feedback acrescenta nelas) e referencia modelo e
+        scaler, que o treino substitui por objetos novos em vez de re-treinar.
+        """
+        return {
+            'model': user_model.model,
+            'scaler': user_model.scaler,
+            'is_trained': user_model.is_trained,
+            'training_data': {
+                'X': list(user_model.training_data.get('X', [])),
+                'y': list(user_model.training_data.get('y', []))
+            },
+            'feedback_history': list(user_model.feedback_history)
+        }
+    
+    @classmethod
+    def serialize_user_model(cls, user_model: MLTestRecommender) -> bytes:
+        """Serializa o modelo personalizado para gravação na tabela user_models"""
+        return pickle.dumps(cls.snapshot_user_model(user_model))
+    
     def save_user_model(self, user_id: int, user_model: MLTestRecommender, db):
         """
         Salva modelo personalizado do usuário no banco
@@ -92,14 +172,7 @@ class PersonalizedMLRecommender:
             db: Instância do banco de dados
         """
         # Serializar modelo
-        model_data = {
-            'model': user_model.model,
-            'scaler': user_model.scaler,
-            'is_trained': user_model.is_trained,
-            'training_data': user_model.training_data,
-            'feedback_history': user_model.feedback_history
-        }
-        model_blob = pickle.dumps(model_data)
+        model_blob = self.serialize_user_model(user_model)
         
         # Salvar no banco
         cursor = db.conn.cursor()
@@ -120,28 +193,38 @@ class PersonalizedMLRecommender:
         user_id: int, 
         feedback: ExecutionFeedback, 
         test_order: List[TestCase],
-        db
+        db,
+        feedback_id: Optional[int] = None
     ):
         """
         Adiciona feedback e treina tanto modelo global quanto personalizado
         
+        Com write-behind habilitado, só um snapshot barato do modelo é
+        entregue à fila; a serialização e os metadados (amostras, data do
+        treino) são gravados em lote pela thread de segundo plano.
+        
         Args:
             user_id: ID do usuário
             feedback: Feedback da execução
             test_order: Ordem em que os testes foram executados
             db: Instância do banco de dados
+            feedback_id: ID do feedback já gravado na tabela feedbacks
         """
         # Adicionar ao modelo global
         self.global_recommender.add_feedback(feedback, test_order)
         
-        # Adicionar ao modelo personalizado
+        # Adicionar ao modelo personalizado (snapshot para o write-behind sob o mesmo lock)
         user_model = self.get_user_model(user_id, db)
-        user_model.add_feedback(feedback, test_order)
-        
-        # Treinar modelo personalizado se tiver dados suficientes
-        if len(user_model.training_data.get('y', [])) >= 5:
-            user_model.train()
-            self.save_user_model(user_id, user_model, db)
+        with self._user_lock(user_id):
+            user_model.add_feedback(feedback, test_order)
+            
+            # Treinar modelo personalizado se tiver dados suficientes
+            if len(user_model.training_data.get('y', [])) >= 5:
+                user_model.train()
+                if self.model_writer is not None:
+                    self.model_writer.mark_dirty(user_id, user_model, feedback_id)
+                else:
+                    self.save_user_model(user_id, user_model, db)
         
         # Salvar modelo global periodicamente
         if len(self.global_recommender.training_data.get('y', [])) % 20 == 0:
@@ -175,17 +258,23 @@ class PersonalizedMLRecommender:
         test_cases: List[TestCase],
         db,
         personalization_weight: Optional[float] = None,
-        experience_level: Optional[str] = None
+        experience_level: Optional[str] = None,
+        use_heuristics: bool = True
     ) -> RecommendationResult:
         """
         Recomenda ordenação combinando modelo global e personalizado
         
+        A heurística é calculada uma única vez e compartilhada pelos dois
+        modelos; com use_heuristics=False, ambos pontuam os candidatos em um
+        único passo em lote (ver RecommendationPipeline).
+        
         Args:
             user_id: ID do usuário (None para usar apenas global)
             test_cases: Lista de casos de teste
             db: Instância do banco de dados
             personalization_weight: Peso do modelo personalizado (0-1). Se None, calcula baseado em experience_level
             experience_level: Nível de experiência do usuário ('beginner', 'intermediate', 'advanced', 'expert')
+            use_heuristics: Se False, os modelos treinados refinam a ordem heurística
         
         Returns:
             Resultado da recomendação
@@ -200,7 +289,7 @@ class PersonalizedMLRecommender:
         
         # Se não há usuário ou modelo personalizado não treinado, usar apenas global
         if user_id is None:
-            return self.global_recommender.recommend_order(test_cases)
+            return self.global_recommender.recommend_order(test_cases, use_heuristics=use_heuristics)
         
         # Buscar nível de experiência do usuário se não fornecido
         if experience_level is None:
@@ -214,52 +303,49 @@ class PersonalizedMLRecommender:
             personalization_weight = self.get_personalization_weight(experience_level)
         
         user_model = self.get_user_model(user_id, db)
+        pipeline = RecommendationPipeline(use_heuristics=use_heuristics)
+        global_samples = len(self.global_recommender.training_data.get('y', []))
         
         # Se modelo personalizado não está treinado, usar apenas global (mas com peso reduzido para iniciantes)
         if not user_model.is_trained or len(user_model.training_data.get('y', [])) < 5:
-            result = self.global_recommender.recommend_order(test_cases)
-            result.reasoning['method'] = 'global_only'
-            result.reasoning['experience_level'] = experience_level
-            result.reasoning['personalization_weight'] = personalization_weight
-            return result
-        
-        # Obter recomendações de ambos modelos
-        global_result = self.global_recommender.recommend_order(test_cases)
-        personal_result = user_model.recommend_order(test_cases)
-        
-        # Combinar ordenações usando ensemble
-        combined_order = self._ensemble_order(
-            test_cases,
-            global_result.recommended_order,
-            personal_result.recommended_order,
-            personalization_weight
-        )
-        
-        # Calcular métricas da ordenação combinada
-        ordered_tests = {tc.id: tc for tc in test_cases}
-        ordered_list = [ordered_tests[tid] for tid in combined_order if tid in ordered_tests]
-        
-        total_time = sum(tc.get_total_estimated_time() for tc in ordered_list)
-        estimated_resets = self._estimate_resets(ordered_list)
+            output = pipeline.run(test_cases, [ModelSpec('global', self.global_recommender, 1.0)])
+            return RecommendationResult(
+                recommended_order=[tc.id for tc in output.order],
+                estimated_total_time=output.estimated_total_time,
+                estimated_resets=output.estimated_resets,
+                confidence_score=output.confidence_score,
+                reasoning={
+                    'method': 'global_only',
+                    'num_tests': len(test_cases),
+                    'training_samples': global_samples,
+                    'experience_level': experience_level,
+                    'personalization_weight': personalization_weight
+                }
+            )
         
-        # Confiança baseada na combinação
-        confidence = (
-            personalization_weight * personal_result.confidence_score +
-            (1 - personalization_weight) * global_result.confidence_score
-        )
+        # Pipeline com os dois modelos: candidatos compartilhados, pontuação
+        # em lote e combinação ponderada (pessoal primeiro, como no ensemble)
+        output = pipeline.run(test_cases, [
+            ModelSpec('personal', user_model, personalization_weight),
+            ModelSpec('global', self.global_recommender, 1 - personalization_weight)
+        ])
+        
+        reasoning = {
+            'method': 'personalized_ensemble',
+            'global_samples': global_samples,
+            'personal_samples': len(user_model.training_data.get('y', [])),
+            'personalization_weight': personalization_weight,
+            'experience_level': experience_level
+        }
+        if output.model_scores:
+            reasoning['model_scores'] = output.model_scores
         
         return RecommendationResult(
-            recommended_order=combined_order,
-            estimated_total_time=total_time,
-            estimated_resets=estimated_resets,
-            confidence_score=confidence,
-            reasoning={
-                'method': 'personalized_ensemble',
-                'global_samples': len(self.global_recommender.training_data.get('y', [])),
-                'personal_samples': len(user_model.training_data.get('y', [])),
-                'personalization_weight': personalization_weight,
-                'experience_level': experience_level
-            }
+            recommended_order=[tc.id for tc in output.order],
+            estimated_total_time=output.estimated_total_time,
+            estimated_resets=output.estimated_resets,
+            confidence_score=output.confidence_score,
+            reasoning=reasoning
         )
     
     def _ensemble_order(
@@ -281,129 +367,179 @@ class PersonalizedMLRecommender:
         Returns:
             Ordem combinada
         """
-        # Criar dicionário de posições
-        global_positions = {test_id: i for i, test_id in enumerate(global_order)}
-        personal_positions = {test_id: i for i, test_id in enumerate(personal_order)}
-        
-        # Calcular score combinado para cada teste
-        test_scores = {}
-        for tc in test_cases:
-            test_id = tc.id
-            
-            # Posições normalizadas (0-1)
-            global_pos = global_positions.get(test_id, len(test_cases))
-            personal_pos = personal_positions.get(test_id, len(test_cases))
-            
-            global_score = 1.0 - (global_pos / len(test_cases))
-            personal_score = 1.0 - (personal_pos / len(test_cases))
-            
-            # Score combinado
-            combined_score = (
-                weight * personal_score +
-                (1 - weight) * global_score
-            )
-            
-            test_scores[test_id] = combined_score
-        
-        # Ordenar por score combinado
-        sorted_tests = sorted(
-            test_scores.items(),
-            key=lambda x: x[1],
-            reverse=True
+        return RecommendationPipeline.merge_orders(
+            test_cases,
+            [(personal_order, weight), (global_order, 1 - weight)]
         )
+    
+    def update_user_learning_stats(
+        self,
+        user_id: int,
+        db,
+        feedback: Optional[ExecutionFeedback] = None,
+        module: Optional[str] = None,
+        test_to_module: Optional[Dict[str, str]] = None
+    ):
+        """
+        Atualiza estatísticas de aprendizado do usuário
+        
+        Com um feedback, a atualização é incremental (O(1)): somas e contadores
+        acumulados e o contador do módulo são incrementados. Sem feedback, ou
+        se a linha existente ainda não tem as somas acumuladas, as estatísticas
+        são reconstruídas a partir da tabela feedbacks.
+        
+        Args:
+            user_id: ID do usuário
+            db: Instância do banco de dados
+            feedback: Feedback recém-gravado (None para reconstruir)
+            module: Módulo do teste do feedback (resolvido no catálogo)
+            test_to_module: Mapa teste -> módulo usado na reconstrução
+        """
+        cursor = db.conn.cursor()
         
-        return [test_id for test_id, _ in sorted_tests]
+        if feedback is not None:
+            cursor.execute("""
+                SELECT rating_sum FROM user_learning_stats WHERE user_id = ?
+            """, (user_id,))
+            row = cursor.fetchone()
+            # Linhas antigas (sem somas acumuladas) precisam de uma reconstrução única
+            if row is None or row['rating_sum'] is not None:
+                self._increment_user_learning_stats(user_id, feedback, module, db)
+                return
+        
+        self.rebuild_user_learning_stats(user_id, db, test_to_module or {})
     
-    def _estimate_resets(self, test_order: List[TestCase]) -> int:
-        """Estima número de reinicializações necessárias"""
-        resets = 0
-        current_state = set()
+    def _increment_user_learning_stats(
+        self,
+        user_id: int,
+        feedback: ExecutionFeedback,
+        module: Optional[str],
+        db
+    ):
+        """Incrementa somas/contadores do usuário com um único feedback"""
+        cursor = db.conn.cursor()
+        rated = 1 if feedback.tester_rating is not None else 0
+        rating = feedback.tester_rating if rated else 0
+        success = 1 if feedback.success else 0
         
-        for test in test_order:
-            required = test.get_preconditions()
-            
-            if required and not required.issubset(current_state):
-                resets += 1
-                current_state = set()
-            
-            current_state.update(test.get_postconditions())
+        cursor.execute("""
+            INSERT INTO user_module_stats (user_id, module, executions)
+            VALUES (?, ?, 1)
+            ON CONFLICT(user_id, module) DO UPDATE SET executions = executions + 1
+        """, (user_id, module or 'Other'))
+        
+        cursor.execute("""
+            SELECT module FROM user_module_stats
+            WHERE user_id = ?
+            ORDER BY executions DESC
+            LIMIT 5
+        """, (user_id,))
+        modules = [r['module'] for r in cursor.fetchall()]
         
-        return resets
+        # Médias derivadas das somas acumuladas (referências à direita do SET
+        # usam os valores antigos da linha)
+        cursor.execute("""
+            INSERT INTO user_learning_stats
+            (user_id, total_feedbacks, rated_count, rating_sum, success_count, time_sum,
+             avg_rating, success_rate, avg_execution_time, preferred_modules, last_updated)
+            VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                total_feedbacks = total_feedbacks + 1,
+                rated_count = rated_count + excluded.rated_count,
+                rating_sum = rating_sum + excluded.rating_sum,
+                success_count = success_count + excluded.success_count,
+                time_sum = time_sum + excluded.time_sum,
+                avg_rating = CASE WHEN rated_count + excluded.rated_count > 0
+                    THEN (rating_sum + excluded.rating_sum) / (rated_count + excluded.rated_count)
+                    ELSE 0.0 END,
+                success_rate = (success_count + excluded.success_count) * 100.0 / (total_feedbacks + 1),
+                avg_execution_time = (time_sum + excluded.time_sum) / (total_feedbacks + 1),
+                preferred_modules = excluded.preferred_modules,
+                last_updated = excluded.last_updated
+        """, (
+            user_id,
+            rated,
+            float(rating),
+            success,
+            float(feedback.actual_execution_time),
+            float(rating) if rated else 0.0,
+            success * 100.0,
+            float(feedback.actual_execution_time),
+            ','.join(modules) if modules else None,
+            datetime.now().isoformat()
+        ))
+        db.conn.commit()
     
-    def update_user_learning_stats(self, user_id: int, db):
+    def rebuild_user_learning_stats(self, user_id: int, db, test_to_module: Dict[str, str]):
         """
-        Atualiza estatísticas de aprendizado do usuário
+        Reconstrói as estatísticas do usuário a partir de todos os feedbacks
+        
+        Usado para backfill (ver recalcular_estatisticas_usuarios.py) e para
+        migrar linhas antigas sem somas acumuladas.
         
         Args:
             user_id: ID do usuário
             db: Instância do banco de dados
+            test_to_module: Mapa teste -> módulo do catálogo atual
         """
         cursor = db.conn.cursor()
         
-        # Buscar feedbacks do usuário
         cursor.execute("""
             SELECT 
                 COUNT(*) as total,
-                AVG(tester_rating) as avg_rating,
-                AVG(CASE WHEN success = 1 THEN 1.0 ELSE 0.0 END) * 100 as success_rate,
-                AVG(actual_execution_time) as avg_time
+                COUNT(tester_rating) as rated_count,
+                COALESCE(SUM(tester_rating), 0) as rating_sum,
+                COALESCE(SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END), 0) as success_count,
+                COALESCE(SUM(actual_execution_time), 0.0) as time_sum
             FROM feedbacks
             WHERE tester_id = ?
         """, (user_id,))
-        
         stats = cursor.fetchone()
         
-        if stats and stats['total'] > 0:
-            # Buscar módulos preferidos (dos testes executados pelo usuário)
-            # Mapear IDs de teste para módulos
-            test_to_module = {
-                'MOTO_SETUP_001': 'Setup', 'MOTO_CAM_001': 'Camera', 'MOTO_CAM_002': 'Camera',
-                'MOTO_CAM_003': 'Camera', 'MOTO_WIFI_001': 'Connectivity', 'MOTO_WIFI_002': 'Connectivity',
-                'MOTO_BT_001': 'Connectivity', 'MOTO_BAT_001': 'Battery', 'MOTO_BAT_002': 'Battery',
-                'MOTO_CALL_001': 'Telephony', 'MOTO_CALL_002': 'Telephony', 'MOTO_SMS_001': 'Messaging',
-                'MOTO_SEC_001': 'Security', 'MOTO_SEC_002': 'Security', 'MOTO_GESTURE_001': 'MotoGestures',
-                'MOTO_GESTURE_002': 'MotoGestures', 'MOTO_AUDIO_001': 'Multimedia', 'MOTO_PERF_001': 'Performance',
-                'MOTO_PERF_002': 'Performance', 'MOTO_DISP_001': 'Display', 'MOTO_CELL_001': 'Connectivity',
-                'MOTO_CELL_002': 'Connectivity', 'MOTO_CELL_003': 'Connectivity', 'MOTO_GPS_001': 'Location',
-                'MOTO_NFC_001': 'NFC', 'MOTO_SYS_001': 'System', 'MOTO_SYS_002': 'System',
-                'MOTO_NOTIF_001': 'Notifications', 'MOTO_ACC_001': 'Accessibility', 'MOTO_SENSOR_001': 'Sensors',
-                'MOTO_AUDIO_002': 'Multimedia', 'MOTO_STORE_001': 'Storage', 'MOTO_SEC_003': 'Security',
-                'MOTO_APP_001': 'Apps'
-            }
-            
-            # Buscar testes mais executados pelo usuário
-            cursor.execute("""
-                SELECT test_case_id, COUNT(*) as count
-                FROM feedbacks
-                WHERE tester_id = ?
-                GROUP BY test_case_id
-                ORDER BY count DESC
-                LIMIT 20
-            """, (user_id,))
-            
-            module_counts = {}
-            for row in cursor.fetchall():
-                test_id = row['test_case_id']
-                module = test_to_module.get(test_id, 'Other')
-                module_counts[module] = module_counts.get(module, 0) + row['count']
-            
-            # Ordenar por frequência e pegar top 5
-            modules = sorted(module_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-            modules = [m[0] for m in modules]
-            
-            # Inserir ou atualizar estatísticas
-            cursor.execute("""
-                INSERT OR REPLACE INTO user_learning_stats
-                (user_id, total_feedbacks, avg_rating, success_rate, 
-                 avg_execution_time, preferred_modules, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                user_id,
-                stats['total'],
-                stats['avg_rating'] or 0.0,
-                stats['success_rate'] or 0.0,
-                stats['avg_time'] or 0.0,
-                ','.join(modules) if modules else None,
-                datetime.now().isoformat()
-            ))
+        cursor.execute("""
+            SELECT test_case_id, COUNT(*) as count
+            FROM feedbacks
+            WHERE tester_id = ?
+            GROUP BY test_case_id
+        """, (user_id,))
+        module_counts = {}
+        for row in cursor.fetchall():
+            module = test_to_module.get(row['test_case_id'], 'Other')
+            module_counts[module] = module_counts.get(module, 0) + row['count']
+        
+        cursor.execute("DELETE FROM user_module_stats WHERE user_id = ?", (user_id,))
+        cursor.executemany("""
+            INSERT INTO user_module_stats (user_id, module, executions) VALUES (?, ?, ?)
+        """, [(user_id, module, count) for module, count in module_counts.items()])
+        
+        if not stats or stats['total'] == 0:
+            cursor.execute("DELETE FROM user_learning_stats WHERE user_id = ?", (user_id,))
             db.conn.commit()
+            return
+        
+        # Ordenar por frequência e pegar top 5
+        modules = sorted(module_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        modules = [m[0] for m in modules]
+        
+        total = stats['total']
+        rated_count = stats['rated_count']
+        cursor.execute("""
+            INSERT OR REPLACE INTO user_learning_stats
+            (user_id, total_feedbacks, avg_rating, success_rate, 
+             avg_execution_time, preferred_modules, last_updated,
+             rated_count, rating_sum, success_count, time_sum)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            user_id,
+            total,
+            (stats['rating_sum'] / rated_count) if rated_count else 0.0,
+            stats['success_count'] * 100.0 / total,
+            stats['time_sum'] / total,
+            ','.join(modules) if modules else None,
+            datetime.now().isoformat(),
+            rated_count,
+            float(stats['rating_sum']),
+            stats['success_count'],
+            float(stats['time_sum'])
+        ))
+        db.conn.commit()
@@ -0,0 +1,224 @@
+"""
+Pipeline de recomendação em estágios
+Compartilha o trabalho comum entre o modelo global e os modelos personalizados
+"""
+import numpy as np
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple
+
+from src.models.test_case import TestCase
+from src.recommender.ml_recommender import MLTestRecommender
+from src.utils.order_metrics import OrderMetrics
+
+
+@dataclass
+class ModelSpec:
+    """Modelo participante do pipeline e seu peso na combinação"""
+    name: str
+    recommender: MLTestRecommender
+    weight: float
+
+
+@dataclass
+class PipelineResult:
+    """Saída do pipeline: ordem final e métricas calculadas uma única vez"""
+    order: List[TestCase]
+    estimated_total_time: float
+    estimated_resets: int
+    confidence_score: float
+    model_orders: Dict[str, List[str]] = field(default_factory=dict)
+    model_scores: Dict[str, float] = field(default_factory=dict)
+
+
+class RecommendationPipeline:
+    """
+    Pipeline de recomendação em três estágios:
+
+    1. Geração de candidatos: a ordenação heurística é calculada UMA vez e
+       compartilhada por todos os modelos. Com refinamento por ML, as
+       variantes com troca de testes adjacentes também são geradas aqui.
+    2. Pontuação: a matriz de features dos candidatos é montada uma vez e
+       cada modelo treinado faz uma única chamada de predict sobre ela.
+    3. Combinação: as ordens dos modelos são combinadas por posição
+       ponderada; tempo total e reinicializações são calculados só para a
+       ordem final.
+    """
+
+    def __init__(self, use_heuristics: bool = True):
+        """
+        Args:
+            use_heuristics: Se True, os modelos não reordenam a ordem heurística
+                (mesmo comportamento de MLTestRecommender.recommend_order)
+        """
+        self.use_heuristics = use_heuristics
+
+    def generate_candidates(
+        self,
+        test_cases: List[TestCase],
+        base_model: MLTestRecommender
+    ) -> List[List[TestCase]]:
+        """
+        Estágio 1: gera as ordenações candidatas
+
+        Args:
+            test_cases: Testes a ordenar
+            base_model: Recomendador usado para a ordenação heurística
+
+        Returns:
+            Lista de candidatos; o índice 0 é sempre a ordem heurística e o
+            índice i+1 é a ordem heurística com as posições i e i+1 trocadas
+        """
+        base_order = base_model._heuristic_ordering(test_cases)
+        candidates = [base_order]
+
+        if not self.use_heuristics:
+            for i in range(len(base_order) - 1):
+                variant = base_order.copy()
+                variant[i], variant[i + 1] = variant[i + 1], variant[i]
+                candidates.append(variant)
+
+        return candidates
+
+    def score_candidates(
+        self,
+        candidates: List[List[TestCase]],
+        models: List[ModelSpec]
+    ) -> Dict[str, np.ndarray]:
+        """
+        Estágio 2: pontua todos os candidatos com todos os modelos treinados
+
+        As features de uma ordenação não dependem do modelo, então a matriz
+        é montada uma vez; cada modelo aplica o próprio scaler e faz um único
+        predict em lote.
+
+        Args:
+            candidates: Ordenações candidatas
+            models: Modelos participantes
+
+        Returns:
+            Dicionário nome do modelo -> scores (um por candidato)
+        """
+        trained = [spec for spec in models if spec.recommender.is_trained]
+        if not trained or len(candidates) < 2:
+            return {}
+
+        sample_builder = trained[0].recommender
+        X = np.vstack([
+            sample_builder._generate_training_sample(order, 0)[0]
+            for order in candidates
+        ])
+
+        scores = {}
+        for spec in trained:
+            X_scaled = spec.recommender.scaler.transform(X)
+            scores[spec.name] = spec.recommender.model.predict(X_scaled)
+        return scores
+
+    def select_order(
+        self,
+        candidates: List[List[TestCase]],
+        scores: np.ndarray
+    ) -> List[TestCase]:
+        """
+        Escolhe a ordem de um modelo a partir dos scores em lote
+
+        Aplica, da maior para a menor melhora, as trocas adjacentes que o
+        modelo prevê como melhores que a ordem base, sem sobrepor posições.
+
+        Args:
+            candidates: Ordenações candidatas (índice 0 = base)
+            scores: Scores do modelo para cada candidato
+
+        Returns:
+            Ordem escolhida para o modelo
+        """
+        base_order = candidates[0]
+        gains = scores[1:] - scores[0]
+        improving = [i for i in np.argsort(-gains, kind='stable') if gains[i] > 0]
+
+        order = base_order.copy()
+        used = set()
+        for i in improving:
+            if i in used or i + 1 in used:
+                continue
+            order[i], order[i + 1] = order[i + 1], order[i]
+            used.update((i, i + 1))
+        return order
+
+    @staticmethod
+    def merge_orders(
+        test_cases: List[TestCase],
+        weighted_orders: List[Tuple[List[str], float]]
+    ) -> List[str]:
+        """
+        Estágio 3: combina N ordenações por posição normalizada ponderada
+
+        Args:
+            test_cases: Lista completa de testes
+            weighted_orders: Pares (ordem de IDs, peso)
+
+        Returns:
+            Ordem combinada de IDs
+        """
+        n = len(test_cases)
+        positions = [
+            ({test_id: i for i, test_id in enumerate(order)}, weight)
+            for order, weight in weighted_orders
+        ]
+
+        test_scores = {}
+        for tc in test_cases:
+            combined_score = 0.0
+            for pos_map, weight in positions:
+                combined_score += weight * (1.0 - (pos_map.get(tc.id, n) / n))
+            test_scores[tc.id] = combined_score
+
+        sorted_tests = sorted(test_scores.items(), key=lambda x: x[1], reverse=True)
+        return [test_id for test_id, _ in sorted_tests]
+
+    def run(self, test_cases: List[TestCase], models: List[ModelSpec]) -> PipelineResult:
+        """
+        Executa os três estágios
+
+        Args:
+            test_cases: Testes a ordenar
+            models: Modelos participantes (o primeiro gera a ordem heurística)
+
+        Returns:
+            Resultado com a ordem combinada e suas métricas
+        """
+        candidates = self.generate_candidates(test_cases, models[0].recommender)
+        scores = self.score_candidates(candidates, models)
+
+        model_orders = {}
+        confidence = 0.0
+        for spec in models:
+            if spec.name in scores:
+                order = self.select_order(candidates, scores[spec.name])
+                model_confidence = 0.9
+            else:
+                order = candidates[0]
+                model_confidence = 0.8 if spec.recommender.is_trained else 0.6
+            model_orders[spec.name] = [tc.id for tc in order]
+            confidence += spec.weight * model_confidence
+
+        if len(models) == 1:
+            merged_ids = model_orders[models[0].name]
+        else:
+            merged_ids = self.merge_orders(
+                test_cases,
+                [(model_orders[spec.name], spec.weight) for spec in models]
+            )
+
+        tests_by_id = {tc.id: tc for tc in test_cases}
+        ordered_list = [tests_by_id[tid] for tid in merged_ids if tid in tests_by_id]
+
+        metrics = OrderMetrics.from_order(ordered_list)
+        return PipelineResult(
+            order=ordered_list,
+            estimated_total_time=metrics.total_time,
+            estimated_resets=metrics.resets,
+            confidence_score=confidence,
+            model_orders=model_orders,
+            model_scores={name: float(s[0]) for name, s in scores.items()}
+        )
@@ -0,0 +1,182 @@
+"""
+Risco de falha e afinidade de contexto, vetorizados.
+
+Recebe arrays alinhados (um elemento por teste, na ordem dos IDs informados)
+com execuções/falhas do usuário e globais e calcula, em poucas operações
+NumPy:
+
+    - probabilidade de falha com smoothing Bayesiano (prior Beta);
+    - mistura usuário/global com peso que cresce com a experiência do
+      usuário no teste;
+    - afinidade de contexto (módulo recente + sucesso no módulo na faixa
+      de horário atual + ajuste de fim de semana).
+
+Não depende do Flask nem do banco: relatórios e notificações podem usar as
+mesmas funções a partir dos seus próprios contadores. A recomendação do app
+usa o OnlineRiskModel (Beta hierárquico com pooling entre usuários) para o
+risco e este módulo para a afinidade; failure_risk continua sendo a API em
+arrays para quem só tem contadores do usuário e globais por teste.
+"""
+import numpy as np
+from typing import Optional
+
+
+def beta_fail_prob(fails, total, prior_fail=0.2, strength: float = 8.0) -> np.ndarray:
+    """
+    Probabilidade de falha com smoothing Bayesiano (Beta prior).
+
+    Args:
+        fails: Falhas observadas (array ou escalar)
+        total: Execuções observadas
+        prior_fail: Probabilidade inicial (ex: 20%); pode ser um array por teste
+        strength: "Peso" do prior (quanto maior, mais conservador com poucos dados)
+
+    Returns:
+        Array de probabilidades
+    """
+    fails = np.asarray(fails, dtype=np.float64)
+    total = np.asarray(total, dtype=np.float64)
+    prior_fail = np.clip(np.asarray(prior_fail, dtype=np.float64), 0.01, 0.99)
+    strength = max(1.0, float(strength))
+    a = prior_fail * strength
+    b = (1.0 - prior_fail) * strength
+    return (fails + a) / (total + a + b)
+
+
+def laplace_success(successes, total) -> np.ndarray:
+    """Taxa de sucesso com smoothing de Laplace ((s + 1) / (n + 2))."""
+    return (np.asarray(successes, dtype=np.float64) + 1) / (np.asarray(total, dtype=np.float64) + 2)
+
+
+class FailureRiskEngine:
+    """Risco de falha e afinidade para vários testes de uma vez."""
+
+    def __init__(
+        self,
+        prior_fail: float = 0.2,
+        strength: float = 8.0,
+        cold_prior: float = 0.15,
+        cold_strength: float = 10.0,
+        destructive_prior: float = 0.05,
+        high_priority_prior: float = 0.03,
+        high_priority: int = 4,
+        user_samples: float = 50.0,
+        min_user_weight: float = 0.15,
+        max_user_weight: float = 0.85
+    ):
+        """
+        Args:
+            prior_fail: Prior de falha quando há histórico
+            strength: Peso do prior quando há histórico
+            cold_prior: Prior de falha de um teste sem histórico
+            cold_strength: Peso do prior de um teste sem histórico
+            destructive_prior: Acréscimo ao cold_prior para testes destrutivos
+            high_priority_prior: Acréscimo ao cold_prior para testes de alta prioridade
+            high_priority: Prioridade a partir da qual o teste é de alta prioridade
+            user_samples: Execuções do usuário para o peso dele atingir o máximo
+            min_user_weight: Peso do usuário com uma execução (aprox.)
+            max_user_weight: Peso máximo do usuário na mistura com o global
+        """
+        self.prior_fail = prior_fail
+        self.strength = strength
+        self.cold_prior = cold_prior
+        self.cold_strength = cold_strength
+        self.destructive_prior = destructive_prior
+        self.high_priority_prior = high_priority_prior
+        self.high_priority = high_priority
+        self.user_samples = user_samples
+        self.min_user_weight = min_user_weight
+        self.max_user_weight = max_user_weight
+
+    def user_weight(self, user_executions) -> np.ndarray:
+        """Peso do usuário na mistura: cresce com as execuções dele (0 sem execuções)."""
+        user_executions = np.asarray(user_executions, dtype=np.float64)
+        weight = np.minimum(
+            self.max_user_weight,
+            self.min_user_weight + (user_executions / self.user_samples) * (self.max_user_weight - self.min_user_weight)
+        )
+        return np.where(user_executions > 0, weight, 0.0)
+
+    def failure_risk(
+        self,
+        user_executions,
+        user_failures,
+        global_executions,
+        global_failures,
+        destructive,
+        priority
+    ) -> np.ndarray:
+        """
+        Probabilidade de falha de cada teste
+
+        Regra: usa o usuário se tiver dados; mistura com o global quando
+        ambos existem; sem histórico nenhum, usa um prior levemente
+        informado pelo tipo do teste (destrutivo/alta prioridade).
+
+        Args:
+            user_executions: Execuções do usuário por teste
+            user_failures: Falhas do usuário por teste
+            global_executions: Execuções de todos os usuários por teste
+            global_failures: Falhas de todos os usuários por teste
+            destructive: Se o teste tem ações destrutivas
+            priority: Prioridade do teste
+
+        Returns:
+            Array de riscos em [0, 1]
+        """
+        user_executions = np.asarray(user_executions, dtype=np.float64)
+        global_executions = np.asarray(global_executions, dtype=np.float64)
+        has_user = user_executions > 0
+        has_global = global_executions > 0
+
+        user_prob = beta_fail_prob(user_failures, user_executions, self.prior_fail, self.strength)
+        global_prob = beta_fail_prob(global_failures, global_executions, self.prior_fail, self.strength)
+        weight = self.user_weight(user_executions)
+        mixed = (weight * user_prob) + ((1.0 - weight) * global_prob)
+
+        cold_prior = (
+            self.cold_prior
+            + np.where(np.asarray(destructive, dtype=bool), self.destructive_prior, 0.0)
+            + np.where(np.asarray(priority) >= self.high_priority, self.high_priority_prior, 0.0)
+        )
+        cold_prob = beta_fail_prob(0, 0, cold_prior, self.cold_strength)
+
+        risk = np.where(
+            has_user & has_global, mixed,
+            np.where(has_user, user_prob, np.where(has_global, global_prob, cold_prob))
+        )
+        return np.clip(risk, 0.0, 1.0)
+
+    def affinity(
+        self,
+        same_module,
+        bucket_successes,
+        bucket_totals,
+        risk: Optional[np.ndarray] = None,
+        is_weekend: bool = False
+    ) -> np.ndarray:
+        """
+        Afinidade de contexto de cada teste
+
+        Args:
+            same_module: Se o teste é do módulo executado por último
+            bucket_successes: Sucessos do usuário no módulo do teste na faixa de horário atual
+            bucket_totals: Execuções do usuário no módulo do teste na faixa atual
+            risk: Risco de falha (no fim de semana, testes com risco > 0.5 perdem afinidade)
+            is_weekend: Se a recomendação é feita no fim de semana
+
+        Returns:
+            Array de afinidades em [0, 1]
+        """
+        bucket_totals = np.asarray(bucket_totals, dtype=np.float64)
+        aff = np.where(np.asarray(same_module, dtype=bool), 0.15, 0.0)
+
+        # puxa levemente para módulos onde o usuário tende a ir melhor nesse contexto
+        bucket_success = laplace_success(bucket_successes, bucket_totals)
+        aff = aff + np.where(bucket_totals > 0, np.clip((bucket_success - 0.5) * 0.5, 0.0, 0.25), 0.0)
+
+        # fim de semana: reduzir um pouco prioridade de módulos "difíceis" (proxy: maior risco)
+        if is_weekend and risk is not None:
+            aff = np.where(np.asarray(risk) > 0.5, aff - 0.05, aff)
+
+        return np.clip(aff, 0.0, 1.0)
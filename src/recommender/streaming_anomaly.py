@@ -0,0 +1,495 @@
+"""
+Detecção de Anomalias em Fluxo (streaming)
+Mantém estatísticas incrementais por usuário/teste e pontua cada feedback em O(1)
+"""
+import math
+import threading
+import numpy as np
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from src.models.test_case import ExecutionFeedback
+from src.recommender.anomaly_detector import (
+    AnomalyDetector, DetectorCache, FittedDetector, GLOBAL_DETECTOR_KEY
+)
+
+
+@dataclass
+class RunningStats:
+    """
+    Estatísticas incrementais de execuções
+
+    - Média/variância do tempo pelo algoritmo de Welford
+    - Taxa de falha por média móvel exponencial (EWMA)
+    - Contadores de falhas e reinicializações
+    """
+    count: int = 0
+    mean_time: float = 0.0
+    m2_time: float = 0.0
+    failures: int = 0
+    resets: int = 0
+    ewma_failure_rate: float = 0.0
+
+    def update(self, execution_time: float, success: bool, required_reset: bool, alpha: float):
+        """Incorpora uma execução (O(1))"""
+        self.count += 1
+        delta = execution_time - self.mean_time
+        self.mean_time += delta / self.count
+        self.m2_time += delta * (execution_time - self.mean_time)
+
+        failed = 0.0 if success else 1.0
+        if self.count == 1:
+            self.ewma_failure_rate = failed
+        else:
+            self.ewma_failure_rate = alpha * failed + (1 - alpha) * self.ewma_failure_rate
+        self.failures += int(failed)
+        self.resets += 1 if required_reset else 0
+
+    @property
+    def std_time(self) -> float:
+        """Desvio padrão populacional do tempo (igual a np.std)"""
+        return math.sqrt(self.m2_time / self.count) if self.count > 0 else 0.0
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.count if self.count else 0.0
+
+    @property
+    def reset_rate(self) -> float:
+        return self.resets / self.count if self.count else 0.0
+
+    def z_score(self, execution_time: float) -> float:
+        """Z-score do tempo em relação ao histórico (0 se histórico insuficiente)"""
+        std = self.std_time
+        if self.count < 3 or std == 0:
+            return 0.0
+        return (execution_time - self.mean_time) / std
+
+
+@dataclass
+class ScoredFeedback:
+    """Feedback já pontuado (mantido na janela recente do usuário)"""
+    feedback: ExecutionFeedback
+    features: np.ndarray
+    anomaly_score: float
+    is_anomaly: bool
+    reasons: List[str]
+
+
+class _UserState:
+    """Estado incremental de um usuário"""
+
+    def __init__(self, window: int):
+        self.stats = RunningStats()
+        self.test_stats: Dict[str, RunningStats] = {}
+        self.recent: Deque[ScoredFeedback] = deque(maxlen=window)
+        self.recent_times: Deque[float] = deque(maxlen=20)
+        self.total_ingested = 0
+        # total_ingested na última verificação da política de re-treino
+        self.checked_version = -1
+        # Detector usado na última re-pontuação da janela
+        self.scored_with: Optional[FittedDetector] = None
+        self.cached_result: Optional[Dict] = None
+
+
+class StreamingAnomalyDetector:
+    """
+    Detector de anomalias incremental
+
+    Cada feedback ingerido atualiza as estatísticas do usuário e do par
+    (usuário, teste) e é pontuado imediatamente: pelo IsolationForest já
+    treinado do usuário (uma única linha), pelo detector global ou, antes do
+    primeiro treino, pelo z-score do tempo. Os IsolationForest ficam em um
+    DetectorCache (LRU) e são re-treinados em segundo plano quando chegam
+    `refit_every` feedbacks novos ou os dados mudam de distribuição; a
+    janela recente é então re-pontuada e a consulta apenas lê o resultado
+    pré-calculado.
+    """
+
+    def __init__(
+        self,
+        contamination: float = 0.1,
+        window: int = 100,
+        refit_every: int = 20,
+        refit_interval: float = 10.0,
+        ewma_alpha: float = 0.2,
+        z_threshold: float = 3.0,
+        max_models: int = 128,
+        drift_threshold: float = 1.0
+    ):
+        """
+        Args:
+            contamination: Proporção esperada de anomalias (0-1)
+            window: Número de feedbacks recentes mantidos por usuário
+            refit_every: Feedbacks novos que disparam re-treino do modelo
+            refit_interval: Intervalo (s) entre verificações de re-treino
+            ewma_alpha: Fator de suavização da taxa de falha
+            z_threshold: Limite de z-score antes do primeiro treino
+            max_models: Máximo de detectores treinados em memória (LRU)
+            drift_threshold: Deslocamento das features (em desvios padrão) que força re-treino
+        """
+        self.contamination = contamination
+        self.window = window
+        self.refit_every = refit_every
+        self.refit_interval = refit_interval
+        self.ewma_alpha = ewma_alpha
+        self.z_threshold = z_threshold
+
+        self.model_cache = DetectorCache(
+            contamination=contamination,
+            max_entries=max_models,
+            refit_after=refit_every,
+            drift_threshold=drift_threshold
+        )
+        # Reaproveita extração de features, explicações e alertas
+        self.base_detector = AnomalyDetector(contamination=contamination, cache=self.model_cache)
+
+        self._users: Dict[int, _UserState] = {}
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(
+            target=self._refit_loop, name="anomaly-refit", daemon=True
+        )
+        self._thread.start()
+
+    # ==================== INGESTÃO ====================
+
+    def is_loaded(self, user_id: int) -> bool:
+        """Indica se o estado do usuário já está em memória"""
+        with self._lock:
+            return user_id in self._users
+
+    def bootstrap(
+        self,
+        user_id: int,
+        feedbacks: List[ExecutionFeedback],
+        test_cases: Optional[Dict] = None,
+        fit_now: bool = False
+    ):
+        """
+        Carrega o histórico do usuário (ordem cronológica) e agenda o primeiro treino
+
+        Args:
+            user_id: ID do usuário
+            feedbacks: Feedbacks em ordem cronológica
+            test_cases: Dicionário de casos de teste
+            fit_now: Se True, treina imediatamente em vez de em segundo plano
+        """
+        with self._lock:
+            self._users[user_id] = _UserState(self.window)
+            for feedback in feedbacks:
+                self._ingest_locked(user_id, feedback, test_cases)
+
+        if fit_now:
+            self.refit_pending()
+        else:
+            self._wakeup.set()
+
+    def ingest(
+        self,
+        user_id: int,
+        feedback: ExecutionFeedback,
+        test_cases: Optional[Dict] = None
+    ) -> ScoredFeedback:
+        """
+        Atualiza estatísticas e pontua um novo feedback (O(1) no histórico)
+
+        Args:
+            user_id: ID do usuário
+            feedback: Feedback recém-gravado
+            test_cases: Dicionário de casos de teste
+
+        Returns:
+            Feedback pontuado
+        """
+        with self._lock:
+            scored = self._ingest_locked(user_id, feedback, test_cases)
+            state = self._users[user_id]
+            pending = state.total_ingested - max(state.checked_version, 0)
+        if pending >= self.refit_every:
+            self._wakeup.set()
+        return scored
+
+    def _ingest_locked(
+        self,
+        user_id: int,
+        feedback: ExecutionFeedback,
+        test_cases: Optional[Dict]
+    ) -> ScoredFeedback:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState(self.window)
+
+        test_stats = state.test_stats.get(feedback.test_case_id)
+        if test_stats is None:
+            test_stats = state.test_stats[feedback.test_case_id] = RunningStats()
+
+        features = self.base_detector._extract_features([feedback], test_cases)
+        scored = self._score(state, test_stats, feedback, features, test_cases)
+
+        # Atualizar estatísticas DEPOIS de pontuar (compara com o histórico anterior)
+        state.stats.update(feedback.actual_execution_time, feedback.success,
+                           feedback.required_reset, self.ewma_alpha)
+        test_stats.update(feedback.actual_execution_time, feedback.success,
+                          feedback.required_reset, self.ewma_alpha)
+        state.recent.append(scored)
+        state.recent_times.append(feedback.actual_execution_time)
+        state.total_ingested += 1
+        state.cached_result = None
+        return scored
+
+    def _score(
+        self,
+        state: _UserState,
+        test_stats: RunningStats,
+        feedback: ExecutionFeedback,
+        features: np.ndarray,
+        test_cases: Optional[Dict]
+    ) -> ScoredFeedback:
+        """Pontua um feedback com o detector do usuário, o global ou o z-score"""
+        z = test_stats.z_score(feedback.actual_execution_time)
+
+        fitted = state.scored_with or self.model_cache.get(GLOBAL_DETECTOR_KEY)
+        if fitted is not None:
+            row = fitted.scaler.transform(features)
+            score = float(fitted.isolation_forest.score_samples(row)[0])
+            is_anomaly = bool(fitted.isolation_forest.predict(row)[0] == -1)
+        else:
+            score = -abs(z)
+            is_anomaly = abs(z) > self.z_threshold
+
+        reasons = []
+        if is_anomaly:
+            reasons = self.base_detector._explain_anomaly(feedback, features[0], test_cases)
+            if abs(z) > self.z_threshold:
+                reasons.insert(0, f"Tempo fora do padrão do usuário para este teste (z = {z:.1f})")
+            if not feedback.success and test_stats.count >= 3 and test_stats.ewma_failure_rate < 0.2:
+                reasons.append("Falha inesperada: teste costuma passar para este usuário")
+            if feedback.required_reset and state.stats.count >= 5 and state.stats.reset_rate < 0.1:
+                reasons.append("Reinicialização incomum para este usuário")
+
+        return ScoredFeedback(
+            feedback=feedback,
+            features=features[0],
+            anomaly_score=score,
+            is_anomaly=is_anomaly,
+            reasons=reasons
+        )
+
+    # ==================== RE-TREINO EM SEGUNDO PLANO ====================
+
+    def _refit_loop(self):
+        while True:
+            self._wakeup.wait(self.refit_interval)
+            self._wakeup.clear()
+            try:
+                self.refit_pending()
+            except Exception as e:
+                print(f"⚠ Erro ao re-treinar detector de anomalias: {e}")
+
+    def refit_pending(self) -> int:
+        """
+        Aplica a política de re-treino aos usuários com feedbacks novos
+
+        Returns:
+            Número de detectores re-treinados
+        """
+        with self._lock:
+            dirty = [
+                (user_id, state.total_ingested, np.array([s.features for s in state.recent]))
+                for user_id, state in self._users.items()
+                if state.total_ingested != state.checked_version and len(state.recent) >= 10
+            ]
+
+        # Treino fora do lock: a ingestão continua durante o fit
+        refitted = 0
+        for user_id, version, features in dirty:
+            if self.model_cache.needs_refit(user_id, features, version):
+                self._install_model(user_id, self.model_cache.fit(user_id, features, version))
+                refitted += 1
+            with self._lock:
+                state = self._users.get(user_id)
+                if state is not None:
+                    state.checked_version = version
+
+        if dirty:
+            refitted += self._refit_global()
+        return refitted
+
+    def _refit_global(self) -> int:
+        """Re-treina o detector global (janelas de todos os usuários) se necessário"""
+        with self._lock:
+            rows = [s.features for state in self._users.values() for s in state.recent]
+            version = sum(state.total_ingested for state in self._users.values())
+        if len(rows) < 10:
+            return 0
+
+        features = np.array(rows)
+        if self.model_cache.needs_refit(GLOBAL_DETECTOR_KEY, features, version):
+            self.model_cache.fit(GLOBAL_DETECTOR_KEY, features, version)
+            return 1
+        return 0
+
+    def _install_model(self, user_id: int, fitted: FittedDetector):
+        """Associa o detector ao usuário e re-pontua a janela recente"""
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None:
+                return
+            state.scored_with = fitted
+
+            if state.recent:
+                features_scaled = fitted.scaler.transform(np.array([s.features for s in state.recent]))
+                scores = fitted.isolation_forest.score_samples(features_scaled)
+                predictions = fitted.isolation_forest.predict(features_scaled)
+                for scored, score, prediction in zip(state.recent, scores, predictions):
+                    scored.anomaly_score = float(score)
+                    scored.is_anomaly = bool(prediction == -1)
+                    if scored.is_anomaly and not scored.reasons:
+                        scored.reasons = self.base_detector._explain_anomaly(
+                            scored.feedback, scored.features, None
+                        )
+            state.cached_result = None
+
+    # ==================== CONSULTA ====================
+
+    def get_result(self, user_id: int) -> Dict:
+        """
+        Retorna anomalias, padrões e alertas pré-calculados do usuário
+
+        Mesmo formato de AnomalyDetector.detect_anomalies; os feedbacks são
+        considerados em ordem cronológica (o último é o mais recente).
+        """
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None:
+                return self._empty_result(0)
+            needs_model = len(state.recent) >= 10 and (
+                state.scored_with is None or self.model_cache.get(user_id) is not state.scored_with
+            )
+            if needs_model:
+                features = np.array([s.features for s in state.recent])
+                version = state.total_ingested
+
+        # Detector removido pelo LRU (ou nunca treinado): treinar sob demanda
+        if needs_model:
+            fitted = self.model_cache.get(user_id)
+            if fitted is None:
+                fitted = self.model_cache.fit(user_id, features, version)
+            self._install_model(user_id, fitted)
+
+        with self._lock:
+            if state.cached_result is not None:
+                return state.cached_result
+
+            recent = list(state.recent)
+            if len(recent) < 10:
+                state.cached_result = self._empty_result(len(recent))
+                return state.cached_result
+
+            feedbacks = [s.feedback for s in recent]
+            anomalies = [
+                {
+                    'feedback': self._feedback_to_dict(s.feedback),
+                    'index': i,
+                    'anomaly_score': s.anomaly_score,
+                    'reasons': s.reasons or ["Padrão incomum detectado"]
+                }
+                for i, s in enumerate(recent) if s.is_anomaly
+            ]
+            patterns = self._patterns_from_stats(state)
+            alerts = self.base_detector._generate_alerts(feedbacks, anomalies, patterns)
+            # Mais recentes primeiro na listagem ('index' continua cronológico)
+            anomalies.reverse()
+
+            state.cached_result = {
+                'anomalies': anomalies,
+                'patterns': patterns,
+                'alerts': alerts,
+                'summary': {
+                    'total': len(feedbacks),
+                    'anomalies_count': len(anomalies),
+                    'anomaly_rate': len(anomalies) / len(feedbacks) * 100,
+                    'model_fitted': state.scored_with is not None,
+                    'model_fitted_at': state.scored_with.fitted_at.isoformat() if state.scored_with else None,
+                    'reset_rate': state.stats.reset_rate * 100,
+                    'ewma_failure_rate': state.stats.ewma_failure_rate * 100
+                }
+            }
+            return state.cached_result
+
+    def _patterns_from_stats(self, state: _UserState) -> List[Dict]:
+        """Padrões recorrentes calculados a partir das estatísticas incrementais"""
+        patterns = []
+
+        for test_id, stats in state.test_stats.items():
+            failure_rate = stats.failure_rate * 100
+            if failure_rate > 50 and stats.count >= 3:
+                patterns.append({
+                    'type': 'high_failure_rate',
+                    'test_id': test_id,
+                    'failure_rate': failure_rate,
+                    'recent_failure_rate': stats.ewma_failure_rate * 100,
+                    'total_executions': stats.count,
+                    'failures': stats.failures,
+                    'severity': 'high' if failure_rate > 75 else 'medium',
+                    'message': f"Teste {test_id} falha em {failure_rate:.1f}% das execuções"
+                })
+
+        times = list(state.recent_times)
+        if len(times) >= 20:
+            older_avg_time = float(np.mean(times[:10]))
+            recent_avg_time = float(np.mean(times[10:]))
+            if older_avg_time > 0 and recent_avg_time > older_avg_time * 1.5:
+                degradation = ((recent_avg_time - older_avg_time) / older_avg_time) * 100
+                patterns.append({
+                    'type': 'performance_degradation',
+                    'recent_avg': recent_avg_time,
+                    'older_avg': older_avg_time,
+                    'degradation': degradation,
+                    'severity': 'medium',
+                    'message': f"Tempo de execução aumentou {degradation:.1f}% recentemente"
+                })
+
+        for test_id, stats in state.test_stats.items():
+            if stats.count >= 5 and stats.mean_time > 0:
+                cv = (stats.std_time / stats.mean_time) * 100
+                if cv > 50:
+                    patterns.append({
+                        'type': 'high_variability',
+                        'test_id': test_id,
+                        'mean_time': stats.mean_time,
+                        'std_dev': stats.std_time,
+                        'coefficient_of_variation': cv,
+                        'severity': 'medium',
+                        'message': f"Teste {test_id} tem alta variabilidade de tempo (CV: {cv:.1f}%)"
+                    })
+
+        return patterns
+
+    @staticmethod
+    def _feedback_to_dict(feedback: ExecutionFeedback) -> Dict:
+        """Campos do feedback exibidos na interface (serializáveis em JSON)"""
+        return {
+            'test_case_id': feedback.test_case_id,
+            'executed_at': feedback.executed_at.isoformat(),
+            'actual_execution_time': feedback.actual_execution_time,
+            'success': feedback.success,
+            'tester_rating': feedback.tester_rating,
+            'required_reset': feedback.required_reset,
+            'followed_recommendation': feedback.followed_recommendation
+        }
+
+    @staticmethod
+    def _empty_result(total: int) -> Dict:
+        return {
+            'anomalies': [],
+            'patterns': [],
+            'alerts': [],
+            'summary': {
+                'total': total,
+                'anomalies_count': 0,
+                'anomaly_rate': 0.0
+            }
+        }
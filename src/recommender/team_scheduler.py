@@ -0,0 +1,447 @@
+"""
+Escalonamento de uma seleção entre vários testadores/dispositivos.
+
+Cada trabalhador (testador + dispositivo) executa uma sequência própria e
+parte do estado de baseline do SimulatorExecutor.reset(). O objetivo é o
+makespan: o instante em que o último trabalhador termina.
+
+Restrições:
+
+    - hierarquia: um filho roda no mesmo trabalhador do pai (o contexto
+      criado pelo pai só existe naquele dispositivo), depois dele; cada
+      árvore pai/filhos da seleção é uma unidade indivisível;
+    - dependências explícitas podem cruzar trabalhadores: o teste só começa
+      depois que a dependência termina, onde quer que ela rode (o
+      trabalhador espera, se preciso).
+
+Custo de cada teste no trabalhador: duração prevista + reset (pré-condições
+que a seleção ou o baseline fornecem e não estão no estado do dispositivo)
++ troca de módulo, como em ParetoOrderSearch.
+
+Algoritmo:
+
+    1. lista com prioridade de caminho crítico (HLFET): o teste pronto com o
+       maior "nível inferior" (duração + o maior nível entre os que dependem
+       dele) vai para o trabalhador onde termina mais cedo;
+    2. busca local: unidades do trabalhador que termina por último são
+       movidas para outro trabalhador (ou trocadas com uma unidade dele)
+       enquanto o makespan diminuir. Cada trabalhador mantém a ordem global
+       de despacho do passo 1, que é topológica: as esperas entre
+       trabalhadores nunca formam ciclo.
+
+Ciclos de dependência são quebrados pela ordem da seleção (as arestas
+descartadas vão no resultado).
+"""
+import heapq
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.models.test_case import TestCase
+from src.utils.order_metrics import ConditionBits
+
+
+@dataclass
+class WorkerPlan:
+    """Sequência de um trabalhador e seus instantes previstos."""
+    worker: int
+    order: List[str]
+    starts: List[float]
+    finishes: List[float]
+    resets: int
+    busy_time: float          # tempo executando (sem esperas por dependências)
+    finish_time: float
+
+    def to_dict(self) -> Dict:
+        return {
+            'worker': self.worker,
+            'order': self.order,
+            'tests': [
+                {'id': tid, 'start': round(start, 1), 'finish': round(finish, 1)}
+                for tid, start, finish in zip(self.order, self.starts, self.finishes)
+            ],
+            'resets': self.resets,
+            'busy_time': round(self.busy_time, 1),
+            'idle_time': round(self.finish_time - self.busy_time, 1),
+            'finish_time': round(self.finish_time, 1)
+        }
+
+
+@dataclass
+class TeamSchedule:
+    """Resultado do escalonamento entre trabalhadores."""
+    workers: List[WorkerPlan]
+    makespan: float
+    serial_time: float        # mesma ordem global em um único trabalhador
+    lower_bound: float        # max(caminho crítico, carga / trabalhadores, maior unidade), só com durações
+    list_makespan: float      # makespan antes da busca local
+    moves: int                # melhorias aceitas na busca local
+    dropped_edges: List[Tuple[str, str]] = field(default_factory=list)  # (pré-requisito, teste) em ciclos
+
+    def to_dict(self) -> Dict:
+        return {
+            'workers': [plan.to_dict() for plan in self.workers],
+            'makespan': round(self.makespan, 1),
+            'serial_time': round(self.serial_time, 1),
+            'speedup': round(self.serial_time / self.makespan, 2) if self.makespan > 0 else None,
+            'lower_bound': round(self.lower_bound, 1),
+            'list_makespan': round(self.list_makespan, 1),
+            'local_search_moves': self.moves,
+            'dropped_edges': [list(edge) for edge in self.dropped_edges]
+        }
+
+
+@dataclass
+class _Compiled:
+    """Seleção compilada: durações, pré-requisitos e condições em bitsets (por índice)."""
+    time: List[float]
+    preds: List[Set[int]]
+    priority: List[int]
+    module: List[Optional[str]]
+    baseline: int
+    pre: List[int]            # só pré-condições que o baseline ou a seleção fornecem
+    post: List[int]           # 0 para teardown_restores/context_preserving
+    clears: List[bool]        # destrutivo: o estado é limpo após o teste
+
+
+class TeamScheduler:
+    """Escalonamento por lista com caminho crítico + busca local no makespan."""
+
+    def __init__(
+        self,
+        reset_time: float = 60.0,
+        switch_time: float = 10.0,
+        max_iterations: int = 100
+    ):
+        """
+        Args:
+            reset_time: Custo (segundos) de um reset do dispositivo
+            switch_time: Custo (segundos) de uma troca de módulo
+            max_iterations: Máximo de melhorias da busca local
+        """
+        self.reset_time = reset_time
+        self.switch_time = switch_time
+        self.max_iterations = max_iterations
+
+    def schedule(
+        self,
+        tests: List[TestCase],
+        durations: Dict[str, float],
+        prerequisites: Dict[str, Set[str]],
+        workers: int,
+        baseline_state: Iterable[str] = ()
+    ) -> TeamSchedule:
+        """
+        Distribui a seleção entre os trabalhadores
+
+        Args:
+            tests: Testes da seleção (IDs únicos)
+            durations: Duração prevista de cada teste (segundos)
+            prerequisites: Teste -> dependências e pai que estão na seleção
+            workers: Número de trabalhadores (>= 1)
+            baseline_state: Estado de cada dispositivo após um reset
+
+        Returns:
+            TeamSchedule com a sequência e os instantes de cada trabalhador
+        """
+        workers = max(1, int(workers))
+        n = len(tests)
+        ids = [tc.id for tc in tests]
+        index = {tid: i for i, tid in enumerate(ids)}
+        time = [max(float(durations.get(tid, tests[i].get_total_estimated_time())), 0.0) for i, tid in enumerate(ids)]
+
+        # Pré-requisitos por índice; o pai define a unidade (mesmo trabalhador)
+        preds: List[Set[int]] = [
+            {index[p] for p in prerequisites.get(tid, ()) if p in index and p != tid} for tid in ids
+        ]
+        parent = [index.get(tc.parent_test_id) if tc.parent_test_id else None for tc in tests]
+        order, dropped = self._break_cycles(n, preds)
+        for pre, post in dropped:
+            preds[post].discard(pre)
+            if parent[post] == pre:
+                parent[post] = None
+        unit = self._units(n, parent)
+
+        c = self._compile(tests, time, preds, baseline_state)
+        succs: List[List[int]] = [[] for _ in range(n)]
+        for i in range(n):
+            for p in preds[i]:
+                succs[p].append(i)
+
+        # Nível inferior (caminho crítico até o fim do grafo)
+        level = [0.0] * n
+        for i in reversed(order):
+            level[i] = time[i] + max((level[s] for s in succs[i]), default=0.0)
+
+        dispatch, assign = self._list_schedule(c, succs, level, unit, workers)
+        rank = {i: r for r, i in enumerate(dispatch)}
+        list_makespan = self._evaluate(c, dispatch, assign, workers)[0]
+        assign, moves = self._local_search(c, dispatch, assign, unit, workers)
+
+        makespan, plans = self._evaluate(c, dispatch, assign, workers, detail=True)
+        serial_time = self._evaluate(c, dispatch, [0] * n, 1)[0]
+
+        unit_time: Dict[int, float] = {}
+        for i in range(n):
+            unit_time[unit[i]] = unit_time.get(unit[i], 0.0) + time[i]
+        lower_bound = max(
+            max(level, default=0.0),
+            sum(time) / workers,
+            max(unit_time.values(), default=0.0)
+        )
+
+        worker_plans = []
+        for w, (sequence, starts, finishes, resets, busy) in enumerate(plans):
+            sequence = sorted(sequence, key=rank.get)
+            worker_plans.append(WorkerPlan(
+                worker=w + 1,
+                order=[ids[i] for i in sequence],
+                starts=[starts[i] for i in sequence],
+                finishes=[finishes[i] for i in sequence],
+                resets=resets,
+                busy_time=busy,
+                finish_time=max((finishes[i] for i in sequence), default=0.0)
+            ))
+
+        return TeamSchedule(
+            workers=worker_plans,
+            makespan=makespan,
+            serial_time=serial_time,
+            lower_bound=lower_bound,
+            list_makespan=list_makespan,
+            moves=moves,
+            dropped_edges=[(ids[pre], ids[post]) for pre, post in dropped]
+        )
+
+    @staticmethod
+    def _break_cycles(n: int, preds: List[Set[int]]) -> Tuple[List[int], List[Tuple[int, int]]]:
+        """Ordem topológica (Kahn pela ordem da seleção); em um ciclo, o primeiro teste perde os pré-requisitos pendentes."""
+        indegree = [len(p) for p in preds]
+        succs: List[List[int]] = [[] for _ in range(n)]
+        for i in range(n):
+            for p in preds[i]:
+                succs[p].append(i)
+        ready = [i for i in range(n) if indegree[i] == 0]
+        heapq.heapify(ready)
+        done = [False] * n
+        order: List[int] = []
+        dropped: List[Tuple[int, int]] = []
+        while len(order) < n:
+            if not ready:
+                stuck = next(i for i in range(n) if not done[i])
+                for p in sorted(preds[stuck]):
+                    if not done[p]:
+                        dropped.append((p, stuck))
+                        succs[p].remove(stuck)
+                indegree[stuck] = 0
+                heapq.heappush(ready, stuck)
+            node = heapq.heappop(ready)
+            done[node] = True
+            order.append(node)
+            for s in succs[node]:
+                indegree[s] -= 1
+                if indegree[s] == 0:
+                    heapq.heappush(ready, s)
+        return order, dropped
+
+    @staticmethod
+    def _units(n: int, parent: List[Optional[int]]) -> List[int]:
+        """Raiz da árvore pai/filhos (na seleção) de cada teste."""
+        unit = list(range(n))
+
+        def find(i: int) -> int:
+            while unit[i] != i:
+                unit[i] = unit[unit[i]]
+                i = unit[i]
+            return i
+
+        for i, p in enumerate(parent):
+            if p is not None:
+                unit[find(i)] = find(p)
+        return [find(i) for i in range(n)]
+
+    @staticmethod
+    def _compile(
+        tests: List[TestCase],
+        time: List[float],
+        preds: List[Set[int]],
+        baseline_state: Iterable[str]
+    ) -> _Compiled:
+        """Pré/pós-condições em bitsets; condições que nem o baseline nem a seleção fornecem são ignoradas."""
+        bits = ConditionBits()
+        baseline = bits.mask(baseline_state)
+        post = [bits.mask(tc.get_postconditions()) for tc in tests]
+        available = baseline
+        for mask in post:
+            available |= mask
+        return _Compiled(
+            time=time,
+            preds=preds,
+            priority=[tc.priority for tc in tests],
+            module=[tc.module for tc in tests],
+            baseline=baseline,
+            pre=[bits.mask(tc.get_preconditions()) & available for tc in tests],
+            # Hierarquia: teardown restaura o estado, context_preserving não o altera e destrutivos o limpam
+            post=[0 if tc.teardown_restores or tc.context_preserving else mask for tc, mask in zip(tests, post)],
+            clears=[tc.has_destructive_actions() and not tc.teardown_restores for tc in tests]
+        )
+
+    def _step(self, c: _Compiled, i: int, state: int, module: Optional[str]) -> Tuple[float, bool, int]:
+        """Custo extra (reset/troca de módulo), se houve reset e o estado após o teste i."""
+        extra = 0.0
+        reset = (c.pre[i] & ~state) != 0
+        if reset:
+            extra += self.reset_time
+            state = c.baseline
+        if module is not None and module != c.module[i]:
+            extra += self.switch_time
+        state = 0 if c.clears[i] else state | c.post[i]
+        return extra, reset, state
+
+    def _list_schedule(
+        self,
+        c: _Compiled,
+        succs: List[List[int]],
+        level: List[float],
+        unit: List[int],
+        workers: int
+    ) -> Tuple[List[int], List[int]]:
+        """Despacho HLFET: maior nível inferior primeiro, no trabalhador onde termina mais cedo."""
+        n = len(c.time)
+        remaining = [len(p) for p in c.preds]
+        ready = [(-level[i], -c.priority[i], i) for i in range(n) if remaining[i] == 0]
+        heapq.heapify(ready)
+        available = [0.0] * workers
+        state = [c.baseline] * workers
+        module: List[Optional[str]] = [None] * workers
+        unit_worker: Dict[int, int] = {}
+        finish = [0.0] * n
+        assign = [0] * n
+        dispatch: List[int] = []
+
+        while ready:
+            _, _, i = heapq.heappop(ready)
+            release = max((finish[p] for p in c.preds[i]), default=0.0)
+            candidates = [unit_worker[unit[i]]] if unit[i] in unit_worker else range(workers)
+            best = None
+            for w in candidates:
+                extra, _, new_state = self._step(c, i, state[w], module[w])
+                end = max(available[w], release) + extra + c.time[i]
+                key = (end, available[w], w)
+                if best is None or key < best[0]:
+                    best = (key, w, new_state)
+            (end, _, _), w, new_state = best
+            unit_worker.setdefault(unit[i], w)
+            assign[i] = w
+            finish[i] = available[w] = end
+            state[w] = new_state
+            module[w] = c.module[i]
+            dispatch.append(i)
+            for s in succs[i]:
+                remaining[s] -= 1
+                if remaining[s] == 0:
+                    heapq.heappush(ready, (-level[s], -c.priority[s], s))
+        return dispatch, assign
+
+    def _evaluate(
+        self,
+        c: _Compiled,
+        dispatch: List[int],
+        assign: List[int],
+        workers: int,
+        detail: bool = False
+    ):
+        """Simula as sequências (ordem global de despacho em cada trabalhador); devolve o makespan."""
+        n = len(c.time)
+        available = [0.0] * workers
+        state = [c.baseline] * workers
+        module: List[Optional[str]] = [None] * workers
+        finish = [0.0] * n
+        start = [0.0] * n if detail else None
+        resets = [0] * workers
+        busy = [0.0] * workers
+        pre, post, clears, preds = c.pre, c.post, c.clears, c.preds
+        for i in dispatch:
+            w = assign[i]
+            begin = available[w]
+            for p in preds[i]:
+                if finish[p] > begin:
+                    begin = finish[p]
+            # Mesmo custo de _step, inline (laço mais quente da busca local)
+            extra = 0.0
+            current = state[w]
+            reset = (pre[i] & ~current) != 0
+            if reset:
+                extra = self.reset_time
+                current = c.baseline
+            if module[w] is not None and module[w] != c.module[i]:
+                extra += self.switch_time
+            state[w] = 0 if clears[i] else current | post[i]
+            finish[i] = available[w] = begin + extra + c.time[i]
+            module[w] = c.module[i]
+            if detail:
+                start[i] = begin
+                resets[w] += reset
+                busy[w] += extra + c.time[i]
+        makespan = max(available, default=0.0)
+        if not detail:
+            return makespan, available
+        plans = [([i for i in dispatch if assign[i] == w], start, finish, resets[w], busy[w]) for w in range(workers)]
+        return makespan, plans
+
+    def _local_search(
+        self,
+        c: _Compiled,
+        dispatch: List[int],
+        assign: List[int],
+        unit: List[int],
+        workers: int
+    ) -> Tuple[List[int], int]:
+        """Move/troca unidades do trabalhador crítico enquanto (makespan, Σ términos) diminuir."""
+        if workers < 2:
+            return assign, 0
+        members: Dict[int, List[int]] = {}
+        n = len(c.time)
+        for i in range(n):
+            members.setdefault(unit[i], []).append(i)
+        unit_worker = {u: assign[items[0]] for u, items in members.items()}
+        unit_time = {u: sum(c.time[i] for i in items) for u, items in members.items()}
+
+        def evaluate(mapping: Dict[int, int]) -> Tuple[Tuple[float, float], List[float]]:
+            makespan, finish = self._evaluate(c, dispatch, [mapping[unit[i]] for i in range(n)], workers)
+            return (makespan, sum(finish)), finish
+
+        current, finish = evaluate(unit_worker)
+        moves = 0
+        while moves < self.max_iterations:
+            # Trabalhador crítico: o último a terminar
+            critical = max(range(workers), key=lambda w: finish[w])
+            critical_units = [u for u, w in unit_worker.items() if w == critical]
+
+            best, best_mapping, best_finish = current, None, finish
+            makespan = finish[critical]
+            for u in critical_units:
+                for w in range(workers):
+                    # Só vale simular se a unidade cabe antes do makespan atual
+                    if w == critical or finish[w] + unit_time[u] > makespan:
+                        continue
+                    candidate = dict(unit_worker)
+                    candidate[u] = w
+                    score, candidate_finish = evaluate(candidate)
+                    if score < best:
+                        best, best_mapping, best_finish = score, candidate, candidate_finish
+            if best_mapping is None:
+                # Nenhum movimento melhora: tentar trocas com outros trabalhadores
+                for u in critical_units:
+                    for v, w in unit_worker.items():
+                        if w == critical or finish[w] + unit_time[u] - unit_time[v] > makespan:
+                            continue
+                        candidate = dict(unit_worker)
+                        candidate[u], candidate[v] = w, critical
+                        score, candidate_finish = evaluate(candidate)
+                        if score < best:
+                            best, best_mapping, best_finish = score, candidate, candidate_finish
+            if best_mapping is None:
+                break
+            unit_worker, current, finish = best_mapping, best, best_finish
+            moves += 1
+        return [unit_worker[unit[i]] for i in range(n)], moves
@@ -0,0 +1,219 @@
+"""
+Contadores de contexto por usuário (risco de falha e afinidade).
+
+A cada recomendação, o cálculo de contexto fazia duas agregações sobre a
+tabela feedbacks (por teste, do usuário e global), buscava o último feedback
+e lia até 1000 feedbacks do usuário, convertendo cada executed_at, só para
+contar sucessos por (módulo, faixa de horário).
+
+Agora esses números são mantidos de forma incremental:
+
+    - a tabela context_stats guarda execuções/sucessos por
+      (usuário, teste, faixa de horário) e é atualizada a cada feedback;
+    - ContextStatsCache guarda em memória, por usuário, os contadores por
+      teste e por (módulo, faixa), o último feedback e, para todos, o total
+      global por teste.
+
+O cálculo do risco/afinidade passa a fazer apenas consultas O(1) por teste
+selecionado. Se houver um OnlineRiskModel associado, ele recebe os mesmos
+totais na carga e cada feedback registrado. Na primeira carga, se
+context_stats não cobrir exatamente a tabela feedbacks (banco antigo ou
+feedbacks gravados por scripts), os contadores são reconstruídos uma vez.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.models.test_case import TestCase
+
+
+ANONYMOUS_USER = 0  # user_id usado em context_stats para feedback sem testador
+
+
+def time_bucket(dt: datetime) -> str:
+    """Converte horário em bucket simples."""
+    h = dt.hour
+    if 5 <= h <= 11:
+        return "morning"
+    if 12 <= h <= 17:
+        return "afternoon"
+    if 18 <= h <= 22:
+        return "evening"
+    return "night"
+
+
+def parse_datetime(value: Any) -> datetime:
+    """Tenta parsear datetime vindo do SQLite (agora, se inválido)."""
+    if isinstance(value, datetime):
+        return value
+    if value is None:
+        return datetime.now()
+    try:
+        # ISO 8601
+        return datetime.fromisoformat(str(value))
+    except Exception:
+        return datetime.now()
+
+
+def module_of(test_id: str, tests_map: Dict[str, TestCase]) -> str:
+    """Módulo do teste no catálogo ("N/A" se o teste não existe mais)."""
+    tc = tests_map.get(test_id)
+    return tc.module if tc else "N/A"
+
+
+@dataclass
+class UserContextStats:
+    """Contadores de contexto de um usuário."""
+    test_counts: Dict[str, List[int]] = field(default_factory=dict)              # teste -> [execuções, falhas]
+    module_bucket_counts: Dict[Tuple[str, str], List[int]] = field(default_factory=dict)  # -> [sucessos, total]
+    last_test_id: Optional[str] = None
+    last_executed_at: Optional[str] = None
+
+    def add(self, test_id: str, module: str, bucket: str, executions: int, successes: int):
+        counts = self.test_counts.setdefault(test_id, [0, 0])
+        counts[0] += executions
+        counts[1] += executions - successes
+        bucket_counts = self.module_bucket_counts.setdefault((module, bucket), [0, 0])
+        bucket_counts[0] += successes
+        bucket_counts[1] += executions
+
+
+class ContextStatsCache:
+    """Cache em memória dos contadores de contexto (por usuário, LRU). Thread-safe."""
+
+    def __init__(self, db, max_users: int = 256, risk_model=None, catalog: Optional[Dict[str, TestCase]] = None):
+        """
+        Args:
+            db: Instância do banco de dados
+            max_users: Número máximo de usuários mantidos em memória
+            risk_model: OnlineRiskModel alimentado com os totais globais (opcional)
+            catalog: Catálogo compartilhado, usado para o módulo dos testes na carga do risk_model
+                (testes personalizados usam o módulo do dono, como em record)
+        """
+        self.db = db
+        self.max_users = max_users
+        self.risk_model = risk_model
+        self.catalog = catalog or {}
+        self._users: "OrderedDict[int, UserContextStats]" = OrderedDict()
+        self._global: Optional[Dict[str, List[int]]] = None  # teste -> [execuções, falhas]
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        """Carrega os totais globais (reconstruindo context_stats se necessário)."""
+        if self._global is not None:
+            return
+        if not self.db.context_stats_in_sync():
+            self.db.rebuild_context_stats(lambda executed_at: time_bucket(parse_datetime(executed_at)))
+        self._global = {
+            row['test_case_id']: [row['executions'], row['executions'] - row['successes']]
+            for row in self.db.get_context_stats()
+        }
+        if self.risk_model is not None:
+            # Módulo resolvido por usuário, como o catálogo de cada um (personalizado > padrão)
+            custom_modules = self.db.get_user_test_modules()
+            self.risk_model.reset()
+            for row in self.db.get_context_stats_per_user():
+                key = (row['user_id'], row['test_case_id'])
+                module = custom_modules[key] if key in custom_modules else module_of(row['test_case_id'], self.catalog)
+                self.risk_model.observe(
+                    row['test_case_id'], module, row['executions'], row['executions'] - row['successes']
+                )
+
+    def ensure_loaded(self):
+        """Garante a carga dos totais globais (e do OnlineRiskModel associado)."""
+        with self._lock:
+            self._ensure_loaded()
+
+    def get_user(self, user_id: int, tests_map: Dict[str, TestCase]) -> UserContextStats:
+        """
+        Contadores do usuário (carregados de context_stats na primeira chamada)
+
+        Args:
+            user_id: ID do usuário
+            tests_map: Catálogo do usuário (resolve o módulo de cada teste)
+
+        Returns:
+            UserContextStats do usuário (somente leitura para o chamador)
+        """
+        with self._lock:
+            self._ensure_loaded()
+            stats = self._users.get(user_id)
+            if stats is not None:
+                self._users.move_to_end(user_id)
+                return stats
+
+            stats = UserContextStats()
+            for row in self.db.get_context_stats(user_id):
+                stats.add(
+                    row['test_case_id'],
+                    module_of(row['test_case_id'], tests_map),
+                    row['time_bucket'],
+                    row['executions'],
+                    row['successes']
+                )
+            last_fb = self.db.get_last_user_feedback(user_id)
+            if last_fb:
+                stats.last_test_id = last_fb.get("test_case_id")
+                stats.last_executed_at = last_fb.get("executed_at")
+
+            self._users[user_id] = stats
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return stats
+
+    def global_counts(self, test_id: str) -> Optional[List[int]]:
+        """[execuções, falhas] do teste somando todos os usuários (None sem histórico)."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._global.get(test_id)
+
+    def global_counts_many(self, test_ids: List[str]) -> List[List[int]]:
+        """[execuções, falhas] globais de vários testes ([0, 0] sem histórico)."""
+        with self._lock:
+            self._ensure_loaded()
+            return [self._global.get(tid, (0, 0)) for tid in test_ids]
+
+    def record(self, user_id: Optional[int], test_id: str, executed_at: datetime, success: bool, module: str):
+        """
+        Registra um feedback recém-gravado na tabela feedbacks
+
+        Args:
+            user_id: ID do testador (None = sem testador)
+            test_id: ID do teste executado
+            executed_at: Momento da execução
+            success: Se a execução teve sucesso
+            module: Módulo do teste no catálogo atual
+        """
+        bucket = time_bucket(executed_at)
+        successes = 1 if success else 0
+        with self._lock:
+            self.db.increment_context_stats(user_id or ANONYMOUS_USER, test_id, bucket, success)
+            # Ainda não carregado: a carga lerá a tabela já atualizada
+            if self._global is None:
+                return
+
+            counts = self._global.setdefault(test_id, [0, 0])
+            counts[0] += 1
+            counts[1] += 1 - successes
+            if self.risk_model is not None:
+                self.risk_model.observe(test_id, module, 1, 1 - successes)
+
+            stats = self._users.get(user_id) if user_id else None
+            if stats is not None:
+                stats.add(test_id, module, bucket, 1, successes)
+                executed_iso = executed_at.isoformat()
+                if stats.last_executed_at is None or executed_iso >= str(stats.last_executed_at):
+                    stats.last_test_id = test_id
+                    stats.last_executed_at = executed_iso
+
+    def invalidate_user(self, user_id: int):
+        """Descarta os contadores em memória do usuário (ex.: módulos do catálogo mudaram)."""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._global = None
@@ -7,7 +7,7 @@ O modelo ML continua sendo salvo em pickle (.pkl).
 import sqlite3
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable, Tuple
 import json
 
 
@@ -182,6 +182,15 @@ class IARTESDatabase:
             )
         """)
         
+        # Migração: último feedback incorporado ao modelo salvo (write-behind)
+        cursor.execute("PRAGMA table_info(user_models)")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'last_feedback_id' not in columns:
+            try:
+                cursor.execute("ALTER TABLE user_models ADD COLUMN last_feedback_id INTEGER")
+            except sqlite3.OperationalError as e:
+                print(f"⚠ Aviso ao adicionar coluna last_feedback_id: {e}")
+
         # Tabela para estatísticas de aprendizado por usuário
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS user_learning_stats (
@@ -198,6 +207,43 @@ class IARTESDatabase:
             )
         """)
         
+        # Migração: somas acumuladas para atualização incremental das estatísticas
+        # (NULL indica linha antiga que precisa ser reconstruída)
+        cursor.execute("PRAGMA table_info(user_learning_stats)")
+        columns = [row[1] for row in cursor.fetchall()]
+        for column, column_type in [('rated_count', 'INTEGER'), ('rating_sum', 'REAL'),
+                                    ('success_count', 'INTEGER'), ('time_sum', 'REAL')]:
+            if column not in columns:
+                try:
+                    cursor.execute(f"ALTER TABLE user_learning_stats ADD COLUMN {column} {column_type}")
+                except sqlite3.OperationalError as e:
+                    print(f"⚠ Aviso ao adicionar coluna {column}: {e}")
+
+        # Contadores de execuções por módulo (para módulos preferidos)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_module_stats (
+                user_id INTEGER NOT NULL,
+                module TEXT NOT NULL,
+                executions INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, module),
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        """)
+
+        # Contadores de execução/sucesso por (usuário, teste, faixa de horário):
+        # base incremental do risco de falha e da afinidade de contexto.
+        # user_id = 0 agrupa feedbacks sem testador.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS context_stats (
+                user_id INTEGER NOT NULL,
+                test_case_id TEXT NOT NULL,
+                time_bucket TEXT NOT NULL,
+                executions INTEGER DEFAULT 0,
+                successes INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, test_case_id, time_bucket)
+            )
+        """)
+
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_user_models_user_id 
             ON user_models(user_id)
@@ -360,6 +406,21 @@ class IARTESDatabase:
         rows = cursor.fetchall()
         return [dict(row) for row in rows]
     
+    def get_feedback_durations(self) -> List[Dict[str, Any]]:
+        """
+        Retorna o tempo real de todos os feedbacks, na ordem em que foram gravados.
+        
+        Returns:
+            Lista de dicionários (id, tester_id, test_case_id, actual_execution_time)
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT id, tester_id, test_case_id, actual_execution_time
+            FROM feedbacks
+            ORDER BY id
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+    
     def get_feedbacks_by_test(self, test_case_id: str) -> List[Dict[str, Any]]:
         """
         Retorna feedbacks de um teste específico.
@@ -538,6 +599,109 @@ class IARTESDatabase:
 
         return stats
 
+    def increment_context_stats(self, user_id: int, test_case_id: str, time_bucket: str, success: bool):
+        """
+        Incrementa os contadores de contexto com um feedback.
+
+        Args:
+            user_id: ID do testador (0 para feedback sem testador)
+            test_case_id: ID do teste
+            time_bucket: Faixa de horário da execução
+            success: Se a execução teve sucesso
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT INTO context_stats (user_id, test_case_id, time_bucket, executions, successes)
+            VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT(user_id, test_case_id, time_bucket) DO UPDATE SET
+                executions = executions + 1,
+                successes = successes + excluded.successes
+        """, (user_id, test_case_id, time_bucket, 1 if success else 0))
+        self.conn.commit()
+
+    def get_context_stats(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Retorna os contadores de contexto.
+
+        Args:
+            user_id: Se informado, apenas as linhas do usuário; senão, totais
+                por teste somando todos os usuários e faixas
+
+        Returns:
+            Lista de linhas (test_case_id, [time_bucket,] executions, successes)
+        """
+        cursor = self.conn.cursor()
+        if user_id is None:
+            cursor.execute("""
+                SELECT test_case_id, SUM(executions) as executions, SUM(successes) as successes
+                FROM context_stats
+                GROUP BY test_case_id
+            """)
+        else:
+            cursor.execute("""
+                SELECT test_case_id, time_bucket, executions, successes
+                FROM context_stats
+                WHERE user_id = ?
+            """, (user_id,))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_context_stats_per_user(self) -> List[Dict[str, Any]]:
+        """
+        Retorna os contadores de contexto por usuário e teste (somando as faixas).
+
+        Returns:
+            Lista de linhas (user_id, test_case_id, executions, successes)
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT user_id, test_case_id, SUM(executions) as executions, SUM(successes) as successes
+            FROM context_stats
+            GROUP BY user_id, test_case_id
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_user_test_modules(self) -> Dict[Tuple[int, str], Optional[str]]:
+        """
+        Retorna o módulo de cada teste personalizado, de todos os usuários.
+
+        Returns:
+            Dicionário (user_id, test_id) -> módulo
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT user_id, test_id, module FROM user_test_cases")
+        return {(row['user_id'], row['test_id']): row['module'] for row in cursor.fetchall()}
+
+    def context_stats_in_sync(self) -> bool:
+        """Indica se os contadores de contexto cobrem exatamente a tabela feedbacks."""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM feedbacks")
+        total = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(SUM(executions), 0) FROM context_stats")
+        return total == cursor.fetchone()[0]
+
+    def rebuild_context_stats(self, bucket_of: Callable[[Any], str]):
+        """
+        Reconstrói os contadores de contexto a partir de todos os feedbacks.
+
+        Args:
+            bucket_of: Converte executed_at na faixa de horário
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT tester_id, test_case_id, executed_at, success FROM feedbacks")
+        counts: Dict[Tuple[int, str, str], List[int]] = {}
+        for tester_id, test_case_id, executed_at, success in cursor.fetchall():
+            key = (tester_id or 0, test_case_id, bucket_of(executed_at))
+            entry = counts.setdefault(key, [0, 0])
+            entry[0] += 1
+            entry[1] += 1 if success else 0
+
+        cursor.execute("DELETE FROM context_stats")
+        cursor.executemany("""
+            INSERT INTO context_stats (user_id, test_case_id, time_bucket, executions, successes)
+            VALUES (?, ?, ?, ?, ?)
+        """, [key + tuple(entry) for key, entry in counts.items()])
+        self.conn.commit()
+
     def get_last_user_feedback(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Retorna o último feedback do usuário (mais recente)."""
         cursor = self.conn.cursor()
@@ -583,6 +747,28 @@ class IARTESDatabase:
         self.conn.commit()
         return cursor.lastrowid
     
+    def get_recommendation(self, recommendation_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Retorna uma recomendação salva.
+
+        Args:
+            recommendation_id: ID da recomendação
+
+        Returns:
+            Dicionário com a recomendação (listas já decodificadas) ou None
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM recommendations WHERE id = ?", (recommendation_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        rec = dict(row)
+        rec['test_ids'] = json.loads(rec['test_ids'])
+        rec['recommended_order'] = json.loads(rec['recommended_order'])
+        rec['user_modifications'] = json.loads(rec['user_modifications']) if rec.get('user_modifications') else []
+        return rec
+
     def get_pending_recommendations(self, user_id: int) -> List[Dict[str, Any]]:
         """
         Retorna recomendações pendentes de feedback do usuário.
@@ -721,6 +907,7 @@ class IARTESDatabase:
         """CUIDADO: Apaga todos os feedbacks do banco"""
         cursor = self.conn.cursor()
         cursor.execute("DELETE FROM feedbacks")
+        cursor.execute("DELETE FROM context_stats")
         self.conn.commit()
     
     def close(self):
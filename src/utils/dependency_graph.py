@@ -0,0 +1,155 @@
+"""
+Grafo de dependências do catálogo de testes.
+
+O catálogo (testes padrão + personalizados do usuário) muda raramente, mas
+cada recomendação percorria as ações de todos os testes para montar
+pré/pós-condições, dependências explícitas e vínculos pai/filho. Aqui isso é
+calculado UMA vez por catálogo (CatalogDependencyGraph) e cada requisição
+apenas recorta o subgrafo induzido pela seleção (DependencySubgraph), em
+tempo proporcional às condições e arestas dos testes selecionados.
+
+Os grafos ficam em DependencyGraphCache, por usuário, e são invalidados
+quando o usuário cria, altera ou remove um teste personalizado.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from src.models.test_case import TestCase
+
+
+@dataclass(frozen=True)
+class TestNode:
+    """Dados de um teste usados na ordenação, extraídos das ações uma única vez."""
+    preconditions: Tuple[str, ...]   # na ordem de get_preconditions() (a inferência depende dela)
+    postconditions: FrozenSet[str]
+    dependencies: FrozenSet[str]
+    parent_test_id: Optional[str]
+    destructive: bool
+    total_time: float
+
+    @classmethod
+    def from_test(cls, tc: TestCase) -> 'TestNode':
+        return cls(
+            preconditions=tuple(tc.get_preconditions()),
+            postconditions=frozenset(tc.get_postconditions()),
+            dependencies=frozenset(tc.dependencies),
+            parent_test_id=tc.parent_test_id,
+            destructive=tc.has_destructive_actions(),
+            total_time=tc.get_total_estimated_time()
+        )
+
+
+@dataclass
+class DependencySubgraph:
+    """Subgrafo induzido por uma seleção de testes."""
+    ids: List[str]                        # testes selecionados, na ordem da seleção
+    nodes: Dict[str, TestNode]
+    providers: Dict[str, List[str]]       # condição -> testes selecionados que a produzem
+    explicit: Dict[str, Set[str]]         # teste -> dependências explícitas + pai DENTRO da seleção
+
+    def internal_preconditions(self, test_id: str) -> Set[str]:
+        """Pré-condições do teste que algum teste da seleção produz."""
+        return {p for p in self.nodes[test_id].preconditions if p in self.providers}
+
+
+class CatalogDependencyGraph:
+    """Pré/pós-condições, dependências e vínculos de todos os testes do catálogo."""
+
+    def __init__(self, tests: Iterable[TestCase]):
+        """
+        Args:
+            tests: Testes do catálogo (IDs únicos)
+        """
+        self.nodes: Dict[str, TestNode] = {tc.id: TestNode.from_test(tc) for tc in tests}
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, test_id: str) -> bool:
+        return test_id in self.nodes
+
+    def subgraph(self, tests: List[TestCase]) -> DependencySubgraph:
+        """
+        Recorta o subgrafo induzido pela seleção
+
+        Args:
+            tests: Testes selecionados (testes fora do catálogo são compilados na hora)
+
+        Returns:
+            DependencySubgraph da seleção
+        """
+        nodes: Dict[str, TestNode] = {}
+        for tc in tests:
+            node = self.nodes.get(tc.id)
+            nodes[tc.id] = node if node is not None else TestNode.from_test(tc)
+
+        providers: Dict[str, List[str]] = {}
+        for tid, node in nodes.items():
+            for condition in node.postconditions:
+                providers.setdefault(condition, []).append(tid)
+
+        explicit: Dict[str, Set[str]] = {}
+        for tid, node in nodes.items():
+            deps = {dep for dep in node.dependencies if dep in nodes}
+            if node.parent_test_id and node.parent_test_id in nodes:
+                deps.add(node.parent_test_id)
+            explicit[tid] = deps
+
+        return DependencySubgraph(ids=list(nodes), nodes=nodes, providers=providers, explicit=explicit)
+
+
+class DependencyGraphCache:
+    """Grafo do catálogo por usuário (LRU). Thread-safe."""
+
+    def __init__(self, max_entries: int = 128):
+        """
+        Args:
+            max_entries: Número máximo de catálogos guardados
+        """
+        self.max_entries = max_entries
+        self._graphs: "OrderedDict[Optional[int], CatalogDependencyGraph]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # incrementado a cada invalidação
+        self.builds = 0
+
+    def get(self, user_id: Optional[int], load_tests: Callable[[], Iterable[TestCase]]) -> CatalogDependencyGraph:
+        """
+        Retorna o grafo do catálogo do usuário, montando-o na primeira chamada
+
+        Args:
+            user_id: ID do usuário (None = apenas testes padrão)
+            load_tests: Função que carrega o catálogo completo do usuário
+
+        Returns:
+            CatalogDependencyGraph do catálogo
+        """
+        with self._lock:
+            graph = self._graphs.get(user_id)
+            if graph is not None:
+                self._graphs.move_to_end(user_id)
+                return graph
+            generation = self._generation
+
+        graph = CatalogDependencyGraph(load_tests())
+        with self._lock:
+            self.builds += 1
+            # Não guardar um grafo montado antes de uma invalidação concorrente
+            if generation != self._generation:
+                return graph
+            self._graphs[user_id] = graph
+            while len(self._graphs) > self.max_entries:
+                self._graphs.popitem(last=False)
+        return graph
+
+    def invalidate_user(self, user_id: Optional[int]):
+        """Descarta o grafo do usuário (catálogo personalizado mudou)."""
+        with self._lock:
+            self._generation += 1
+            self._graphs.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._graphs.clear()
@@ -0,0 +1,128 @@
+"""
+Geração adiada (assíncrona) de explicações de recomendação.
+
+A explicação só é exibida quando o testador abre o painel correspondente,
+então a resposta de /api/recomendacao pode devolver apenas um identificador
+(o recommendation_id) enquanto a explicação é calculada em um pool de
+workers. O resultado fica disponível por recommendation_id até expirar
+(TTL) ou ser descartado pelo limite de entradas (LRU).
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+
+JOB_PENDING = 'pending'
+JOB_READY = 'ready'
+JOB_FAILED = 'failed'
+
+
+@dataclass
+class ExplanationJob:
+    """Job de explicação de uma recomendação."""
+    recommendation_id: int
+    user_id: Optional[int]
+    future: Future
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return JOB_PENDING
+        return JOB_FAILED if self.future.exception() is not None else JOB_READY
+
+
+class ExplanationJobStore:
+    """Pool de workers + resultados de explicação indexados por recommendation_id."""
+
+    def __init__(self, max_workers: int = 2, ttl_seconds: float = 900.0, max_entries: int = 512):
+        """
+        Args:
+            max_workers: Threads que calculam explicações
+            ttl_seconds: Tempo que um resultado permanece disponível
+            max_entries: Número máximo de jobs guardados (LRU)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="explanation")
+        self._jobs: "OrderedDict[int, ExplanationJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+
+    def submit(
+        self,
+        recommendation_id: int,
+        user_id: Optional[int],
+        fn: Callable[..., Dict[str, Any]],
+        *args,
+        **kwargs
+    ) -> ExplanationJob:
+        """
+        Agenda o cálculo da explicação (reaproveita um job existente e válido)
+
+        Args:
+            recommendation_id: ID da recomendação salva
+            user_id: Dono da recomendação (apenas ele pode consultar)
+            fn: Função que gera a explicação
+
+        Returns:
+            Job agendado
+        """
+        with self._lock:
+            job = self._get_locked(recommendation_id)
+            if job is not None and job.status != JOB_FAILED:
+                return job
+
+            job = ExplanationJob(
+                recommendation_id=recommendation_id,
+                user_id=user_id,
+                future=self._executor.submit(fn, *args, **kwargs)
+            )
+            self._jobs[recommendation_id] = job
+            self.submitted += 1
+            while len(self._jobs) > self.max_entries:
+                self._jobs.popitem(last=False)
+            return job
+
+    def get(self, recommendation_id: int) -> Optional[ExplanationJob]:
+        """Retorna o job da recomendação (None se inexistente ou expirado)."""
+        with self._lock:
+            return self._get_locked(recommendation_id)
+
+    def _get_locked(self, recommendation_id: int) -> Optional[ExplanationJob]:
+        job = self._jobs.get(recommendation_id)
+        if job is None:
+            return None
+        if time.monotonic() - job.created_at > self.ttl_seconds:
+            del self._jobs[recommendation_id]
+            return None
+        self._jobs.move_to_end(recommendation_id)
+        return job
+
+    @staticmethod
+    def handle(job: ExplanationJob) -> Dict[str, Any]:
+        """Identificador devolvido ao cliente para buscar a explicação depois."""
+        return {
+            'recommendation_id': job.recommendation_id,
+            'status': job.status,
+            'url': f"/api/explain/recommendation/{job.recommendation_id}"
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas do pool."""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'jobs': len(statuses),
+            'pending': statuses.count(JOB_PENDING),
+            'ready': statuses.count(JOB_READY),
+            'failed': statuses.count(JOB_FAILED),
+            'submitted': self.submitted
+        }
+
+    def shutdown(self):
+        """Encerra o pool (sem aguardar jobs pendentes)."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
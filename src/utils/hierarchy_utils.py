@@ -5,6 +5,7 @@ Suporta ordenação hierárquica, agrupamento por caminho compartilhado e propag
 from typing import List, Dict, Set, Tuple, Optional
 from collections import defaultdict
 from src.models.test_case import TestCase
+from src.utils.order_metrics import OrderMetrics
 
 
 def get_tree_level(test: TestCase, test_by_id: Dict[str, TestCase]) -> int:
@@ -173,35 +174,7 @@ def estimate_resets_with_hierarchy(test_order: List[TestCase]) -> int:
     Estima número de resets considerando hierarquia e teardown.
     Testes com teardown_restores não causam reset porque voltam ao estado anterior.
     """
-    resets = 0
-    current_state = set()
-    
-    for test in test_order:
-        # Se teste tem teardown_restores, não altera estado final
-        if test.teardown_restores:
-            # Ainda precisa verificar pré-condições, mas não altera estado final
-            required = test.get_preconditions()
-            if required and not required.issubset(current_state):
-                resets += 1
-                current_state = set()
-            # Estado não é atualizado (volta no teardown)
-            continue
-        
-        # Teste normal: verificar pré-condições
-        required = test.get_preconditions()
-        if required and not required.issubset(current_state):
-            resets += 1
-            current_state = set()
-        
-        # Atualizar estado (a menos que seja context_preserving sem alteração real)
-        if not test.context_preserving:
-            current_state.update(test.get_postconditions())
-        
-        # Se destrutivo, limpar estado
-        if test.has_destructive_actions():
-            current_state = set()
-    
-    return resets
+    return OrderMetrics.from_order(test_order).hierarchy_resets
 
 
 def calculate_hierarchy_score(test_order: List[TestCase], test_by_id: Dict[str, TestCase]) -> float:
@@ -214,38 +187,20 @@ def calculate_hierarchy_score(test_order: List[TestCase], test_by_id: Dict[str,
     - Reduzir resets (considerando teardown)
     """
     score = 100.0
+    metrics = OrderMetrics.from_order(test_order)
     
     # Penalizar violações de hierarquia
-    violations = 0
-    executed = set()
-    for test in test_order:
-        if test.parent_test_id and test.parent_test_id not in executed:
-            violations += 1
-        executed.add(test.id)
-    
-    score -= violations * 25
+    score -= metrics.hierarchy_violations * 25
     
     # Bônus por agrupamento de testes com caminho compartilhado
     groups = group_tests_by_shared_path(test_order)
     score += len(groups) * 15
     
     # Bônus por agrupar testes context_preserving
-    context_preserving_groups = 0
-    i = 0
-    while i < len(test_order):
-        if test_order[i].context_preserving:
-            group_start = i
-            while i < len(test_order) and test_order[i].context_preserving:
-                i += 1
-            if i - group_start > 1:
-                context_preserving_groups += 1
-        else:
-            i += 1
-    
-    score += context_preserving_groups * 10
+    score += metrics.context_preserving_groups * 10
     
     # Bônus por reduzir resets (considerando teardown)
-    resets = estimate_resets_with_hierarchy(test_order)
+    resets = metrics.hierarchy_resets
     max_possible_resets = len(test_order)
     reset_reduction = max_possible_resets - resets
     score += reset_reduction * 5
@@ -0,0 +1,179 @@
+"""
+Persistência write-behind dos modelos personalizados.
+
+Serializar o modelo de um usuário (RandomForest + histórico) gera um BLOB de
+centenas de KB. Em vez de gravá-lo a cada feedback, o modelo é marcado como
+"sujo" e uma thread em segundo plano grava os modelos pendentes em lote, em
+uma única transação, quando:
+
+    - o intervalo de flush expira, ou
+    - o número de modelos pendentes atinge o limite configurado.
+
+Ordem segura em caso de queda: o feedback é gravado (e commitado) na tabela
+feedbacks ANTES de o modelo ser marcado como sujo, e cada BLOB registra em
+last_feedback_id o último feedback incorporado. Assim o modelo persistido
+nunca contém um feedback inexistente no banco, e o atraso após uma queda é
+mensurável (feedbacks com id > last_feedback_id).
+
+Em mark_dirty, na thread de quem alterou o modelo (segurando o lock do
+usuário), só é tirado um snapshot barato (cópia das listas e referências ao
+modelo/scaler, que o treino substitui em vez de alterar). A serialização e
+os metadados (training_samples, last_trained) ficam com a thread de
+gravação, na mesma transação do lote.
+"""
+import atexit
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class UserModelWriteBehind:
+    """Fila write-behind de modelos personalizados, gravados em lote."""
+
+    def __init__(
+        self,
+        db_path: str,
+        serializer: Callable[[Any], bytes],
+        flush_interval: float = 30.0,
+        max_pending: int = 10,
+        snapshot: Optional[Callable[[Any], Any]] = None
+    ):
+        """
+        Args:
+            db_path: Caminho do banco SQLite (conexão própria para a thread)
+            serializer: Função que serializa um snapshot em bytes (thread de gravação)
+            flush_interval: Intervalo máximo (s) entre flushes
+            max_pending: Quantidade de modelos sujos que dispara flush imediato
+            snapshot: Função que copia o estado do modelo a gravar (chamada em
+                mark_dirty; None = o próprio modelo)
+        """
+        self.db_path = str(db_path)
+        self.serializer = serializer
+        self.snapshot = snapshot or (lambda model: model)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        # user_id -> (snapshot do modelo, amostras de treino, last_trained, last_feedback_id)
+        self._dirty: Dict[int, Tuple[Any, int, str, Optional[int]]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self.flush_count = 0
+        self.models_written = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name="user-model-write-behind", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def mark_dirty(self, user_id: int, model: Any, last_feedback_id: Optional[int] = None):
+        """
+        Marca o modelo de um usuário para gravação, guardando um snapshot.
+
+        O chamador deve impedir alterações no modelo durante a chamada (lock do
+        usuário), para que o snapshot seja consistente.
+
+        Args:
+            user_id: ID do usuário
+            model: Modelo em memória (o snapshot mais recente prevalece)
+            last_feedback_id: Último feedback já gravado que o modelo incorpora
+        """
+        snapshot = self.snapshot(model)
+        training_samples = len(model.training_data.get('y', []))
+        last_trained = datetime.now().isoformat()
+        with self._lock:
+            previous = self._dirty.get(user_id)
+            if previous is not None and last_feedback_id is None:
+                last_feedback_id = previous[3]
+            self._dirty[user_id] = (snapshot, training_samples, last_trained, last_feedback_id)
+            pending = len(self._dirty)
+
+        if pending >= self.max_pending:
+            self._wakeup.set()
+
+    def pending_count(self) -> int:
+        """Número de modelos aguardando gravação."""
+        with self._lock:
+            return len(self._dirty)
+
+    def is_dirty(self, user_id: int) -> bool:
+        """Indica se o modelo do usuário ainda não foi gravado."""
+        with self._lock:
+            return user_id in self._dirty
+
+    def flush(self) -> int:
+        """
+        Grava todos os modelos pendentes em uma única transação.
+
+        Returns:
+            Número de modelos gravados
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = self._dirty
+                self._dirty = {}
+
+            if not batch:
+                return 0
+
+            try:
+                rows = [
+                    (user_id, self.serializer(snapshot), training_samples, last_trained, last_feedback_id)
+                    for user_id, (snapshot, training_samples, last_trained, last_feedback_id) in batch.items()
+                ]
+                conn = sqlite3.connect(self.db_path, timeout=30.0)
+                try:
+                    with conn:
+                        conn.executemany("""
+                            INSERT INTO user_models
+                            (user_id, model_data, training_samples, last_trained, last_feedback_id)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(user_id) DO UPDATE SET
+                                model_data = excluded.model_data,
+                                training_samples = excluded.training_samples,
+                                last_trained = excluded.last_trained,
+                                last_feedback_id = COALESCE(excluded.last_feedback_id, user_models.last_feedback_id)
+                        """, rows)
+                finally:
+                    conn.close()
+            except Exception as e:
+                # Devolver à fila sem sobrescrever versões mais novas
+                print(f"⚠ Erro ao gravar modelos personalizados: {e}")
+                with self._lock:
+                    for user_id, entry in batch.items():
+                        self._dirty.setdefault(user_id, entry)
+                return 0
+
+            self.flush_count += 1
+            self.models_written += len(rows)
+            return len(rows)
+
+    def _run(self):
+        """Loop da thread de gravação (um erro inesperado não derruba a thread)."""
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠ Erro inesperado no write-behind de modelos: {e}")
+
+    def close(self):
+        """Para a thread e grava o que estiver pendente (chamado no encerramento)."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=5.0)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas da fila."""
+        return {
+            'pending': self.pending_count(),
+            'flushes': self.flush_count,
+            'models_written': self.models_written
+        }
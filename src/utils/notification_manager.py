@@ -140,12 +140,14 @@ class NotificationManager:
                 action_url='/recomendacao'
             )
     
-    def check_all_user_alerts(self, user_id: int):
+    def check_all_user_alerts(self, user_id: int, training_samples: Optional[int] = None):
         """
         Verifica todos os alertas para um usuário e cria notificações se necessário.
         
         Args:
             user_id: ID do usuário
+            training_samples: Amostras do modelo personalizado em memória (a tabela
+                user_models pode estar atrasada pelo write-behind); None = ler do banco
         """
         cursor = self.db.conn.cursor()
         
@@ -168,8 +170,9 @@ class NotificationManager:
             # Verificar taxa de sucesso
             self.check_success_rate_drop(user_id, success_rate)
         
-        if model_row:
+        if training_samples is None and model_row:
             training_samples = model_row['training_samples'] or 0
+        if training_samples is not None:
             # Verificar fases de treinamento
             self.check_model_training_phases(user_id, training_samples)
         
@@ -0,0 +1,302 @@
+"""
+Métricas de uma ordem de testes (motor único).
+
+Resets (simples e considerando hierarquia/teardown), tempo total,
+transições compatíveis e de mesmo módulo, violações de hierarquia e de
+dependência e grupos são calculados em UMA passada sobre a ordem, com as
+pré/pós-condições compiladas em bitsets (inteiros Python): "pré-condições
+satisfeitas" vira pre & ~estado == 0 e "transição compatível" vira
+pos_anterior & pre != 0.
+
+O resultado por posição (compatibilidade, mesmo módulo, reset antes do
+teste) é guardado para que a explicação reaproveite as métricas calculadas
+durante a ordenação, em vez de percorrer a ordem de novo.
+
+OrderBatchEvaluator avalia MUITAS ordens (permutações da mesma seleção) de
+uma vez: pré/pós-condições viram bitsets (palavras uint64) e as matrizes de
+transição são indexadas por todas as ordens simultaneamente.
+"""
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from src.models.test_case import TestCase
+
+
+class ConditionBits:
+    """Compila conjuntos de condições em bitsets (um bit por condição)."""
+
+    def __init__(self):
+        self._bits: Dict[str, int] = {}
+
+    def mask(self, conditions) -> int:
+        value = 0
+        for cond in conditions:
+            bit = self._bits.get(cond)
+            if bit is None:
+                bit = self._bits[cond] = 1 << len(self._bits)
+            value |= bit
+        return value
+
+
+@dataclass
+class OrderMetrics:
+    """Métricas de uma ordem de testes, por posição e agregadas."""
+    order: List[str]
+    compatible: List[bool]      # transição i -> i+1 tem estado compatível
+    same_module: List[bool]     # transição i -> i+1 permanece no mesmo módulo
+    reset_before: List[bool]    # teste i exige reset antes de executar
+    hierarchy_resets: int       # resets considerando teardown/context_preserving/destrutivos
+    total_time: float
+    priority_sum: float
+    destructive_count: int
+    context_preserving_count: int
+    teardown_count: int
+    context_preserving_groups: int   # blocos com 2+ testes context_preserving seguidos
+    hierarchy_violations: int        # filho executado antes do pai
+    dependency_violations: int       # dependência não executada antes
+    state_compatibility: float       # Σ |pós ∩ pré| / |pré| nas transições
+    destructive_followups: int       # destrutivo seguido de não-destrutivo do mesmo módulo
+
+    @classmethod
+    def from_order(cls, tests: List[TestCase], initial_state: Iterable[str] = ()) -> 'OrderMetrics':
+        """
+        Calcula todas as métricas percorrendo a ordem uma única vez
+
+        Args:
+            tests: Testes na ordem de execução
+            initial_state: Condições já satisfeitas antes do primeiro teste
+
+        Returns:
+            OrderMetrics da ordem
+        """
+        bits = ConditionBits()
+        compatible = []
+        same_module = []
+        reset_before = []
+        state = bits.mask(initial_state)
+        hierarchy_state = state
+        hierarchy_resets = 0
+        total_time = 0.0
+        priority_sum = 0.0
+        destructive_count = 0
+        context_preserving_count = 0
+        teardown_count = 0
+        context_preserving_groups = 0
+        run_length = 0
+        hierarchy_violations = 0
+        dependency_violations = 0
+        state_compatibility = 0.0
+        destructive_followups = 0
+        executed = set()
+        previous = None
+        previous_post = 0
+        previous_destructive = False
+
+        for test in tests:
+            pre = bits.mask(test.get_preconditions())
+            post = bits.mask(test.get_postconditions())
+            destructive = test.has_destructive_actions()
+
+            # Resets simples
+            needs_reset = (pre & ~state) != 0
+            reset_before.append(needs_reset)
+            if needs_reset:
+                state = 0
+            state |= post
+
+            # Resets considerando hierarquia: teardown volta ao estado anterior,
+            # context_preserving não altera o estado e destrutivos o limpam
+            if pre & ~hierarchy_state:
+                hierarchy_resets += 1
+                hierarchy_state = 0
+            if not test.teardown_restores:
+                if not test.context_preserving:
+                    hierarchy_state |= post
+                if destructive:
+                    hierarchy_state = 0
+
+            # Transição a partir do teste anterior
+            if previous is not None:
+                compatible.append((previous_post & pre) != 0)
+                same = previous.module == test.module
+                same_module.append(same)
+                if pre:
+                    state_compatibility += bin(previous_post & pre).count('1') / bin(pre).count('1')
+                if same and previous_destructive and not destructive:
+                    destructive_followups += 1
+
+            # Hierarquia e dependências
+            if test.parent_test_id and test.parent_test_id not in executed:
+                hierarchy_violations += 1
+            dependency_violations += sum(1 for dep_id in test.dependencies if dep_id not in executed)
+            executed.add(test.id)
+
+            # Blocos context_preserving
+            if test.context_preserving:
+                run_length += 1
+                context_preserving_count += 1
+            else:
+                if run_length > 1:
+                    context_preserving_groups += 1
+                run_length = 0
+
+            total_time += test.get_total_estimated_time()
+            priority_sum += test.priority
+            destructive_count += destructive
+            teardown_count += bool(test.teardown_restores)
+            previous, previous_post, previous_destructive = test, post, destructive
+
+        if run_length > 1:
+            context_preserving_groups += 1
+
+        return cls(
+            order=[tc.id for tc in tests],
+            compatible=compatible,
+            same_module=same_module,
+            reset_before=reset_before,
+            hierarchy_resets=hierarchy_resets,
+            total_time=total_time,
+            priority_sum=priority_sum,
+            destructive_count=destructive_count,
+            context_preserving_count=context_preserving_count,
+            teardown_count=teardown_count,
+            context_preserving_groups=context_preserving_groups,
+            hierarchy_violations=hierarchy_violations,
+            dependency_violations=dependency_violations,
+            state_compatibility=state_compatibility,
+            destructive_followups=destructive_followups
+        )
+
+    def matches(self, tests: List[TestCase]) -> bool:
+        """Indica se as métricas correspondem exatamente a esta ordem."""
+        return self.order == [tc.id for tc in tests]
+
+    @property
+    def resets(self) -> int:
+        return sum(self.reset_before)
+
+    @property
+    def compatible_transitions(self) -> int:
+        return sum(self.compatible)
+
+    @property
+    def same_module_transitions(self) -> int:
+        return sum(self.same_module)
+
+    @property
+    def module_groups(self) -> int:
+        """Blocos consecutivos do mesmo módulo (0 para ordens com até 1 teste)."""
+        if len(self.order) <= 1:
+            return 0
+        return 1 + sum(1 for same in self.same_module if not same)
+
+
+class OrderBatchEvaluator:
+    """Avaliação vetorizada de várias ordens dos mesmos testes."""
+
+    def __init__(
+        self,
+        tests: List[TestCase],
+        critical_priority: int = 4,
+        durations: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            tests: Testes da seleção (as ordens são permutações deles)
+            critical_priority: Prioridade mínima de um teste crítico
+            durations: Duração prevista por teste (padrão: soma das estimativas das ações)
+        """
+        self.tests = list(tests)
+        self.index = {tc.id: i for i, tc in enumerate(self.tests)}
+
+        conditions = sorted({
+            cond for tc in self.tests
+            for cond in tc.get_preconditions() | tc.get_postconditions()
+        })
+        bit = {cond: i for i, cond in enumerate(conditions)}
+        n_words = max(1, (len(conditions) + 63) // 64)
+
+        def encode(conds) -> np.ndarray:
+            words = np.zeros(n_words, dtype=np.uint64)
+            for cond in conds:
+                words[bit[cond] // 64] |= np.uint64(1) << np.uint64(bit[cond] % 64)
+            return words
+
+        self.pre_bits = np.array([encode(tc.get_preconditions()) for tc in self.tests]).reshape(len(self.tests), n_words)
+        self.post_bits = np.array([encode(tc.get_postconditions()) for tc in self.tests]).reshape(len(self.tests), n_words)
+        self.has_pre = self.pre_bits.any(axis=1)
+
+        modules = np.array([tc.module for tc in self.tests], dtype=object)
+        # Matrizes de transição i -> j
+        self.compatible = (self.post_bits[:, None, :] & self.pre_bits[None, :, :]).any(axis=2)
+        self.same_module = modules[:, None] == modules[None, :]
+
+        durations = durations or {}
+        self.times = np.array(
+            [durations.get(tc.id, tc.get_total_estimated_time()) for tc in self.tests], dtype=np.float64
+        )
+        self.critical = np.array([tc.priority >= critical_priority for tc in self.tests])
+
+    def encode_orders(self, orders: Sequence[Sequence[str]]) -> np.ndarray:
+        """Converte ordens (listas de IDs, mesmo tamanho) em matriz de índices (K, n)."""
+        return np.array([[self.index[tid] for tid in order] for order in orders], dtype=np.int64)
+
+    def reset_positions(self, orders: np.ndarray) -> np.ndarray:
+        """
+        Indica, para cada ordem e posição, se o teste exige reset antes de executar
+
+        Args:
+            orders: Matriz (K, n) de índices dos testes
+
+        Returns:
+            Matriz booleana (K, n)
+        """
+        k, n = orders.shape
+        # Percorre as posições, todas as ordens em paralelo
+        state = np.zeros((k, self.pre_bits.shape[1]), dtype=np.uint64)
+        reset_before = np.zeros((k, n), dtype=bool)
+        for position in range(n):
+            test = orders[:, position]
+            required = self.pre_bits[test]
+            needs_reset = self.has_pre[test] & (required & ~state).any(axis=1)
+            reset_before[:, position] = needs_reset
+            state[needs_reset] = 0
+            state |= self.post_bits[test]
+        return reset_before
+
+    def evaluate(self, orders: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Calcula as métricas de todas as ordens de uma vez
+
+        Args:
+            orders: Matriz (K, n) de índices dos testes
+
+        Returns:
+            Dicionário de arrays (K,): resets, compatible_transitions,
+            same_module_transitions, total_time e critical_time (tempo até
+            concluir todos os testes críticos)
+        """
+        k, n = orders.shape
+        if n == 0:
+            zeros = np.zeros(k)
+            return {name: zeros for name in (
+                'resets', 'compatible_transitions', 'same_module_transitions', 'total_time', 'critical_time'
+            )}
+
+        current, following = orders[:, :-1], orders[:, 1:]
+        compatible = self.compatible[current, following].sum(axis=1)
+        same_module = self.same_module[current, following].sum(axis=1)
+
+        resets = self.reset_positions(orders).sum(axis=1)
+
+        elapsed = np.cumsum(self.times[orders], axis=1)
+        critical_time = np.where(self.critical[orders], elapsed, 0.0).max(axis=1)
+
+        return {
+            'resets': resets,
+            'compatible_transitions': compatible,
+            'same_module_transitions': same_module,
+            'total_time': elapsed[:, -1],
+            'critical_time': critical_time
+        }
@@ -0,0 +1,150 @@
+"""
+Cache de resultados de recomendação.
+
+Testadores repetem com frequência a mesma seleção de testes (e a tela de
+explicação pede novamente a mesma recomendação). Este cache guarda o
+RecommendationResult final, o mapa de risco e a explicação, indexados por:
+
+    (user_id, fingerprint da seleção, versão do modelo global,
+     versão do modelo pessoal, bucket de contexto, versão do risco)
+
+Entradas expiram por TTL e são invalidadas quando o usuário envia feedback
+ou quando o modelo é trocado. O risco é compartilhado entre testadores
+(OnlineRiskModel): o feedback de qualquer um muda a versão do risco e
+torna obsoletas as entradas de todos.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from src.models.test_case import RecommendationResult
+
+
+CacheKey = Tuple[Optional[int], str, int, int, str, int]
+
+
+def selection_fingerprint(test_ids: Iterable[str]) -> str:
+    """Fingerprint estável (independente da ordem) de uma seleção de testes."""
+    joined = "\x1f".join(sorted(set(test_ids)))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedRecommendation:
+    """Entrada do cache: tudo que é caro de recalcular para uma seleção."""
+    result: RecommendationResult
+    risk_map: Dict[str, float]
+    explanation: Optional[Dict[str, Any]]
+    context: Dict[str, Any]
+    metrics: Optional[Any] = None  # OrderMetrics da ordem final (reuso na explicação)
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class RecommendationCache:
+    """
+    Cache LRU com TTL para recomendações.
+    Thread-safe (o Flask pode atender requisições em paralelo).
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 256):
+        """
+        Args:
+            ttl_seconds: Tempo de vida de cada entrada
+            max_entries: Número máximo de entradas (LRU)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, CachedRecommendation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        user_id: Optional[int],
+        test_ids: Iterable[str],
+        model_versions: Tuple[int, int],
+        context_bucket: str,
+        risk_version: int = 0
+    ) -> CacheKey:
+        """Monta a chave do cache."""
+        global_version, user_version = model_versions
+        return (user_id, selection_fingerprint(test_ids), global_version, user_version, context_bucket, risk_version)
+
+    def get(self, key: CacheKey) -> Optional[CachedRecommendation]:
+        """
+        Retorna uma CÓPIA da entrada (o chamador pode modificá-la livremente)
+        ou None se não existir/expirou.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry.created_at > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry)
+
+    def put(
+        self,
+        key: CacheKey,
+        result: RecommendationResult,
+        risk_map: Dict[str, float],
+        explanation: Optional[Dict[str, Any]],
+        context: Dict[str, Any],
+        metrics: Optional[Any] = None
+    ):
+        """Armazena uma recomendação (copiada, para não compartilhar estado mutável)."""
+        entry = CachedRecommendation(
+            result=copy.deepcopy(result),
+            risk_map=dict(risk_map),
+            explanation=copy.deepcopy(explanation),
+            context=copy.deepcopy(context),
+            metrics=copy.deepcopy(metrics)
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def attach_explanation(self, key: CacheKey, explanation: Optional[Dict[str, Any]]):
+        """Anexa uma explicação calculada depois (modo adiado) a uma entrada existente."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.explanation is None:
+                entry.explanation = copy.deepcopy(explanation)
+
+    def age_seconds(self, entry: CachedRecommendation) -> float:
+        """Idade de uma entrada em segundos."""
+        return time.monotonic() - entry.created_at
+
+    def invalidate_user(self, user_id: Optional[int]):
+        """Remove todas as entradas de um usuário (ex: após feedback)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        """Remove todas as entradas (ex: modelo global trocado)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas de uso do cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0
+            }